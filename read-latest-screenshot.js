@@ -7,23 +7,82 @@
 
 const fs = require('fs');
 const path = require('path');
+const { execFileSync } = require('child_process');
+
+/**
+ * Ask the capture catalogue (SQLite, written by the Python tools) for the
+ * newest capture: an indexed lookup instead of stat-ing every file.
+ */
+function latestFromCatalogue(rettelserDir) {
+    if (!fs.existsSync(path.join(rettelserDir, '.catalogue.sqlite3'))) {
+        return null;
+    }
+    try {
+        const python = process.env.PYTHON || 'python';
+        const output = execFileSync(python, [
+            '-m', 'rettelsesvaerktoj.catalogue', '--dir', rettelserDir, 'latest'
+        ], { cwd: __dirname, encoding: 'utf8' });
+        return output.trim() || null;
+    } catch (error) {
+        return null;
+    }
+}
+
+/**
+ * Captures saved in tile-delta mode are a .tiles.json manifest plus atlas
+ * PNGs; let the Python side rebuild a normal PNG and return its path.
+ */
+function materializeTiles(filepath) {
+    const python = process.env.PYTHON || 'python';
+    const output = execFileSync(python, ['-m', 'rettelsesvaerktoj.tiles', filepath], {
+        cwd: __dirname,
+        encoding: 'utf8'
+    });
+    return output.trim();
+}
+
+/**
+ * Current LATEST pointer as { seq, file }. The sequence number grows with
+ * every published capture, so pollers can compare it instead of the file.
+ */
+function readPointer(rettelserDir) {
+    try {
+        const pointer = JSON.parse(fs.readFileSync(path.join(rettelserDir, 'LATEST.json'), 'utf8'));
+        if (pointer && pointer.file) {
+            return pointer;
+        }
+    } catch (error) {
+        // Not written yet, or written by an older version: use LATEST.txt
+    }
+    try {
+        const file = fs.readFileSync(path.join(rettelserDir, 'LATEST.txt'), 'utf8').trim();
+        return file ? { seq: 0, file } : null;
+    } catch (error) {
+        return null;
+    }
+}
 
 function getLatestScreenshot() {
     const rettelserDir = path.join(__dirname, 'Rettelser');
     
     try {
-        // Check if LATEST.txt exists (created by screenshot app)
-        const latestFile = path.join(rettelserDir, 'LATEST.txt');
-        if (fs.existsSync(latestFile)) {
-            const filename = fs.readFileSync(latestFile, 'utf8').trim();
-            const filepath = path.join(rettelserDir, filename);
+        // LATEST.json / LATEST.txt are replaced atomically by the screenshot
+        // apps, so a plain read never sees a half-written pointer
+        const pointer = readPointer(rettelserDir);
+        if (pointer) {
+            const filename = pointer.file;
+            let filepath = path.join(rettelserDir, filename);
             
             if (fs.existsSync(filepath)) {
+                if (filename.endsWith('.tiles.json')) {
+                    filepath = materializeTiles(filepath);
+                }
                 return {
                     success: true,
                     filepath: filepath,
                     filename: filename,
-                    relativePath: `Rettelser/${filename}`
+                    relativePath: `Rettelser/${filename}`,
+                    seq: pointer.seq
                 };
             }
         }
@@ -36,8 +95,21 @@ function getLatestScreenshot() {
             };
         }
         
+        const cataloguePath = latestFromCatalogue(rettelserDir);
+        if (cataloguePath && fs.existsSync(cataloguePath)) {
+            const relative = path.relative(rettelserDir, cataloguePath).split(path.sep).join('/');
+            return {
+                success: true,
+                filepath: relative.endsWith('.tiles.json') ? materializeTiles(cataloguePath) : cataloguePath,
+                filename: path.basename(cataloguePath),
+                relativePath: `Rettelser/${relative}`
+            };
+        }
+        
+        // Last resort: scan the folder
+        
         const files = fs.readdirSync(rettelserDir)
-            .filter(file => file.startsWith('screenshot_') && file.endsWith('.png'))
+            .filter(file => file.startsWith('screenshot_') && (file.endsWith('.png') || file.endsWith('.webp')))
             .map(file => ({
                 name: file,
                 path: path.join(rettelserDir, file),
@@ -69,18 +141,94 @@ function getLatestScreenshot() {
     }
 }
 
+/**
+ * Follow new captures through the tray app's local service
+ * (rettelsesvaerktoj/service.py). The app pushes one event per capture, so
+ * nothing polls the folder. Reconnects with ?since= so no capture is missed,
+ * re-reading .service.json in case the app was restarted.
+ * Returns false if no service is running.
+ */
+function watchCaptures(onCapture) {
+    const http = require('http');
+    const serviceFile = path.join(__dirname, 'Rettelser', '.service.json');
+    let lastId = null;
+    
+    const readService = () => {
+        try {
+            return JSON.parse(fs.readFileSync(serviceFile, 'utf8'));
+        } catch (error) {
+            return null;
+        }
+    };
+    
+    const connect = () => {
+        const service = readService();
+        if (!service) {
+            setTimeout(connect, 1000);
+            return;
+        }
+        const query = lastId === null ? '' : `?since=${lastId}`;
+        const request = http.get(`${service.url}/events${query}`, {
+            headers: { 'X-Rettelser-Token': service.token }
+        }, (response) => {
+            if (response.statusCode !== 200) {
+                response.resume();
+                setTimeout(connect, 1000);
+                return;
+            }
+            response.setEncoding('utf8');
+            let buffer = '';
+            response.on('data', (chunk) => {
+                buffer += chunk;
+                let end;
+                while ((end = buffer.indexOf('\n\n')) !== -1) {
+                    const block = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    const data = block.split('\n')
+                        .filter((line) => line.startsWith('data: '))
+                        .map((line) => line.slice(6))
+                        .join('\n');
+                    if (data) {
+                        const capture = JSON.parse(data);
+                        lastId = capture.id;
+                        onCapture(capture);
+                    }
+                }
+            });
+            response.on('end', () => setTimeout(connect, 1000));
+        });
+        request.on('error', () => setTimeout(connect, 1000));
+    };
+    
+    if (!readService()) {
+        return false;
+    }
+    connect();
+    return true;
+}
+
 // If called directly, output the result
 if (require.main === module) {
-    const result = getLatestScreenshot();
-    
-    if (result.success) {
-        console.log(`📸 Seneste screenshot: ${result.relativePath}`);
-        if (result.timestamp) {
-            console.log(`📅 Taget: ${result.timestamp}`);
+    if (process.argv.includes('--watch')) {
+        const watching = watchCaptures((capture) => {
+            console.log(`📸 Nyt screenshot: Rettelser/${capture.filename}`);
+        });
+        if (!watching) {
+            console.log('❌ Fejl: Screenshot-appen kører ikke (ingen Rettelser/.service.json)');
+            process.exitCode = 1;
         }
     } else {
-        console.log(`❌ Fejl: ${result.error}`);
+        const result = getLatestScreenshot();
+        
+        if (result.success) {
+            console.log(`📸 Seneste screenshot: ${result.relativePath}`);
+            if (result.timestamp) {
+                console.log(`📅 Taget: ${result.timestamp}`);
+            }
+        } else {
+            console.log(`❌ Fejl: ${result.error}`);
+        }
     }
 }
 
-module.exports = { getLatestScreenshot };
\ No newline at end of file
+module.exports = { getLatestScreenshot, watchCaptures };
\ No newline at end of file
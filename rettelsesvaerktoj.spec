@@ -0,0 +1,67 @@
+# -*- mode: python ; coding: utf-8 -*-
+"""
+PyInstaller spec for the tray builds (one-file, windowed):
+
+    pyinstaller rettelsesvaerktoj.spec
+
+builds dist/JensRettelsesvaerktoj-v2.exe, dist/JensRettelsesvaerktoj-FIXED.exe
+and dist/JensScreenshotTool.exe from the three tray wrapper scripts.
+
+Without the excludes below the builds pulled in setuptools (plus its
+runtime hook, which runs at every start), asyncio, multiprocessing and
+all ~60 Pillow format plugins; see build/*/warn-*.txt and xref-*.html.
+None of them is used by the tray app: the tools only read and write
+PNG, JPEG and WebP (footprint.IMAGE_FORMATS), and pystray needs ICO/BMP
+for the icon on Windows.
+"""
+
+EXCLUDES = [
+    'setuptools', 'pkg_resources', 'distutils', '_distutils_hack',
+    'asyncio', 'multiprocessing',
+    'pydoc', 'lib2to3', 'tkinter.test',
+    'PIL.ImageQt', 'PIL.ImageShow',
+] + [f'PIL.{plugin}ImagePlugin' for plugin in (
+    'Avif', 'Blp', 'BufrStub', 'Cur', 'Dcx', 'Dds', 'Eps', 'Fits', 'Fli', 'Fpx',
+    'Ftex', 'Gbr', 'GribStub', 'Hdf5Stub', 'Icns', 'Im', 'Imt', 'Jpeg2K', 'McIdas',
+    'Mic', 'Mpeg', 'Msp', 'Palm', 'Pcd', 'Pcx', 'Pdf', 'Pixar', 'Psd', 'Qoi', 'Sgi',
+    'Spider', 'Sun', 'Tga', 'Wmf', 'XVThumb', 'Xbm', 'Xpm',
+)]
+
+# Loaded by name at runtime, so the import scan cannot see them
+HIDDEN_IMPORTS = ['plyer.platforms.win.notification', 'pystray._win32']
+
+BUILDS = [
+    ('jens-screenshot-tool.py', 'JensRettelsesvaerktoj-v2'),
+    ('jens-fixed.py', 'JensRettelsesvaerktoj-FIXED'),
+    ('simple-screenshot.py', 'JensScreenshotTool'),
+]
+
+for script, name in BUILDS:
+    a = Analysis(
+        [script],
+        pathex=['.'],
+        binaries=[],
+        datas=[],
+        hiddenimports=HIDDEN_IMPORTS,
+        hookspath=[],
+        hooksconfig={},
+        runtime_hooks=[],
+        excludes=EXCLUDES,
+        noarchive=False,
+    )
+    pyz = PYZ(a.pure)
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name=name,
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+    )
@@ -0,0 +1,32 @@
+"""
+Jens Rettelsesvaerktoj - shared building blocks for the screenshot tools
+- pipeline: background encode/write queue used by _capture_area
+- ui / overlay: shared Tk thread and the pre-built selection overlay
+- snapping: edge map of the frozen frame that the selection rubber band snaps to
+- capture: capture backends (X11 MIT-SHM, ImageGrab) with a startup self-benchmark
+- monitors: monitor layout with per-monitor DPI, Tk-to-physical mapping, grabs of only the monitors touched
+- naming: collision-free, millisecond capture names
+- burst: burst and timed-sequence capture sessions
+- dedup: pixel-hash index that turns repeat captures into hard links
+- similarity: perceptual hashes in a multi-index table for near-duplicate lookups
+- tiles: optional tile-delta storage against the previous capture
+- encoders: content-aware choice of palette PNG, tuned PNG or lossless WebP
+- catalogue: SQLite (WAL) index of every capture, replacing screenshot-log.txt
+- publish: staged writes, atomic renames, LATEST pointer and the cross-instance writer lock
+- retention: size/age budgets, LRU eviction with pinning, idle-time recompaction, dry-run report
+- thumbnails: per-capture preview pyramid cache, filled at capture time or lazily
+- annotations / annotator: vector annotation sidecars, composited on read with a per-version
+  render cache that re-renders only changed regions; the Tk editor shown after a selection
+- service: localhost HTTP API (capture now, latest, list since id, live event stream, annotated)
+- cli: python -m rettelsesvaerktoj tray | capture --full/--region | latest (GUI imports only for tray)
+- latency: per-stage capture timings, histograms, rotating .latency.jsonl and a Prometheus snapshot
+- scheduler: single-flight selection overlay, bounded captures in flight, queue/reject policy
+- tray: the Ctrl+Shift+S tray app shared by the jens-*/simple-screenshot scripts
+- notify: desktop notifiers (plyer, PowerShell toast, notify-send/D-Bus, null) behind a
+  worker thread that coalesces bursts and rate-limits
+- pngstream: strip-by-strip hashing and palette PNG writing within a memory ceiling
+- bench: save-path benchmark on synthetic screens with per-machine baselines
+- footprint: restricted image plugin registration, import-time and RSS reports
+"""
+
+__version__ = "2.1.0"
@@ -0,0 +1,438 @@
+"""
+Non-destructive annotations: rectangles, arrows, text and blur.
+
+Annotations never touch the capture. They are kept as vector shapes in
+a JSON sidecar next to it,
+
+    Rettelser/screenshot_....png.annotations.json
+        {"version": 3, "next_id": 4, "shapes": [{"id": 1, "kind": "arrow", ...}]}
+
+and every save() bumps the version. The annotated picture is composited
+on read by AnnotationRenderer and cached per version:
+
+    Rettelser/.annotated/<capture path in the folder>-v<version>.png
+
+Going from one version to the next only re-renders what changed: the
+shapes that were added, removed or edited are diffed by id, their old
+and new bounds are the dirty regions, and each dirty region is restored
+from the original pixels and has every shape touching it drawn again.
+The rest of the previous render (kept in memory, or read back from the
+cache) is reused as is.
+
+Blur shapes redact the original pixels, so they are applied before the
+vector shapes whatever their order; rectangles, arrows and text are
+drawn in the order they were added. Coordinates are capture pixels.
+
+    python -m rettelsesvaerktoj.annotations render <capture>
+"""
+
+import argparse
+import json
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from .publish import atomic_write_text, replace, staging_path
+from .tiles import is_manifest, load as load_tiles
+
+SIDECAR_SUFFIX = ".annotations.json"
+CACHE_DIR = ".annotated"
+
+KINDS = ("rect", "arrow", "text", "blur")
+
+DEFAULT_COLOUR = "#e53935"
+DEFAULT_WIDTH = 4
+DEFAULT_TEXT_SIZE = 28
+DEFAULT_BLUR_RADIUS = 12
+
+# Arrow head length per unit of line width
+ARROW_HEAD = 4
+
+# Above this share of the image dirty, a full render is cheaper than patching
+MAX_DIRTY_FRACTION = 0.5
+
+# Captures kept decoded and composited in memory (the one being edited and the last read)
+MEMORY_RENDERS = 2
+
+# Cached renders are written for speed; they can always be rebuilt
+CACHE_COMPRESS_LEVEL = 1
+
+
+def sidecar_path(capture_path):
+    capture_path = Path(capture_path)
+    return capture_path.with_name(capture_path.name + SIDECAR_SUFFIX)
+
+
+def make_shape(kind, box, colour=DEFAULT_COLOUR, width=DEFAULT_WIDTH, text=None,
+               size=DEFAULT_TEXT_SIZE, radius=DEFAULT_BLUR_RADIUS):
+    """A shape dict; box is (x1, y1, x2, y2), for an arrow tail then head, for text its anchor twice"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown annotation kind: {kind}")
+    shape = {"kind": kind, "box": [int(v) for v in box]}
+    if kind in ("rect", "arrow"):
+        shape.update(colour=colour, width=int(width))
+    elif kind == "text":
+        if not text:
+            raise ValueError("Text annotations need text")
+        shape.update(colour=colour, text=str(text), size=int(size))
+    else:
+        shape["radius"] = int(radius)
+    return shape
+
+
+def _ordered(box):
+    x1, y1, x2, y2 = box
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+@lru_cache(maxsize=16)
+def _font(size):
+    for name in ("arialbd.ttf", "DejaVuSans-Bold.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, ImportError, OSError):
+        return ImageFont.load_default()  # Older Pillow or no FreeType: fixed bitmap font
+
+
+def _text_stroke(size):
+    """White outline width for text; bitmap fonts cannot be stroked"""
+    if not isinstance(_font(size), ImageFont.FreeTypeFont):
+        return 0
+    return max(1, size // 12)
+
+
+def bounds(shape):
+    """Pixels the shape can change, (x1, y1, x2, y2) exclusive"""
+    kind = shape["kind"]
+    if kind == "text":
+        x, y = shape["box"][:2]
+        stroke = _text_stroke(shape["size"])
+        left, top, right, bottom = _font(shape["size"]).getbbox(shape["text"], stroke_width=stroke)
+        return (x + left - 1, y + top - 1, x + right + 1, y + bottom + 1)
+    x1, y1, x2, y2 = _ordered(shape["box"])
+    if kind == "blur":
+        return (x1, y1, x2, y2)
+    pad = shape["width"] * (ARROW_HEAD + 1 if kind == "arrow" else 1) + 1
+    return (x1 - pad, y1 - pad, x2 + pad + 1, y2 + pad + 1)
+
+
+def _clip(box, size):
+    x1, y1, x2, y2 = box
+    box = (max(0, x1), max(0, y1), min(size[0], x2), min(size[1], y2))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+
+def _intersect(a, b):
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _merge(boxes):
+    """Union overlapping boxes so no pixel is rendered twice"""
+    merged = []
+    for box in boxes:
+        while True:
+            for other in merged:
+                if _intersect(box, other):
+                    merged.remove(other)
+                    box = (min(box[0], other[0]), min(box[1], other[1]),
+                           max(box[2], other[2]), max(box[3], other[3]))
+                    break
+            else:
+                break
+        merged.append(box)
+    return merged
+
+
+class Annotations:
+    """The sidecar of one capture: load, edit, save() (which bumps the version)"""
+
+    def __init__(self, capture_path):
+        self.capture_path = Path(capture_path)
+        self.path = sidecar_path(self.capture_path)
+        self.version = 0
+        self.next_id = 1
+        self.shapes = []
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Could not read {self.path.name}: {e}")
+            return
+        self.version = data.get("version", 0)
+        self.shapes = data.get("shapes", [])
+        self.next_id = data.get("next_id", max((s["id"] for s in self.shapes), default=0) + 1)
+
+    def add(self, shape):
+        shape = dict(shape, id=self.next_id)
+        self.next_id += 1
+        self.shapes.append(shape)
+        return shape["id"]
+
+    def update(self, shape_id, **changes):
+        for index, shape in enumerate(self.shapes):
+            if shape["id"] == shape_id:
+                self.shapes[index] = dict(shape, **changes)
+                return True
+        return False
+
+    def remove(self, shape_id):
+        before = len(self.shapes)
+        self.shapes = [shape for shape in self.shapes if shape["id"] != shape_id]
+        return len(self.shapes) != before
+
+    def undo(self):
+        """Remove the newest shape; its id, or None"""
+        if not self.shapes:
+            return None
+        return self.shapes.pop()["id"]
+
+    def save(self):
+        """Write the sidecar atomically as the next version; returns it (unchanged if the write fails)"""
+        version = self.version + 1
+        atomic_write_text(self.path, json.dumps(
+            {"version": version, "next_id": self.next_id, "shapes": self.shapes},
+            ensure_ascii=False
+        ))
+        self.version = version
+        return version
+
+
+def _open_capture(path):
+    if is_manifest(path):
+        return load_tiles(path).convert('RGB')
+    with Image.open(path) as image:
+        return image.convert('RGB')
+
+
+class _Render:
+    def __init__(self, version, shapes, image, original=None):
+        self.version = version
+        self.shapes = shapes
+        self.image = image
+        self.original = original  # Decoded capture, kept while editing so patches need no decode
+
+
+class AnnotationRenderer:
+    """Composites captures with their sidecars, reusing the previous version's render"""
+
+    def __init__(self, root, memory_renders=MEMORY_RENDERS):
+        self.root = Path(root)
+        self.cache_dir = self.root / CACHE_DIR
+        self.memory_renders = memory_renders
+        self._renders = OrderedDict()  # capture path -> _Render
+        self._lock = threading.Lock()
+        self.full_renders = 0
+        self.patched_pixels = 0
+
+    def _key(self, capture_path):
+        """Cache name of a capture: its path in the folder, flattened (burst frames share names)"""
+        capture_path = Path(capture_path)
+        try:
+            return capture_path.relative_to(self.root).as_posix().replace("/", "__")
+        except ValueError:
+            return capture_path.name
+
+    def cache_path(self, capture_path, version):
+        return self.cache_dir / f"{self._key(capture_path)}-v{version}.png"
+
+    def _manifest_path(self, capture_path):
+        return self.cache_dir / f"{self._key(capture_path)}.json"
+
+    def render(self, capture_path, annotations=None):
+        """The annotated image (the capture itself without annotations); not written to disk"""
+        capture_path = Path(capture_path)
+        if annotations is None:
+            annotations = Annotations(capture_path)
+        with self._lock:
+            return self._render(capture_path, annotations).image
+
+    def render_path(self, capture_path):
+        """Path of the annotated image for reading: the cached render, or the capture itself"""
+        capture_path = Path(capture_path)
+        annotations = Annotations(capture_path)
+        if not annotations.shapes:
+            return capture_path
+        cached = self.cache_path(capture_path, annotations.version)
+        with self._lock:
+            if cached.exists():
+                return cached
+            render = self._render(capture_path, annotations)
+            self._write(capture_path, render)
+        return cached
+
+    def forget(self, capture_path):
+        """Drop a capture's sidecar and cached renders (the capture is gone)"""
+        capture_path = Path(capture_path)
+        with self._lock:
+            self._renders.pop(capture_path, None)
+        removed = 0
+        paths = [sidecar_path(capture_path), self._manifest_path(capture_path)]
+        if self.cache_dir.exists():
+            paths += self.cache_dir.glob(f"{self._key(capture_path)}-v*.png")
+        for path in paths:
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _render(self, capture_path, annotations):
+        """Render for annotations.version, from the previous render where possible (lock held)"""
+        previous = self._renders.get(capture_path) or self._load_cached(capture_path)
+        if previous is not None and previous.version == annotations.version:
+            self._renders.move_to_end(capture_path)
+            return previous
+
+        original = previous.original if previous is not None and previous.original is not None \
+            else _open_capture(capture_path)
+        shapes = [dict(shape) for shape in annotations.shapes]
+        dirty = self._dirty(previous, shapes, original.size) if previous is not None else None
+        if dirty is None:
+            image = original.copy()
+            self._draw(image, original, shapes, (0, 0) + original.size)
+            self.full_renders += 1
+        else:
+            image = previous.image.copy()
+            for box in dirty:
+                self._draw(image, original, shapes, box)
+                self.patched_pixels += _area(box)
+
+        render = _Render(annotations.version, shapes, image, original)
+        self._renders[capture_path] = render
+        self._renders.move_to_end(capture_path)
+        while len(self._renders) > self.memory_renders:
+            self._renders.popitem(last=False)
+        return render
+
+    def _dirty(self, previous, shapes, size):
+        """Merged boxes that differ between previous and shapes; None if a full render is due"""
+        if previous.image.size != size:
+            return None
+        old = {shape["id"]: shape for shape in previous.shapes}
+        new = {shape["id"]: shape for shape in shapes}
+        common = [shape_id for shape_id in new if shape_id in old]
+        if common != [shape_id for shape_id in old if shape_id in new]:
+            return None  # Reordered: stacking changes where shapes overlap
+
+        boxes = []
+        for shape_id in old.keys() | new.keys():
+            if old.get(shape_id) == new.get(shape_id):
+                continue
+            for shape in (old.get(shape_id), new.get(shape_id)):
+                box = _clip(bounds(shape), size) if shape is not None else None
+                if box is not None:
+                    boxes.append(box)
+        boxes = _merge(boxes)
+        if sum(_area(box) for box in boxes) > MAX_DIRTY_FRACTION * size[0] * size[1]:
+            return None
+        return boxes
+
+    def _draw(self, image, original, shapes, box):
+        """Restore box from the original and draw every shape that touches it"""
+        region = original.crop(box)
+        left, top = box[:2]
+        for shape in shapes:
+            if shape["kind"] != "blur":
+                continue
+            whole = _clip(bounds(shape), original.size)
+            target = _intersect(whole, box) if whole is not None else None
+            if target is None:
+                continue
+            # Blur the whole shape with a margin, so a patch matches a full render exactly
+            margin = 3 * shape["radius"]
+            source = _clip((whole[0] - margin, whole[1] - margin, whole[2] + margin, whole[3] + margin),
+                           original.size)
+            blurred = original.crop(source).filter(ImageFilter.GaussianBlur(shape["radius"]))
+            patch = blurred.crop((target[0] - source[0], target[1] - source[1],
+                                  target[2] - source[0], target[3] - source[1]))
+            region.paste(patch, (target[0] - left, target[1] - top))
+
+        draw = ImageDraw.Draw(region)
+        for shape in shapes:
+            if shape["kind"] == "blur" or _intersect(bounds(shape), box) is None:
+                continue
+            x1, y1, x2, y2 = shape["box"]
+            x1, y1, x2, y2 = x1 - left, y1 - top, x2 - left, y2 - top
+            if shape["kind"] == "rect":
+                draw.rectangle(_ordered((x1, y1, x2, y2)), outline=shape["colour"], width=shape["width"])
+            elif shape["kind"] == "arrow":
+                self._arrow(draw, (x1, y1, x2, y2), shape["colour"], shape["width"])
+            else:
+                size = shape["size"]
+                draw.text((x1, y1), shape["text"], fill=shape["colour"], font=_font(size),
+                          stroke_width=_text_stroke(size), stroke_fill="white")
+        image.paste(region, box[:2])
+
+    @staticmethod
+    def _arrow(draw, line, colour, width):
+        x1, y1, x2, y2 = line
+        length = max(1.0, ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5)
+        ux, uy = (x2 - x1) / length, (y2 - y1) / length
+        head = min(length, width * ARROW_HEAD)
+        # Stop the shaft inside the head so its square end does not poke out
+        bx, by = x2 - ux * head, y2 - uy * head
+        draw.line((x1, y1, x2 - ux * head / 2, y2 - uy * head / 2), fill=colour, width=width)
+        draw.polygon([(x2, y2), (bx - uy * head / 2, by + ux * head / 2),
+                      (bx + uy * head / 2, by - ux * head / 2)], fill=colour)
+
+    def _load_cached(self, capture_path):
+        """The newest render on disk as a starting point, or None"""
+        try:
+            manifest = json.loads(self._manifest_path(capture_path).read_text(encoding='utf-8'))
+            with Image.open(self.cache_path(capture_path, manifest["version"])) as image:
+                return _Render(manifest["version"], manifest["shapes"], image.convert('RGB'))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, capture_path, render):
+        """Store render as the cached file for its version and drop older versions (lock held)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_path(capture_path, render.version)
+        staged = staging_path(path)
+        render.image.save(staged, 'PNG', compress_level=CACHE_COMPRESS_LEVEL)
+        replace(staged, path)
+        atomic_write_text(self._manifest_path(capture_path), json.dumps(
+            {"version": render.version, "shapes": render.shapes}, ensure_ascii=False
+        ), durable=False)
+        for old in self.cache_dir.glob(f"{self._key(capture_path)}-v*.png"):
+            if old != path:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass  # Another reader has it open (Windows); dropped next time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rettelsesvaerktoj.annotations")
+    parser.add_argument("--dir", default=None, help="Screenshots folder (default: ./Rettelser)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    render = sub.add_parser("render", help="Print the path of a capture with its annotations")
+    render.add_argument("capture", type=Path, help="Capture file, absolute or inside the folder")
+    args = parser.parse_args(argv)
+
+    root = (Path(args.dir) if args.dir else Path.cwd() / "Rettelser").resolve()
+    capture = args.capture if args.capture.is_absolute() else root / args.capture
+    if not capture.exists():
+        print(f"No such capture: {capture}", file=sys.stderr)
+        return 1
+    print(AnnotationRenderer(root).render_path(capture.resolve()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Annotation window shown after a selection (or from the tray menu).
+
+A small editor on the shared UI thread: pick rectangle, arrow, text or
+blur, drag on the capture (click for text), Ctrl+Z to undo, Enter or
+Escape when done. While dragging only a canvas item moves; on release
+the shape goes into the capture's sidecar (see annotations.py), which is
+saved as a new version, and the renderer patches just the region the
+shape covers before the preview is refreshed. The capture file itself
+is never rewritten.
+
+Large captures are shown scaled to fit MAX_SCREEN_FRACTION of the
+screen; shapes are stored in capture pixels either way.
+"""
+
+import tkinter as tk
+from tkinter import messagebox, simpledialog
+
+from PIL import Image, ImageTk
+
+from .annotations import Annotations, DEFAULT_COLOUR, DEFAULT_WIDTH, make_shape
+
+TOOLS = (("rect", "Rektangel"), ("arrow", "Pil"), ("text", "Tekst"), ("blur", "Slør"))
+
+# Largest share of the screen the preview may take
+MAX_SCREEN_FRACTION = 0.85
+
+# Drags shorter than this (screen pixels) are taken as a slip, not a shape
+MIN_DRAG = 4
+
+
+class AnnotationEditor:
+    def __init__(self, ui, renderer, on_done=None):
+        """on_done(capture_path, annotations) runs on the UI thread when the window closes"""
+        self.ui = ui
+        self.renderer = renderer
+        self.on_done = on_done
+        self.window = None
+        self.canvas = None
+        self.annotations = None
+        self.scale = 1.0
+        self.tool = None
+        self._photo = None
+        self._image_item = None
+        self._preview_item = None
+        self._start = None
+
+    def open(self, capture_path):
+        """Open the editor for capture_path (safe to call from any thread)"""
+        self.ui.call(self._open, capture_path)
+
+    def _open(self, capture_path):
+        if self.window is not None:
+            self._close()
+        annotations = Annotations(capture_path)
+        try:
+            image = self.renderer.render(capture_path, annotations)
+        except OSError as e:
+            print(f"Cannot annotate {capture_path}: {e}")
+            return
+        self.annotations = annotations
+
+        self.window = tk.Toplevel(self.ui.root)
+        self.window.title(f"Annotér - {annotations.capture_path.name}")
+        self.window.attributes('-topmost', True)
+        self.window.protocol('WM_DELETE_WINDOW', self._close)
+
+        toolbar = tk.Frame(self.window)
+        toolbar.pack(side='top', fill='x')
+        self.tool = tk.StringVar(self.window, value=TOOLS[0][0])
+        for value, label in TOOLS:
+            tk.Radiobutton(toolbar, text=label, value=value, variable=self.tool,
+                           indicatoron=False, padx=8, pady=2).pack(side='left')
+        tk.Button(toolbar, text="Færdig", command=self._close).pack(side='right')
+        tk.Button(toolbar, text="Fortryd", command=self._undo).pack(side='right')
+
+        screen_w = self.window.winfo_screenwidth() * MAX_SCREEN_FRACTION
+        screen_h = self.window.winfo_screenheight() * MAX_SCREEN_FRACTION
+        self.scale = min(1.0, screen_w / image.width, screen_h / image.height)
+        size = (max(1, round(image.width * self.scale)), max(1, round(image.height * self.scale)))
+        self.canvas = tk.Canvas(self.window, width=size[0], height=size[1],
+                                highlightthickness=0, cursor='crosshair')
+        self.canvas.pack()
+        self._photo = ImageTk.PhotoImage('RGB', size)
+        self._image_item = self.canvas.create_image(0, 0, anchor='nw', image=self._photo)
+        self._show(image)
+
+        self.canvas.bind('<Button-1>', self._on_press)
+        self.canvas.bind('<B1-Motion>', self._on_drag)
+        self.canvas.bind('<ButtonRelease-1>', self._on_release)
+        self.window.bind('<Control-z>', lambda event: self._undo())
+        self.window.bind('<Escape>', lambda event: self._close())
+        self.window.bind('<Return>', lambda event: self._close())
+        self.window.lift()
+        self.window.focus_force()
+
+    def _show(self, image):
+        """Paste the composited capture into the existing Tk image"""
+        if self.scale < 1.0:
+            image = image.resize((self._photo.width(), self._photo.height()), Image.BILINEAR,
+                                 reducing_gap=1.0)
+        self._photo.paste(image)
+
+    def _to_capture(self, x, y):
+        return round(x / self.scale), round(y / self.scale)
+
+    def _on_press(self, event):
+        self._start = (event.x, event.y)
+        if self.tool.get() == "text":
+            return
+        if self.tool.get() == "arrow":
+            self._preview_item = self.canvas.create_line(
+                event.x, event.y, event.x, event.y, fill=DEFAULT_COLOUR, arrow='last',
+                width=max(1, round(DEFAULT_WIDTH * self.scale))
+            )
+        else:
+            dash = (4, 2) if self.tool.get() == "blur" else None
+            self._preview_item = self.canvas.create_rectangle(
+                event.x, event.y, event.x, event.y, outline=DEFAULT_COLOUR, dash=dash,
+                width=max(1, round(DEFAULT_WIDTH * self.scale))
+            )
+
+    def _on_drag(self, event):
+        if self._preview_item is not None:
+            self.canvas.coords(self._preview_item, *self._start, event.x, event.y)
+
+    def _on_release(self, event):
+        if self._start is None:
+            return
+        (x1, y1), self._start = self._start, None
+        if self._preview_item is not None:
+            self.canvas.delete(self._preview_item)
+            self._preview_item = None
+
+        kind = self.tool.get()
+        if kind == "text":
+            text = simpledialog.askstring("Tekst", "Tekst:", parent=self.window)
+            if not text:
+                return
+            x, y = self._to_capture(x1, y1)
+            shape = make_shape(kind, (x, y, x, y), text=text)
+        else:
+            if max(abs(event.x - x1), abs(event.y - y1)) < MIN_DRAG:
+                return
+            shape = make_shape(kind, self._to_capture(x1, y1) + self._to_capture(event.x, event.y))
+        self._commit(lambda: self.annotations.add(shape))
+
+    def _undo(self):
+        if self.annotations is not None and self.annotations.shapes:
+            self._commit(self.annotations.undo)
+
+    def _commit(self, edit):
+        """Apply edit(), save the sidecar as a new version and refresh the preview from the patched render
+
+        If the save fails the edit is rolled back, so the shapes always match
+        the saved version the renderer caches by.
+        """
+        shapes, next_id = list(self.annotations.shapes), self.annotations.next_id
+        edit()
+        try:
+            self.annotations.save()
+        except OSError as e:
+            self.annotations.shapes, self.annotations.next_id = shapes, next_id
+            print(f"Could not save annotations: {e}")
+            messagebox.showerror("Annotér", f"Kunne ikke gemme annoteringen:\n{e}", parent=self.window)
+            return
+        self._show(self.renderer.render(self.annotations.capture_path, self.annotations))
+
+    def _close(self):
+        window, annotations = self.window, self.annotations
+        if window is None:
+            return
+        self.window = self.canvas = self.annotations = None
+        self._photo = None
+        window.destroy()
+        if self.on_done is not None:
+            self.on_done(annotations.capture_path, annotations)
@@ -0,0 +1,372 @@
+"""
+Save-path benchmark on synthetic screens.
+
+    python -m rettelsesvaerktoj bench [--screens 1080p,4k] [--kinds text,photo] [--repeat 3]
+    python -m rettelsesvaerktoj bench --save-baseline      # record this machine's numbers
+    python -m rettelsesvaerktoj bench --threshold 0.15     # exit 1 on a regression
+
+Screens are generated deterministically (same seed, same pixels) in
+three kinds that stress the encoders differently:
+
+- text: light UI with sidebar, toolbar and lines of anti-aliased text
+- dashboard: flat cards, bar charts and a handful of colours
+- photo: smooth map-like colour fields with grain and roads
+
+at 1080p, 1440p, 4K and two 4K monitors side by side (8k-dual).
+
+Each case runs in a fresh interpreter through the save path the tray
+app uses (CapturePipeline with PixelStore, SimilarityIndex,
+AdaptiveEncoder, Publisher and thumbnail pyramid, in a temporary
+folder). After one unmeasured warm-up save it measures the time from
+handing over the in-memory grab to the file being committed, the
+encoded size, and the peak resident memory the saves need on top of the
+grab itself (which encoders.MEMORY_CEILING bounds): the child's peak
+RSS (ru_maxrss, PeakWorkingSetSize on Windows) minus its RSS once the
+grab is loaded. A process of its own per case keeps one case's
+allocator and Pillow block cache from hiding the next one's memory.
+One pixel is changed per repetition so dedup never short-circuits the
+encode. Time is the best of
+--repeat saves (least disturbed by other load on the machine) and size
+the median.
+
+Baselines are per machine and are not checked in: --save-baseline writes
+the results to the baseline file; later runs compare against it and fail
+when throughput drops, or size or peak memory grows, by more than
+--threshold (memory only counts beyond MEMORY_SLACK_BYTES).
+"""
+
+import json
+import os
+import platform
+import queue
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .footprint import format_bytes, peak_rss_bytes, rss_bytes
+
+SCREENS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+    "8k-dual": (7680, 2160),
+}
+
+KINDS = ("text", "dashboard", "photo")
+
+SEED = 20240917
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15
+BASELINE_NAME = "screenshot-bench-baseline.json"
+
+# Peak memory differences below this are noise (allocator, thread stacks)
+MEMORY_SLACK_BYTES = 16 * 1024 ** 2
+
+# Seconds a single save may take before the run is abandoned
+SAVE_TIMEOUT = 120
+
+
+def synthetic_screen(kind, size, seed=SEED):
+    """Deterministic synthetic screen of the given kind and (width, height)"""
+    rng = random.Random(f"{seed}-{kind}-{size[0]}x{size[1]}")
+    if kind == "text":
+        return _text_screen(size, rng)
+    if kind == "dashboard":
+        return _dashboard_screen(size, rng)
+    if kind == "photo":
+        return _photo_screen(size, rng)
+    raise ValueError(f"Unknown screen kind: {kind}")
+
+
+def _words(rng, count):
+    return " ".join(
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyzæøå") for _ in range(rng.randint(2, 10)))
+        for _ in range(count)
+    )
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, ImportError, OSError):
+        return ImageFont.load_default()  # Older Pillow or no FreeType: fixed bitmap font
+
+
+def _text_screen(size, rng):
+    width, height = size
+    scale = height / 1080
+    image = Image.new("RGB", size, (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    font = _font(max(10, round(13 * scale)))
+
+    toolbar = round(40 * scale)
+    sidebar = width // 6
+    draw.rectangle((0, 0, width, toolbar), fill=(45, 45, 48))
+    draw.rectangle((0, toolbar, sidebar, height), fill=(236, 238, 241))
+    for x in range(round(12 * scale), width // 3, round(90 * scale)):
+        draw.text((x, round(12 * scale)), _words(rng, 1).title(), fill=(230, 230, 230), font=font)
+
+    line = round(20 * scale)
+    words_per_line = max(6, (width - sidebar) // round(70 * scale))
+    for y in range(toolbar + line, height - line, line):
+        draw.text((round(16 * scale), y), _words(rng, 2), fill=(60, 60, 60), font=font)
+        if rng.random() < 0.12:
+            continue  # Paragraph break
+        colour = (20, 90, 200) if rng.random() < 0.05 else (30, 30, 30)
+        draw.text((sidebar + round(24 * scale), y), _words(rng, rng.randint(words_per_line // 2, words_per_line)),
+                  fill=colour, font=font)
+    return image
+
+
+def _dashboard_screen(size, rng):
+    width, height = size
+    palette = [(33, 150, 243), (76, 175, 80), (255, 152, 0), (244, 67, 54), (156, 39, 176)]
+    image = Image.new("RGB", size, (243, 244, 246))
+    draw = ImageDraw.Draw(image)
+    margin = max(8, width // 120)
+    columns, rows = max(2, width // 640), 3
+    card_w = (width - margin * (columns + 1)) // columns
+    card_h = (height - margin * (rows + 1)) // rows
+    for row in range(rows):
+        for column in range(columns):
+            x = margin + column * (card_w + margin)
+            y = margin + row * (card_h + margin)
+            draw.rectangle((x, y, x + card_w, y + card_h), fill=(255, 255, 255), outline=(220, 220, 225))
+            colour = rng.choice(palette)
+            bars = rng.randint(6, 14)
+            bar_w = (card_w - 2 * margin) // bars
+            for index in range(bars):
+                bar_h = rng.randint(card_h // 8, card_h * 3 // 4)
+                bx = x + margin + index * bar_w
+                draw.rectangle((bx, y + card_h - margin - bar_h, bx + bar_w * 2 // 3, y + card_h - margin),
+                               fill=colour)
+    return image
+
+
+def _photo_screen(size, rng):
+    width, height = size
+    # Smooth colour fields: a coarse random grid scaled up
+    coarse = (max(2, width // 48), max(2, height // 48))
+    field = Image.frombytes("RGB", coarse, rng.randbytes(coarse[0] * coarse[1] * 3))
+    image = field.resize(size, Image.BICUBIC)
+
+    # Fine grain from one tile repeated across the screen
+    tile = Image.frombytes("L", (256, 256), rng.randbytes(256 * 256)).convert("RGB")
+    grain = Image.new("RGB", size)
+    for x in range(0, width, 256):
+        for y in range(0, height, 256):
+            grain.paste(tile, (x, y))
+    image = Image.blend(image, grain, 0.12)
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(max(8, width // 120)):
+        points = [(rng.randrange(width), rng.randrange(height)) for _ in range(4)]
+        draw.line(points, fill=(250, 250, 245), width=max(2, height // 360))
+    return image
+
+
+def _save_path(root):
+    """The pipeline the tray app saves through, rooted in a scratch folder"""
+    from .dedup import PixelStore
+    from .encoders import AdaptiveEncoder
+    from .pipeline import CapturePipeline
+    from .publish import Publisher
+    from .similarity import SimilarityIndex
+    from .thumbnails import ThumbnailCache
+
+    publisher = Publisher(root)
+    pipeline = CapturePipeline(
+        workers=1,
+        store=PixelStore(root),
+        similarity=SimilarityIndex(root),
+        encoder=AdaptiveEncoder(),
+        publisher=publisher,
+        thumbnails=ThumbnailCache(root, None),
+    )
+    return pipeline, publisher
+
+
+def _save_once(pipeline, root, image, index):
+    """Save image with one pixel changed (in place); returns (seconds, SavedCapture)"""
+    image.putpixel((index % image.width, 0), (index % 256, 255, 0))  # Defeat dedup
+    saved = queue.Queue()
+    started = time.perf_counter()
+    pipeline.submit(image, root / f"capture-{index}.png",
+                    on_saved=saved.put, on_error=lambda job, error: saved.put(error))
+    result = saved.get(timeout=SAVE_TIMEOUT)
+    elapsed = time.perf_counter() - started
+    if isinstance(result, Exception):
+        raise result
+    return elapsed, result
+
+
+def measure_case(root, source_path, kind, screen, repeat=DEFAULT_REPEAT, own_process=True):
+    """Save the screen in source_path repeat times through a fresh save path; returns the case's result dict
+
+    own_process: this interpreter runs nothing else, so its peak RSS is the case's.
+    """
+    size = SCREENS[screen]
+    seconds, sizes, encoders = [], [], []
+    root.mkdir(parents=True)
+    pipeline, publisher = _save_path(root)
+    try:
+        # A tiny save first, so lazy imports are resident before the grab is measured
+        _save_once(pipeline, root, Image.new("RGB", (64, 64)), -1)
+        source = Image.open(source_path)
+        source.load()  # The "grab": one frame in memory, as the tray app hands over
+        grabbed = rss_bytes()
+
+        # Unmeasured first save: the encoder's first cost measurement
+        _save_once(pipeline, root, source, 0)
+        for index in range(1, repeat + 1):
+            elapsed, result = _save_once(pipeline, root, source, index)
+            seconds.append(elapsed)
+            sizes.append(result.size_bytes)
+            encoders.append(result.encoding.encoder if result.encoding is not None else "png")
+        peak = peak_rss_bytes() if own_process else None
+    finally:
+        pipeline.shutdown(wait=True, timeout=SAVE_TIMEOUT)
+        publisher.close()
+
+    megapixels = size[0] * size[1] / 1e6
+    best = min(seconds)
+    return {
+        "case": f"{screen}/{kind}",
+        "width": size[0],
+        "height": size[1],
+        "seconds": best,
+        "median_seconds": statistics.median(seconds),
+        "mp_per_s": megapixels / best,
+        "bytes": int(statistics.median(sizes)),
+        "encoder": max(set(encoders), key=encoders.count),
+        "peak_rss_delta_bytes": None if peak is None or grabbed is None else max(0, peak - grabbed),
+    }
+
+
+def run_case(root, kind, screen, repeat=DEFAULT_REPEAT):
+    """Run one case in a fresh interpreter, so its peak RSS is not the previous cases'"""
+    source_path = root.with_name(root.name + "-source.ppm")
+    synthetic_screen(kind, SCREENS[screen]).save(source_path)
+    try:
+        if getattr(sys, "frozen", False):
+            # No interpreter to start in a frozen build: timings and sizes only
+            return measure_case(root, source_path, kind, screen, repeat, own_process=False)
+        parent = str(Path(__file__).resolve().parent.parent)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (parent, os.environ.get("PYTHONPATH")))))
+        completed = subprocess.run(
+            [sys.executable, "-m", "rettelsesvaerktoj.bench", screen, kind, str(source_path), str(root), str(repeat)],
+            capture_output=True, text=True, env=env
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"{screen}/{kind} failed:\n{completed.stderr.strip()}")
+        return json.loads(completed.stdout)
+    finally:
+        source_path.unlink()
+
+
+def run(screens=tuple(SCREENS), kinds=KINDS, repeat=DEFAULT_REPEAT, progress=None):
+    """Run every screen x kind case; progress(result) is called after each"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="rettelser-bench-") as scratch:
+        for screen in screens:
+            for kind in kinds:
+                result = run_case(Path(scratch) / f"{screen}-{kind}", kind, screen, repeat)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+
+def environment():
+    from PIL import __version__ as pillow_version
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pillow": pillow_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def save_baseline(path, results):
+    data = dict(environment(), results={result["case"]: result for result in results})
+    Path(path).write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+def load_baseline(path):
+    """{case: result} from a baseline file, or None if there is none"""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))["results"]
+    except FileNotFoundError:
+        return None
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regressions against the baseline, as readable lines (empty if none)"""
+    regressions = []
+    for result in results:
+        base = baseline.get(result["case"])
+        if base is None:
+            continue
+        case = result["case"]
+        if result["mp_per_s"] < base["mp_per_s"] * (1 - threshold):
+            regressions.append(f"{case}: throughput {result['mp_per_s']:.1f} MP/s, "
+                               f"baseline {base['mp_per_s']:.1f} MP/s")
+        if result["bytes"] > base["bytes"] * (1 + threshold):
+            regressions.append(f"{case}: size {result['bytes'] / 1024:.0f} KB, "
+                               f"baseline {base['bytes'] / 1024:.0f} KB")
+        peak, base_peak = result.get("peak_rss_delta_bytes"), base.get("peak_rss_delta_bytes")
+        if (peak is not None and base_peak is not None
+                and peak > base_peak * (1 + threshold) and peak - base_peak > MEMORY_SLACK_BYTES):
+            regressions.append(f"{case}: peak memory {format_bytes(peak)}, baseline {format_bytes(base_peak)}")
+    return regressions
+
+
+def format_result(result):
+    return (f"{result['case']:<18} {result['seconds'] * 1000:>8.0f} ms {result['mp_per_s']:>7.1f} MP/s "
+            f"{result['bytes'] / 1024:>9.0f} KB  {result['encoder']:<14} "
+            f"peak +{format_bytes(result['peak_rss_delta_bytes'])}")
+
+
+def main(screens=tuple(SCREENS), kinds=KINDS, repeat=DEFAULT_REPEAT, baseline_path=BASELINE_NAME,
+         write_baseline=False, threshold=DEFAULT_THRESHOLD, as_json=False):
+    """Run the benchmark and compare or save the baseline; returns a process exit code"""
+    from .footprint import restrict_image_plugins
+    restrict_image_plugins()
+
+    results = run(screens, kinds, repeat, progress=None if as_json else lambda r: print(format_result(r)))
+    if as_json:
+        print(json.dumps(results, indent=2))
+
+    if write_baseline:
+        save_baseline(baseline_path, results)
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(f"No baseline at {baseline_path} (create one with --save-baseline)", file=sys.stderr)
+        return 0
+    regressions = compare(results, baseline, threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    if regressions:
+        return 1
+    print(f"No regressions beyond {threshold:.0%} against {baseline_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    # One case, run by run_case() in a child process: screen kind source root repeat
+    from .footprint import restrict_image_plugins
+    restrict_image_plugins()
+    screen, kind, source, root, repeat = sys.argv[1:6]
+    print(json.dumps(measure_case(Path(root), Path(source), kind, screen, int(repeat))))
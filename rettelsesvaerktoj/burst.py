@@ -0,0 +1,201 @@
+"""
+Burst and timed-sequence capture.
+
+Frames are grabbed at the target rate into memory and handed to the
+background CapturePipeline by a feeder thread, so a slow encode never
+slows the grab loop down. Frames count against max_bytes (by default
+the scheduler's MAX_IN_FLIGHT_BYTES) from grab until they are on disk;
+when the pipeline falls that far behind, grabbing waits for it and the
+achieved fps drops instead of memory growing. Every burst is one session folder
+(Rettelser/burst_<timestamp>/) with monotonically numbered frames and a
+session.json summary including the fps actually achieved.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from .naming import capture_timestamp
+from .publish import atomic_write_text
+from .scheduler import MAX_IN_FLIGHT_BYTES
+
+DEFAULT_BURST_FRAMES = 10
+DEFAULT_BURST_FPS = 10
+
+# Hard limits so a held hotkey cannot fill the disk (memory is bounded by max_bytes)
+MAX_BURST_FRAMES = 300
+MAX_BURST_SECONDS = 30
+
+_END = object()
+
+
+class BurstSession:
+    """One burst: its folder, timing and how many frames made it to disk"""
+
+    def __init__(self, directory, target_fps):
+        self.directory = directory
+        self.name = directory.name
+        self.target_fps = target_fps
+        self.started_at = datetime.now()
+        self.frame_offsets = []
+        self.capture_seconds = 0.0
+        self.saved = 0
+        self.failed = 0
+        self.capture_done = False
+        self.bytes_held = 0  # Grabbed frames not yet on disk
+        self.throttled = 0  # Frame intervals spent waiting for the pipeline
+        self._lock = threading.Condition()
+
+    @property
+    def frames(self):
+        return len(self.frame_offsets)
+
+    @property
+    def achieved_fps(self):
+        if self.frames < 2 or self.capture_seconds <= 0:
+            return float(self.frames)
+        # Rate between first and last frame, not including the setup time
+        span = self.frame_offsets[-1] - self.frame_offsets[0]
+        return (self.frames - 1) / span if span > 0 else float(self.frames)
+
+    def frame_path(self, index):
+        return self.directory / f"frame_{index:04d}.png"
+
+    def summary(self):
+        return {
+            "session": self.name,
+            "started": self.started_at.isoformat(timespec="milliseconds"),
+            "frames": self.frames,
+            "saved": self.saved,
+            "failed": self.failed,
+            "target_fps": self.target_fps,
+            "achieved_fps": round(self.achieved_fps, 2),
+            "capture_seconds": round(self.capture_seconds, 3),
+            "throttled": self.throttled,
+            "frame_offsets": [round(offset, 4) for offset in self.frame_offsets],
+        }
+
+
+class BurstCapture:
+    def __init__(self, pipeline, screenshots_dir, grab, max_bytes=MAX_IN_FLIGHT_BYTES):
+        """max_bytes: pixel memory of frames grabbed but not yet saved (one frame always fits)"""
+        self.pipeline = pipeline
+        self.screenshots_dir = screenshots_dir
+        self.grab = grab
+        self.max_bytes = max_bytes
+
+    def run(self, frames=None, fps=DEFAULT_BURST_FPS, duration=None, bbox=None,
+            keep_going=None, on_frame_saved=None, on_finished=None):
+        """Capture a burst and return its session once grabbing stops
+
+        Stops after `frames` frames, after `duration` seconds, or as soon as
+        keep_going() returns False, whichever comes first (and always within
+        the MAX_BURST_* limits). Encoding carries on in the background;
+        on_finished(session) runs when the last frame is on disk.
+        """
+        if frames is None and duration is None and keep_going is None:
+            frames = DEFAULT_BURST_FRAMES
+        frames = min(frames or MAX_BURST_FRAMES, MAX_BURST_FRAMES)
+        duration = min(duration or MAX_BURST_SECONDS, MAX_BURST_SECONDS)
+
+        directory = self.screenshots_dir / f"burst_{capture_timestamp()}"
+        directory.mkdir(parents=True, exist_ok=True)
+        session = BurstSession(directory, fps)
+
+        handoff = queue.Queue()
+        feeder = threading.Thread(
+            target=self._feed, args=(session, handoff, on_frame_saved, on_finished),
+            name="burst-feeder", daemon=True
+        )
+        feeder.start()
+
+        interval = 1.0 / fps
+        started = time.perf_counter()
+        next_due = started
+        frame_bytes = 0
+        try:
+            while session.frames < frames:
+                now = time.perf_counter()
+                if now - started >= duration:
+                    break
+                if keep_going is not None and session.frames and not keep_going():
+                    break
+                if not self._room_for(session, frame_bytes, interval):
+                    continue  # Pipeline still behind: check the limits, then wait again
+                now = time.perf_counter()
+                if now < next_due:
+                    time.sleep(next_due - now)
+
+                image = self.grab(bbox=bbox)
+                session.frame_offsets.append(time.perf_counter() - started)
+                frame_bytes = image.width * image.height * len(image.getbands())
+                with session._lock:
+                    session.bytes_held += frame_bytes
+                handoff.put((session.frames, image, frame_bytes))
+                image = None
+
+                # Keep the schedule instead of drifting when a grab runs late
+                next_due += interval
+                if next_due < time.perf_counter():
+                    next_due = time.perf_counter()
+        finally:
+            session.capture_seconds = time.perf_counter() - started
+            handoff.put(_END)
+
+        return session
+
+    def _room_for(self, session, nbytes, timeout):
+        """Wait up to timeout for another nbytes frame to fit; False if it still does not"""
+        fits = lambda: session.bytes_held == 0 or session.bytes_held + nbytes <= self.max_bytes
+        with session._lock:
+            if fits():
+                return True
+            session.throttled += 1
+            return session._lock.wait_for(fits, timeout)
+
+    def _feed(self, session, handoff, on_frame_saved, on_finished):
+        """Move grabbed frames into the pipeline (blocking there is fine here)"""
+        def frame_done(nbytes, saved=None, error=None):
+            with session._lock:
+                session.bytes_held -= nbytes
+                session._lock.notify_all()
+                if error is None:
+                    session.saved += 1
+                else:
+                    session.failed += 1
+                finished = session.capture_done and session.saved + session.failed == session.frames
+            if saved is not None and on_frame_saved:
+                on_frame_saved(session, saved)
+            if finished:
+                self._finish(session, on_finished)
+
+        while True:
+            item = handoff.get()
+            if item is _END:
+                break
+            index, image, nbytes = item
+            try:
+                self.pipeline.submit(
+                    image,
+                    session.frame_path(index),
+                    on_saved=lambda saved, nbytes=nbytes: frame_done(nbytes, saved=saved),
+                    on_error=lambda job, error, nbytes=nbytes: frame_done(nbytes, error=error),
+                )
+            except Exception as e:
+                print(f"Burst frame {index} not saved: {e}")
+                frame_done(nbytes, error=e)
+            item = image = None  # The pipeline holds the frame from here on
+
+        with session._lock:
+            session.capture_done = True
+            finished = session.saved + session.failed == session.frames
+        if finished:
+            self._finish(session, on_finished)
+
+    def _finish(self, session, on_finished):
+        summary = json.dumps(session.summary(), indent=2)
+        atomic_write_text(session.directory / "session.json", summary)
+        if on_finished:
+            on_finished(session)
@@ -0,0 +1,414 @@
+"""
+Screen capture backends.
+
+A backend grabs one rectangle of the virtual desktop (physical pixels)
+into an RGB image:
+
+- xshm: X11 MIT-SHM through ctypes. The X server writes the pixels
+  straight into a shared-memory segment that is allocated once and
+  reused for every grab; the only copy on our side is the single
+  BGRX -> RGB unpack into the image handed to the encoder. ImageGrab
+  on X11 instead receives the whole root window over the X socket,
+  copies it into a bytes object and then decodes and crops that.
+  Rectangles are grabbed natively, so only the monitors a capture
+  touches are read (see monitors.py). The X server handles one request
+  at a time and the segment is shared, so grabs are serialized
+  (concurrent_rects is False) and monitors.py reads the rectangle
+  spanning several monitors in one request instead of one per monitor
+  from a thread pool. The X error
+  handler is only swapped in around the backend's own requests; Xlib's
+  handler table is process-wide and Tk has its own in there.
+- imagegrab: PIL.ImageGrab, available everywhere Pillow can grab.
+
+default_backend() returns the first available backend in BACKENDS
+order, or with benchmark=True times every available one on a full-screen
+grab and keeps the fastest (the tray does this once at startup).
+RETTELSER_CAPTURE_BACKEND=<name> forces a backend.
+
+    python -m rettelsesvaerktoj.capture benchmark [--rounds 5]
+
+prints the timings and checks that every backend returned the same
+pixels; run it under Xvfb (xvfb-run python -m ...) to test the X11 path
+without a desktop.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image
+
+BACKEND_ENV = "RETTELSER_CAPTURE_BACKEND"
+BENCHMARK_ROUNDS = 3
+
+
+class BackendUnavailable(Exception):
+    """Raised when a capture backend cannot run in this session"""
+
+
+class CaptureBackend:
+    name = None
+    # True when grab(bbox) reads only bbox (not a whole screen that is cropped afterwards)
+    native_rect = False
+    # True when grabs of different rectangles may run at the same time and overlap
+    concurrent_rects = True
+
+    def grab(self, bbox=None):
+        """RGB image of bbox (x1, y1, x2, y2) on the virtual desktop; None = everything"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ImageGrabBackend(CaptureBackend):
+    name = "imagegrab"
+
+    def __init__(self):
+        try:
+            from PIL import ImageGrab
+        except ImportError as e:
+            raise BackendUnavailable(str(e))
+        self._grab = ImageGrab.grab
+
+    def grab(self, bbox=None):
+        if sys.platform == "win32":
+            return self._grab(bbox=bbox, all_screens=True)
+        return self._grab(bbox=bbox)
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class _XImage(ctypes.Structure):
+    # Leading fields of Xlib's XImage; the rest is never touched from here
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+    ]
+
+
+_Z_PIXMAP = 2
+_LSB_FIRST = 0
+_ALL_PLANES = ctypes.c_ulong(-1).value
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+# XImage headers kept per rectangle size (all share the one segment)
+_MAX_CACHED_IMAGES = 8
+
+
+def _load(names, find):
+    for name in names:
+        try:
+            return ctypes.CDLL(name, use_errno=True)
+        except OSError:
+            pass
+    # find_library can run ldconfig, so only when the usual names fail
+    path = ctypes.util.find_library(find)
+    if path is None:
+        raise BackendUnavailable(f"lib{find} not found")
+    return ctypes.CDLL(path, use_errno=True)
+
+
+class XShmBackend(CaptureBackend):
+    name = "xshm"
+    native_rect = True
+    concurrent_rects = False
+
+    def __init__(self, display=None):
+        if not sys.platform.startswith("linux") and not sys.platform.startswith("freebsd"):
+            raise BackendUnavailable("MIT-SHM needs X11")
+        display = display or os.environ.get("DISPLAY")
+        if not display:
+            raise BackendUnavailable("DISPLAY is not set")
+
+        self._x11 = x11 = _load(["libX11.so.6", "libX11.so"], "X11")
+        self._xext = xext = _load(["libXext.so.6", "libXext.so"], "Xext")
+        self._libc = libc = _load(["libc.so.6"], "c")
+        self._declare()
+
+        self._lock = threading.Lock()
+        self._images = {}
+        self._display = x11.XOpenDisplay(display.encode())
+        if not self._display:
+            raise BackendUnavailable(f"Cannot open display {display}")
+        self._segment = None
+        try:
+            if not xext.XShmQueryExtension(self._display):
+                raise BackendUnavailable("X server has no MIT-SHM extension")
+
+            # Xlib's default handler exits the process on any X error (see _x_errors)
+            self._x_error = None
+            self._error_handler = self._ERROR_HANDLER(self._on_x_error)
+
+            screen = x11.XDefaultScreen(self._display)
+            self._root = x11.XRootWindow(self._display, screen)
+            self._visual = x11.XDefaultVisual(self._display, screen)
+            self._depth = x11.XDefaultDepth(self._display, screen)
+            self.width = x11.XDisplayWidth(self._display, screen)
+            self.height = x11.XDisplayHeight(self._display, screen)
+
+            # One segment big enough for the whole root window, reused for every grab
+            size = self.width * self.height * 4
+            segment = _XShmSegmentInfo()
+            segment.shmid = libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+            if segment.shmid < 0:
+                raise BackendUnavailable(f"shmget failed: {os.strerror(ctypes.get_errno())}")
+            segment.shmaddr = libc.shmat(segment.shmid, None, 0)
+            if segment.shmaddr in (None, ctypes.c_void_p(-1).value):
+                libc.shmctl(segment.shmid, _IPC_RMID, None)
+                raise BackendUnavailable(f"shmat failed: {os.strerror(ctypes.get_errno())}")
+            segment.readOnly = 0
+            self._segment = segment
+
+            with self._x_errors():
+                attached = xext.XShmAttach(self._display, ctypes.byref(segment))
+                x11.XSync(self._display, 0)
+            # Marked for removal now; the kernel frees it once both sides detach
+            libc.shmctl(segment.shmid, _IPC_RMID, None)
+            if not attached or self._x_error is not None:
+                raise BackendUnavailable("XShmAttach failed (remote display?)")
+
+            # Check the pixel layout once, on a 1x1 image header
+            probe = self._image_for(1, 1)
+            if (probe.bits_per_pixel != 32 or probe.byte_order != _LSB_FIRST
+                    or (probe.red_mask, probe.green_mask, probe.blue_mask) != (0xFF0000, 0xFF00, 0xFF)):
+                raise BackendUnavailable(f"Unsupported visual ({self._depth}-bit, {probe.bits_per_pixel} bpp)")
+        except BaseException:
+            self.close()
+            raise
+
+    _ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+    def _on_x_error(self, display, event):
+        self._x_error = "X error during capture"
+        return 0
+
+    @contextmanager
+    def _x_errors(self):
+        """Catch X errors in _on_x_error for the requests made inside, then put the old handler back"""
+        self._x_error = None
+        previous = self._x11.XSetErrorHandler(ctypes.cast(self._error_handler, ctypes.c_void_p))
+        try:
+            yield
+        finally:
+            self._x11.XSetErrorHandler(previous)
+
+    def _declare(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XFree.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]  # Also takes back a previous handler
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+            ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint,
+        ]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong,
+        ]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def _image_for(self, width, height):
+        """XImage header of this size pointing into the shared segment"""
+        image = self._images.get((width, height))
+        if image is None:
+            if len(self._images) >= _MAX_CACHED_IMAGES:
+                self._x11.XFree(self._images.pop(next(iter(self._images))))
+            pointer = self._xext.XShmCreateImage(
+                self._display, self._visual, self._depth, _Z_PIXMAP,
+                self._segment.shmaddr, ctypes.byref(self._segment), width, height
+            )
+            if not pointer:
+                raise OSError("XShmCreateImage failed")
+            image = self._images[(width, height)] = pointer
+        return image.contents
+
+    def grab(self, bbox=None):
+        x1, y1, x2, y2 = bbox or (0, 0, self.width, self.height)
+        if x1 < 0 or y1 < 0 or x2 > self.width or y2 > self.height or x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Region {bbox} is outside the {self.width}x{self.height} screen")
+        width, height = x2 - x1, y2 - y1
+        with self._lock:
+            image = self._image_for(width, height)
+            pointer = self._images[(width, height)]
+            with self._x_errors():
+                ok = self._xext.XShmGetImage(self._display, self._root, pointer, x1, y1, _ALL_PLANES)
+            if not ok or self._x_error is not None:
+                raise OSError(self._x_error or "XShmGetImage failed")
+            # Decode straight out of shared memory: the one copy the encoder needs anyway
+            pixels = (ctypes.c_char * (image.bytes_per_line * height)).from_address(self._segment.shmaddr)
+            return Image.frombuffer('RGB', (width, height), pixels, 'raw', 'BGRX', image.bytes_per_line, 1)
+
+    def close(self):
+        display = getattr(self, "_display", None)
+        if not display:
+            return
+        for pointer in self._images.values():
+            self._x11.XFree(pointer)
+        self._images.clear()
+        if self._segment is not None:
+            self._xext.XShmDetach(display, ctypes.byref(self._segment))
+            self._x11.XSync(display, 0)
+            self._libc.shmdt(self._segment.shmaddr)
+            self._segment = None
+        self._x11.XCloseDisplay(display)
+        self._display = None
+
+
+# Preference order when there is no benchmark
+BACKENDS = (XShmBackend, ImageGrabBackend)
+
+
+def available_backends(verbose=False):
+    """Instances of every backend that works in this session"""
+    backends = []
+    for backend_class in BACKENDS:
+        try:
+            backends.append(backend_class())
+        except (BackendUnavailable, OSError) as e:
+            if verbose:
+                print(f"Capture backend {backend_class.name} unavailable: {e}")
+    return backends
+
+
+def benchmark(backends, bbox=None, rounds=BENCHMARK_ROUNDS):
+    """[(backend, median seconds per grab)], fastest first; failing backends are left out"""
+    results = []
+    for backend in backends:
+        try:
+            backend.grab(bbox)  # Warm-up: first grabs allocate
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                backend.grab(bbox)
+                timings.append(time.perf_counter() - started)
+        except Exception as e:
+            print(f"Capture backend {backend.name} failed: {e}")
+            continue
+        results.append((backend, statistics.median(timings)))
+    results.sort(key=lambda result: result[1])
+    return results
+
+
+def select(run_benchmark=False):
+    """Pick a backend: forced by BACKEND_ENV, else the fastest (or first) available"""
+    forced = os.environ.get(BACKEND_ENV)
+    if forced:
+        for backend_class in BACKENDS:
+            if backend_class.name == forced:
+                return backend_class()
+        raise BackendUnavailable(f"Unknown capture backend {forced!r}")
+
+    backends = available_backends(verbose=run_benchmark)
+    if not backends:
+        raise BackendUnavailable("No capture backend works in this session")
+    chosen = backends[0]
+    if run_benchmark and len(backends) > 1:
+        results = benchmark(backends)
+        if results:
+            chosen = results[0][0]
+            print("Capture backend: " + ", ".join(
+                f"{backend.name} {seconds * 1000:.1f} ms" for backend, seconds in results
+            ) + f" -> {chosen.name}")
+    for backend in backends:
+        if backend is not chosen:
+            backend.close()
+    return chosen
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_backend(benchmark=False):
+    """The process-wide backend, selected on first use"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = select(benchmark)
+        return _default
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rettelsesvaerktoj.capture")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("benchmark", help="Time every available backend and compare their pixels")
+    bench.add_argument("--rounds", type=int, default=5)
+    bench.add_argument("--region", default=None, metavar="X1,Y1,X2,Y2")
+    args = parser.parse_args(argv)
+
+    bbox = tuple(int(v) for v in args.region.split(",")) if args.region else None
+    backends = available_backends(verbose=True)
+    if not backends:
+        print("No capture backend available")
+        return 1
+
+    results = benchmark(backends, bbox, args.rounds)
+    if not results:
+        print("Every capture backend failed")
+        return 1
+    for backend, seconds in results:
+        print(f"{backend.name:10s} {seconds * 1000:8.1f} ms per grab")
+
+    # Every backend must see the same screen (a static Xvfb screen makes this exact)
+    images = [(backend.name, backend.grab(bbox)) for backend, _ in results]
+    reference_name, reference = images[0]
+    mismatched = 0
+    for name, image in images[1:]:
+        same = image.size == reference.size and image.tobytes() == reference.tobytes()
+        print(f"{name} vs {reference_name}: {'identical' if same else 'DIFFERENT'} ({image.size[0]}x{image.size[1]})")
+        mismatched += not same
+    for backend in backends:
+        backend.close()
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Indexed capture catalogue (SQLite in WAL mode).
+
+Replaces the free-text screenshot-log.txt: every saved capture gets a row
+with id, timestamp, region, dimensions, file size, hashes and encoder.
+The newest capture is the highest rowid and time-range queries use an
+index, so neither needs a directory scan. WAL mode lets readers query
+while the tray app is writing.
+
+    python -m rettelsesvaerktoj.catalogue import-log   # one-shot import of screenshot-log.txt
+    python -m rettelsesvaerktoj.catalogue latest       # print newest capture path
+    python -m rettelsesvaerktoj.catalogue pin <name>   # keep a capture whatever the budget
+"""
+
+import argparse
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+CATALOGUE_NAME = ".catalogue.sqlite3"
+LOG_NAME = "screenshot-log.txt"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename     TEXT NOT NULL,
+    captured_at  TEXT NOT NULL,
+    region       TEXT,
+    width        INTEGER,
+    height       INTEGER,
+    size_bytes   INTEGER,
+    pixel_hash   TEXT,
+    phash        TEXT,
+    encoder      TEXT,
+    encode_ms    REAL,
+    duplicate_of TEXT,
+    session      TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_captured_at ON captures (captured_at);
+CREATE INDEX IF NOT EXISTS captures_filename ON captures (filename);
+"""
+
+# Added after the first release; created on open if an older catalogue lacks them
+ADDED_COLUMNS = (
+    ("pinned", "INTEGER NOT NULL DEFAULT 0"),  # Never evicted by retention
+    ("last_access", "TEXT"),                    # For LRU eviction
+    ("tier", "INTEGER NOT NULL DEFAULT 0"),     # 1 once recompacted
+    ("original_bytes", "INTEGER"),              # Size before compaction
+)
+
+COLUMNS = ("id", "filename", "captured_at", "region", "width", "height", "size_bytes",
+           "pixel_hash", "phash", "encoder", "encode_ms", "duplicate_of", "session") + tuple(
+    name for name, _ in ADDED_COLUMNS)
+
+
+def format_region(area):
+    """'x1,y1,x2,y2', or None for fullscreen"""
+    return None if area is None else ",".join(str(int(v)) for v in area)
+
+
+class Catalogue:
+    def __init__(self, root, path=None):
+        self.root = Path(root)
+        self.path = Path(path) if path is not None else self.root / CATALOGUE_NAME
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(captures)")}
+        with self._db:
+            for name, declaration in ADDED_COLUMNS:
+                if name not in existing:
+                    self._db.execute(f"ALTER TABLE captures ADD COLUMN {name} {declaration}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _relative(self, path):
+        return Path(path).relative_to(self.root).as_posix()
+
+    def record(self, saved, captured_at, area=None, session=None):
+        """Add a saved capture (a pipeline SavedCapture); returns its id"""
+        encoding = saved.encoding
+        width, height = saved.image_size or (None, None)
+        row = (
+            self._relative(saved.filepath),
+            captured_at.isoformat(timespec="milliseconds"),
+            format_region(area),
+            width,
+            height,
+            saved.size_bytes,
+            saved.pixel_digest,
+            f"{saved.perceptual_hash:016x}" if saved.perceptual_hash is not None else None,
+            encoding.encoder if encoding is not None else None,
+            round(encoding.seconds * 1000, 1) if encoding is not None else None,
+            self._relative(saved.duplicate_of) if saved.duplicate_of is not None else None,
+            session,
+        )
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO captures (filename, captured_at, region, width, height, size_bytes,"
+                " pixel_hash, phash, encoder, encode_ms, duplicate_of, session)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            return cursor.lastrowid
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params)]
+
+    def latest(self):
+        """Newest capture as a dict, or None"""
+        rows = self._query("SELECT * FROM captures ORDER BY id DESC LIMIT 1")
+        return rows[0] if rows else None
+
+    def get(self, capture_id):
+        rows = self._query("SELECT * FROM captures WHERE id = ?", (capture_id,))
+        return rows[0] if rows else None
+
+    def since(self, capture_id, limit=1000):
+        """Captures with id greater than capture_id, oldest first"""
+        return self._query(
+            "SELECT * FROM captures WHERE id > ? ORDER BY id LIMIT ?", (capture_id, limit)
+        )
+
+    def between(self, start, end):
+        """Captures taken in [start, end), oldest first (uses the time index)"""
+        return self._query(
+            "SELECT * FROM captures WHERE captured_at >= ? AND captured_at < ? ORDER BY captured_at",
+            (start.isoformat(timespec="milliseconds"), end.isoformat(timespec="milliseconds")),
+        )
+
+    def find_by_filename(self, filename):
+        return self._query("SELECT * FROM captures WHERE filename = ?", (filename,))
+
+    def rows(self):
+        """Every capture, oldest first"""
+        return self._query("SELECT * FROM captures ORDER BY id")
+
+    def _update(self, sql, params):
+        with self._lock, self._db:
+            return self._db.execute(sql, params).rowcount
+
+    def touch(self, capture_id, when=None):
+        """Mark a capture as just used (drives LRU eviction)"""
+        when = (when or datetime.now()).isoformat(timespec="milliseconds")
+        self._update("UPDATE captures SET last_access = ? WHERE id = ?", (when, capture_id))
+
+    def set_size(self, capture_id, width, height):
+        """Fill in the pixel size of a capture recorded without it (imported from the log)"""
+        self._update("UPDATE captures SET width = ?, height = ? WHERE id = ?", (width, height, capture_id))
+
+    def set_pinned(self, capture_id, pinned=True):
+        return self._update("UPDATE captures SET pinned = ? WHERE id = ?", (int(pinned), capture_id))
+
+    def compacted(self, capture_id, size_bytes, encoder):
+        """Record that a capture was rewritten in a denser encoding"""
+        self._update(
+            "UPDATE captures SET original_bytes = COALESCE(original_bytes, size_bytes),"
+            " size_bytes = ?, encoder = ?, tier = 1 WHERE id = ?",
+            (size_bytes, encoder, capture_id),
+        )
+
+    def remove(self, capture_id):
+        self._update("DELETE FROM captures WHERE id = ?", (capture_id,))
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM captures").fetchone()[0]
+
+    def import_log(self, log_path=None):
+        """One-shot import of screenshot-log.txt lines ('dd-mm-YYYY HH:MM:SS - name')"""
+        log_path = Path(log_path) if log_path is not None else self.root / LOG_NAME
+        if not log_path.exists():
+            return 0
+
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT filename FROM captures")}
+
+        rows = []
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                stamp, sep, filename = line.strip().partition(" - ")
+                if not sep or filename in known:
+                    continue
+                try:
+                    captured_at = datetime.strptime(stamp, "%d-%m-%Y %H:%M:%S")
+                except ValueError:
+                    try:
+                        captured_at = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S")
+                    except ValueError:
+                        print(f"Skipping unreadable log line: {line.strip()}")
+                        continue
+                known.add(filename)
+                rows.append((filename, captured_at.isoformat(timespec="milliseconds"))
+                            + self._describe_file(self.root / filename))
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO captures (filename, captured_at, width, height, size_bytes)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def _describe_file(self, path):
+        """(width, height, size_bytes) from the file header, if it still exists"""
+        if not path.exists():
+            return (None, None, None)
+        size_bytes = path.stat().st_size
+        try:
+            from PIL import Image
+            with Image.open(path) as image:  # Reads the header only
+                return (image.width, image.height, size_bytes)
+        except Exception:
+            return (None, None, size_bytes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rettelsesvaerktoj.catalogue")
+    parser.add_argument("--dir", default=None, help="Screenshots folder (default: ./Rettelser)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import-log", help="Import screenshot-log.txt into the catalogue")
+    sub.add_parser("latest", help="Print the path of the newest capture")
+    for command in ("pin", "unpin"):
+        pin = sub.add_parser(command, help=f"{command.capitalize()} a capture (exempt from retention)")
+        pin.add_argument("filename", help="Path relative to the screenshots folder")
+    args = parser.parse_args(argv)
+
+    root = Path(args.dir) if args.dir else Path.cwd() / "Rettelser"
+    catalogue = Catalogue(root)
+    try:
+        if args.command == "import-log":
+            imported = catalogue.import_log()
+            print(f"Imported {imported} captures ({catalogue.count()} in catalogue)")
+        elif args.command == "latest":
+            latest = catalogue.latest()
+            if latest is None:
+                return 1
+            catalogue.touch(latest["id"])
+            print(root / latest["filename"])
+        else:
+            rows = catalogue.find_by_filename(args.filename)
+            if not rows:
+                print(f"Not in catalogue: {args.filename}")
+                return 1
+            for row in rows:
+                catalogue.set_pinned(row["id"], args.command == "pin")
+    finally:
+        catalogue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
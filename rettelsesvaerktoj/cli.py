@@ -0,0 +1,221 @@
+"""
+One entry point for the tools:
+
+    python -m rettelsesvaerktoj tray [--notifier plyer|powershell|notify-send|null] [--footprint] [--tile-storage]
+    python -m rettelsesvaerktoj capture --full
+    python -m rettelsesvaerktoj capture --region x1,y1,x2,y2
+    python -m rettelsesvaerktoj latest [--json] [--annotated]
+    python -m rettelsesvaerktoj footprint [--module M] [--top N]
+    python -m rettelsesvaerktoj bench [--screens ...] [--kinds ...] [--save-baseline] [--threshold T]
+
+capture and latest are meant for scripts calling them in a loop: they
+never import tkinter, pystray, keyboard or plyer, and capture only loads
+what one grab-and-save needs (no dedup/similarity indexes, no adaptive
+encoder, thumbnails filled in lazily on first request). The capture is
+published and catalogued exactly like one from the tray app, under the
+same writer lock, so both can run against the same folder.
+
+Imports are done inside each command so a command only pays for its own.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+def parse_region(value):
+    """'x1,y1,x2,y2' -> (x1, y1, x2, y2)"""
+    try:
+        area = tuple(int(v) for v in value.split(","))
+    except ValueError:
+        area = ()
+    if len(area) != 4 or area[2] <= area[0] or area[3] <= area[1]:
+        raise argparse.ArgumentTypeError("expected x1,y1,x2,y2 with x2 > x1 and y2 > y1")
+    return area
+
+
+def _names(value):
+    """'a,b' -> ('a', 'b')"""
+    return tuple(name.strip() for name in value.split(",") if name.strip())
+
+
+def _describe(root, row):
+    row = dict(row)
+    row["path"] = str(root / row["filename"])
+    return row
+
+
+def capture(root, area=None, publisher=None, catalogue=None):
+    """Grab every monitor (or area, in physical desktop pixels), save and publish it; returns the catalogue row
+
+    Long-running callers pass their own publisher and catalogue (see
+    publish.Publisher, catalogue.Catalogue) and keep them across captures;
+    without them each call opens and closes its own.
+    """
+    from . import monitors
+    from .catalogue import Catalogue
+    from .naming import unique_capture_path
+    from .pipeline import CapturePipeline
+    from .publish import Publisher, clean_staging
+
+    # Only the monitors the area touches; --full grabs every monitor at once
+    screenshot = monitors.current().grab(area)
+    captured_at = datetime.now()
+
+    own_publisher, own_catalogue = publisher is None, catalogue is None
+    if own_publisher:
+        root.mkdir(parents=True, exist_ok=True)
+        # Only this folder's own .staging: a full sweep costs a walk of the whole archive
+        clean_staging(root, recursive=False)
+        publisher = Publisher(root)
+    if own_catalogue:
+        catalogue = Catalogue(root)
+    try:
+        if own_catalogue and catalogue.count() == 0:
+            catalogue.import_log()
+
+        results = []
+        pipeline = CapturePipeline(workers=1, max_pending=1, publisher=publisher)
+        pipeline.submit(
+            screenshot,
+            unique_capture_path(root),
+            on_saved=results.append,
+            on_error=lambda job, error: results.append(error)
+        )
+        screenshot = None
+        pipeline.shutdown(wait=True)
+
+        saved = results[0]
+        if isinstance(saved, Exception):
+            raise saved
+        publisher.update_latest(saved.filename)
+        return _describe(root, catalogue.get(catalogue.record(saved, captured_at, area)))
+    finally:
+        if own_catalogue:
+            catalogue.close()
+        if own_publisher:
+            publisher.close()
+
+
+def latest(root):
+    """Newest capture as a row with "path", or None"""
+    from .catalogue import Catalogue
+    from .publish import read_latest
+
+    catalogue = Catalogue(root)
+    try:
+        row = catalogue.latest()
+        if row is not None:
+            catalogue.touch(row["id"])
+            return _describe(root, row)
+    finally:
+        catalogue.close()
+
+    # Folder never catalogued (older versions only wrote the pointer)
+    pointer = read_latest(root)
+    if pointer is None:
+        return None
+    return {"filename": pointer["file"], "path": str(root / pointer["file"])}
+
+
+def run_tray(root, notifier, footprint=False, tile_storage=False):
+    try:
+        from .notify import NOTIFIERS
+        from .tray import main as tray_main
+    except ImportError as e:
+        print(f"Missing dependency: {e}")
+        print("Please install with: pip install pillow pystray keyboard plyer")
+        return 1
+    return tray_main(root, NOTIFIERS[notifier], footprint, tile_storage)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rettelsesvaerktoj")
+    parser.add_argument("--dir", default=None, help="Screenshots folder (default: ./Rettelser)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    tray = sub.add_parser("tray", help="Run the tray app (Ctrl+Shift+S)")
+    tray.add_argument("--notifier", choices=("plyer", "powershell", "notify-send", "null"), default="plyer")
+    tray.add_argument("--footprint", action="store_true",
+                      help="Print time-to-tray-ready and idle memory")
+    tray.add_argument("--tile-storage", action="store_true",
+                      help="Store only the tiles that changed since the last capture")
+
+    grab = sub.add_parser("capture", help="Take one screenshot and print its path")
+    what = grab.add_mutually_exclusive_group(required=True)
+    what.add_argument("--full", action="store_true", help="Whole screen")
+    what.add_argument("--region", type=parse_region, metavar="X1,Y1,X2,Y2", help="Screen area")
+    grab.add_argument("--json", action="store_true", help="Print the catalogue row as JSON")
+    grab.add_argument("--timing", action="store_true", help="Print the time taken to stderr")
+
+    newest = sub.add_parser("latest", help="Print the path of the newest capture")
+    newest.add_argument("--json", action="store_true", help="Print the catalogue row as JSON")
+    newest.add_argument("--annotated", action="store_true",
+                        help="Path of the capture with its annotations drawn in (rendered if needed)")
+
+    report = sub.add_parser("footprint", help="Import-time and memory report")
+    report.add_argument("--module", default="rettelsesvaerktoj.tray", help="Module to import")
+    report.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+
+    bench = sub.add_parser("bench", help="Save-path benchmark on synthetic screens")
+    bench.add_argument("--screens", type=_names, default=None, help="Comma-separated: 1080p,1440p,4k,8k-dual")
+    bench.add_argument("--kinds", type=_names, default=None, help="Comma-separated: text,dashboard,photo")
+    bench.add_argument("--repeat", type=int, default=3, help="Measured saves per case (best time is reported)")
+    bench.add_argument("--baseline", default=None, help="Baseline file (default: ./screenshot-bench-baseline.json)")
+    bench.add_argument("--save-baseline", action="store_true", help="Record the results as the baseline")
+    bench.add_argument("--threshold", type=float, default=0.15, help="Allowed regression (0.15 = 15%%)")
+    bench.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    args = parser.parse_args(argv)
+    root = Path(args.dir) if args.dir else Path.cwd() / "Rettelser"
+
+    if args.command == "tray":
+        return run_tray(root, args.notifier, args.footprint, args.tile_storage)
+
+    if args.command == "footprint":
+        from .footprint import import_report
+        try:
+            print(import_report(args.module, args.top))
+        except RuntimeError as e:
+            print(f"Could not import {args.module}: {e}")
+            return 1
+        return 0
+
+    if args.command == "bench":
+        from . import bench as suite
+        unknown = set(args.screens or ()) - set(suite.SCREENS) | set(args.kinds or ()) - set(suite.KINDS)
+        if unknown:
+            print(f"Unknown screen or kind: {', '.join(sorted(unknown))}", file=sys.stderr)
+            return 2
+        return suite.main(
+            screens=args.screens or tuple(suite.SCREENS),
+            kinds=args.kinds or suite.KINDS,
+            repeat=args.repeat,
+            baseline_path=args.baseline or suite.BASELINE_NAME,
+            write_baseline=args.save_baseline,
+            threshold=args.threshold,
+            as_json=args.json,
+        )
+
+    if args.command == "capture":
+        started = time.perf_counter()
+        try:
+            row = capture(root, args.region)
+        except Exception as e:
+            print(f"Capture failed: {e}", file=sys.stderr)
+            return 1
+        if args.timing:
+            print(f"Saved in {(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+    else:
+        row = latest(root)
+        if row is None:
+            return 1
+        if args.annotated:
+            from .annotations import AnnotationRenderer
+            row["path"] = str(AnnotationRenderer(root).render_path(Path(row["path"])))
+
+    print(json.dumps(row) if args.json else row["path"])
+    return 0
@@ -0,0 +1,89 @@
+"""
+Content-addressed duplicate elimination for captures.
+
+The raw pixel buffer is hashed before encoding. When the same pixels were
+saved before, the new capture becomes a hard link to the existing file
+(or a plain copy on filesystems without hard links), so the PNG encode is
+skipped entirely. The digest -> file mapping lives in an append-only
+.pixel-index.jsonl inside the screenshots folder.
+
+The pixels are hashed strip by strip, so hashing an 8K capture does not
+need a second full-size copy of it; the digest is the same as hashing
+image.tobytes() in one go. This needs only Pillow, so the headless
+capture CLI (cli -> pipeline -> dedup) never imports numpy.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+INDEX_NAME = ".pixel-index.jsonl"
+
+
+# Hashing working set: the strip copy plus its raw bytes
+DIGEST_STRIP_BYTES = 8 * 1024 ** 2
+
+
+def pixel_digest(image, max_bytes=DIGEST_STRIP_BYTES):
+    """Hash of the decoded pixels (mode, size and raw bytes), not of the PNG"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{image.mode}:{image.width}x{image.height}:".encode('ascii'))
+    # Rows per strip as in pngstream.strips(), inlined so hashing never imports numpy
+    rows = max(1, int(max_bytes // max(1, image.width * 8)))
+    for top in range(0, image.height, rows):  # Strip copy plus its raw bytes
+        h.update(image.crop((0, top, image.width, min(image.height, top + rows))).tobytes())
+    return h.hexdigest()
+
+
+class PixelStore:
+    def __init__(self, root):
+        self.root = root
+        self.index_path = root / INDEX_NAME
+        self._by_digest = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Half-written line from a crash
+                # Only the first (encoded) file for a digest is the original
+                self._by_digest.setdefault(entry["digest"], entry["file"])
+
+    def _relative(self, path):
+        return path.relative_to(self.root).as_posix()
+
+    def lookup(self, digest):
+        """Existing file with these pixels, or None"""
+        with self._lock:
+            relative = self._by_digest.get(digest)
+        if relative is None:
+            return None
+        path = self.root / relative
+        return path if path.exists() else None
+
+    def add(self, digest, path, duplicate_of=None):
+        """Record a capture; the first file seen for a digest becomes the original"""
+        entry = {"digest": digest, "file": self._relative(path)}
+        if duplicate_of is not None:
+            entry["duplicate_of"] = self._relative(duplicate_of)
+        with self._lock:
+            if duplicate_of is None or digest not in self._by_digest:
+                self._by_digest[digest] = entry["file"]
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def link(self, existing, path):
+        """Make path refer to the bytes of existing without re-encoding"""
+        try:
+            os.link(existing, path)
+        except OSError:
+            # No hard links here (FAT, network share, other volume)
+            shutil.copyfile(existing, path)
@@ -0,0 +1,219 @@
+"""
+Content-aware encoder selection for saved captures.
+
+A quick classification (pixel count, number of distinct colours, entropy)
+decides how a capture is written:
+
+- few colours (UI chrome, buttons, flat dashboards): exact palette PNG
+- photo-like content (maps, images) when WebP is available: lossless WebP
+- everything else: PNG with a zlib level that fits the latency budget
+
+Encode cost is predicted per megapixel and corrected with what the
+encoders actually took on this machine, so the choice respects
+latency_budget_ms even on 8K multi-monitor grabs. Every choice, with the
+resulting size and time, is appended to .encoder-log.jsonl.
+
+Encoding stays within memory_ceiling bytes on top of the capture itself,
+whatever its size: palette PNGs are written strip by strip (see
+pngstream.py), Pillow's PNG encoder already deflates row by row straight
+from the image buffer, and lossless WebP, which needs a full-size copy
+plus a large working set, is only considered for captures small enough
+to fit.
+"""
+
+import json
+import math
+import threading
+import time
+
+from PIL import Image, features
+
+from .pngstream import DEFAULT_MEMORY_CEILING as STRIP_BYTES, np, save_palette_png
+
+DEFAULT_LATENCY_BUDGET_MS = 250
+
+# Colour counting stops caring above this (palette PNG is out anyway)
+MAX_PALETTE_COLOURS = 256
+
+# Images larger than this get a cheap sampled colour check first
+SAMPLE_ABOVE_PIXELS = 1_000_000
+SAMPLE_STEP = 8
+
+# Entropy (bits per grey level, 0-8) above which content counts as photo-like
+PHOTO_ENTROPY = 6.5
+
+# Starting guesses for encode cost in ms per megapixel; replaced by
+# measurements as captures are saved
+INITIAL_MS_PER_MPIX = {
+    "png-palette": 40.0,
+    "png-1": 30.0,
+    "png-6": 90.0,
+    "png-9": 260.0,
+    "webp-lossless": 180.0,
+}
+
+# Memory an encode may use beyond the capture itself; lossless WebP
+# (WEBP_BYTES_PER_PIXEL) fits up to about 3.7 MP, i.e. 1440p
+MEMORY_CEILING = 128 * 1024 ** 2
+
+# Peak memory per pixel of a lossless WebP encode (measured on a 4K frame)
+WEBP_BYTES_PER_PIXEL = 36
+
+LOG_NAME = ".encoder-log.jsonl"
+
+
+class Classification:
+    def __init__(self, mode, pixels, palette, entropy):
+        self.mode = mode
+        self.pixels = pixels
+        self.palette = palette  # Distinct colours, or None if more than MAX_PALETTE_COLOURS
+        self.entropy = entropy
+
+    @property
+    def colours(self):
+        return len(self.palette) if self.palette is not None else None
+
+    @property
+    def megapixels(self):
+        return self.pixels / 1_000_000
+
+    def as_dict(self):
+        return {"mode": self.mode, "pixels": self.pixels, "colours": self.colours, "entropy": round(self.entropy, 2)}
+
+
+class EncodeResult:
+    def __init__(self, path, encoder, params, size_bytes, seconds, classification,
+                 classify_seconds=0.0):
+        self.path = path
+        self.encoder = encoder
+        self.params = params
+        self.size_bytes = size_bytes
+        self.seconds = seconds
+        self.classification = classification
+        self.classify_seconds = classify_seconds
+
+    def as_dict(self):
+        return {
+            "file": self.path.name,
+            "encoder": self.encoder,
+            "params": self.params,
+            "size_bytes": self.size_bytes,
+            "ms": round(self.seconds * 1000, 1),
+            "classify_ms": round(self.classify_seconds * 1000, 1),
+            "class": self.classification.as_dict(),
+        }
+
+
+def sampled_colour_count(image, step=SAMPLE_STEP):
+    """Distinct colours in a nearest-neighbour 1/step sample (vectorized)"""
+    sample = image.resize(
+        (max(1, image.width // step), max(1, image.height // step)), Image.NEAREST
+    )
+    rgb = np.asarray(sample, dtype=np.uint32)
+    packed = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    return len(np.unique(packed))
+
+
+def distinct_colours(image, limit=MAX_PALETTE_COLOURS):
+    """The image's distinct RGB colours, or None if there are more than limit"""
+    if np is not None and image.width * image.height > SAMPLE_ABOVE_PIXELS:
+        # Most real screens are ruled out by the sample alone
+        if sampled_colour_count(image) > limit:
+            return None
+    # Exact count in C; gives up as soon as it passes limit
+    colours = image.getcolors(maxcolors=limit)
+    return [colour for _, colour in colours] if colours is not None else None
+
+
+def grey_entropy(image):
+    """Shannon entropy of the grey-level histogram of a small preview"""
+    preview = image.reduce(max(1, min(image.size) // 256)) if min(image.size) > 256 else image
+    histogram = preview.convert('L').histogram()
+    total = float(sum(histogram))
+    entropy = 0.0
+    for count in histogram:
+        if count:
+            p = count / total
+            entropy -= p * math.log2(p)
+    return entropy
+
+
+def classify(image):
+    # Palette output would drop alpha, so only plain RGB grabs get a colour count
+    palette = distinct_colours(image) if image.mode == 'RGB' else None
+    return Classification(image.mode, image.width * image.height, palette, grey_entropy(image))
+
+
+class AdaptiveEncoder:
+    def __init__(self, latency_budget_ms=DEFAULT_LATENCY_BUDGET_MS, log_path=None,
+                 memory_ceiling=MEMORY_CEILING):
+        """memory_ceiling: bytes an encode may use beyond the capture (None = no limit)"""
+        self.latency_budget_ms = latency_budget_ms
+        self.log_path = log_path
+        self.memory_ceiling = memory_ceiling
+        self.webp = features.check('webp')
+        self._cost = dict(INITIAL_MS_PER_MPIX)
+        self._lock = threading.Lock()
+
+    def candidates(self, classification):
+        """Encoders worth trying for this content, best compression first"""
+        if classification.palette is not None and np is not None:
+            return ["png-palette", "png-1"]
+        options = []
+        if classification.entropy >= PHOTO_ENTROPY and self.webp and self._fits(classification, WEBP_BYTES_PER_PIXEL):
+            options.append("webp-lossless")
+        options.extend(["png-9", "png-6", "png-1"])
+        return options
+
+    def _fits(self, classification, bytes_per_pixel):
+        return self.memory_ceiling is None or classification.pixels * bytes_per_pixel <= self.memory_ceiling
+
+    def choose(self, classification):
+        """Best candidate predicted to finish within the latency budget"""
+        options = self.candidates(classification)
+        with self._lock:
+            for name in options:
+                if self._cost[name] * classification.megapixels <= self.latency_budget_ms:
+                    return name
+        return options[-1]  # Nothing fits: take the fastest
+
+    def encode(self, image, filepath):
+        """Classify, pick an encoder and write; returns an EncodeResult"""
+        started = time.perf_counter()
+        classification = classify(image)
+        name = self.choose(classification)
+        classified = time.perf_counter()
+
+        path, params = self._write(name, image, filepath, classification)
+        seconds = time.perf_counter() - classified
+
+        self._learn(name, classification, seconds)
+        result = EncodeResult(path, name, params, path.stat().st_size, seconds, classification,
+                              classify_seconds=classified - started)
+        if self.log_path is not None:
+            with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result.as_dict()) + "\n")
+        return result
+
+    def _learn(self, name, classification, seconds):
+        if classification.megapixels < 0.5:
+            return  # Small images are mostly fixed overhead and would skew the estimate
+        observed = seconds * 1000 / classification.megapixels
+        with self._lock:
+            self._cost[name] = 0.7 * self._cost[name] + 0.3 * observed
+
+    def _write(self, name, image, filepath, classification):
+        if name == "png-palette":
+            path = filepath.with_suffix('.png')
+            save_palette_png(image, path, classification.palette, compress_level=6,
+                             max_bytes=min(STRIP_BYTES, self.memory_ceiling or STRIP_BYTES))
+            return path, {"colours": classification.colours}
+        if name == "webp-lossless":
+            path = filepath.with_suffix('.webp')
+            image.save(path, 'WEBP', lossless=True, quality=50, method=2)
+            return path, {"method": 2}
+        level = int(name.split('-')[1])
+        path = filepath.with_suffix('.png')
+        image.save(path, 'PNG', compress_level=level)
+        return path, {"compress_level": level}
+
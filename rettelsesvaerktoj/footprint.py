@@ -0,0 +1,206 @@
+"""
+Startup time and memory footprint of the tray app.
+
+restrict_image_plugins() registers only the image formats the tools read
+and write. Without it Pillow imports every one of its ~45 format plugins
+the first time a capture is saved as WebP (or anything outside its five
+preloaded formats), which costs time and resident memory for the rest of
+the session.
+
+The rest measures:
+
+    python -m rettelsesvaerktoj footprint [--top 15]   # import-time + RSS report
+    python -m rettelsesvaerktoj tray --footprint       # time-to-tray-ready and idle RSS
+
+RSS and process age come from psutil when it is installed and from
+/proc or the Win32 API otherwise (None where neither is available).
+"""
+
+import gc
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Formats the tools open or save: captures, tile atlases, thumbnails
+IMAGE_FORMATS = ("PNG", "JPEG", "WEBP")
+
+# How long tray --footprint waits before sampling idle memory
+IDLE_SAMPLE_SECONDS = 30
+
+
+def restrict_image_plugins(formats=IMAGE_FORMATS):
+    """Register only the given Pillow formats and stop Image.init() loading the rest
+
+    Returns False (and leaves Pillow's normal plugin loading alone) when
+    this Pillow does not have the init state it relies on.
+    """
+    from PIL import Image
+
+    Image.preinit()  # PNG, JPEG, BMP, GIF, PPM: already cheap and always loaded
+    if "WEBP" in formats:
+        try:
+            from PIL import WebPImagePlugin  # noqa: F401
+        except ImportError:
+            pass
+    # Pillow has no public switch for this; init() returns early once _initialized is 2.
+    # Only touch it while it still looks like that (1 = preinit() done, init() not yet)
+    if getattr(Image, "_initialized", None) != 1:
+        return False
+    Image._initialized = 2
+    return True
+
+
+def rss_bytes():
+    """Resident memory of this process, or None if it cannot be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if sys.platform == "win32":
+        counters = _win32_memory_counters()
+        return counters.WorkingSetSize if counters is not None else None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """Highest resident memory of this process so far, or None"""
+    if sys.platform == "win32":
+        counters = _win32_memory_counters()
+        return counters.PeakWorkingSetSize if counters is not None else None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # kB on Linux
+
+
+def process_age():
+    """Seconds since this process was started, or None"""
+    if psutil is not None:
+        return time.time() - psutil.Process().create_time()
+    if sys.platform == "win32":
+        return _win32_process_age()
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Field 22 is the start time in clock ticks after boot; skip past "(comm)"
+            started = int(f.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime", "r") as f:
+            return float(f.read().split()[0]) - started
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _win32_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def _win32_process_age():
+    import ctypes
+    from ctypes import wintypes
+
+    created, exited, kernel, user, now = (wintypes.FILETIME() for _ in range(5))
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    if not kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), ctypes.byref(created),
+                                    ctypes.byref(exited), ctypes.byref(kernel), ctypes.byref(user)):
+        return None
+    kernel32.GetSystemTimeAsFileTime(ctypes.byref(now))
+    ticks = lambda ft: (ft.dwHighDateTime << 32) | ft.dwLowDateTime  # 100 ns units
+    return (ticks(now) - ticks(created)) / 1e7
+
+
+def format_bytes(value):
+    return "unknown" if value is None else f"{value / 1024 ** 2:.1f} MB"
+
+
+def format_seconds(value):
+    return "unknown" if value is None else f"{value * 1000:.0f} ms"
+
+
+def snapshot(label):
+    """One line: process age, RSS and number of loaded modules"""
+    return (f"{label}: {format_seconds(process_age())} since start, "
+            f"RSS {format_bytes(rss_bytes())}, {len(sys.modules)} modules")
+
+
+def import_times(module="rettelsesvaerktoj.tray", python=sys.executable):
+    """Import `module` in a fresh interpreter under -X importtime
+
+    Returns (rows, rss) where rows are (cumulative_us, self_us, name) sorted
+    slowest first and rss is the child's resident memory after the import.
+    """
+    code = (f"import {module}\n"
+            "from rettelsesvaerktoj.footprint import rss_bytes\n"
+            "print(rss_bytes())")
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([python, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            # Nested imports keep their extra indent, top-level ones have none
+            rows.append((int(cumulative_us), int(self_us), name[1:].rstrip()))
+    rows.sort(reverse=True)
+    rss = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+    return rows, int(rss) if rss.isdigit() else None
+
+
+def import_report(module="rettelsesvaerktoj.tray", top=15):
+    """Text report: total import time, RSS after import and the slowest top-level imports"""
+    rows, rss = import_times(module)
+    top_level = [row for row in rows if not row[2].startswith(" ")]
+    total_us = sum(row[0] for row in top_level)
+    lines = [f"import {module}: {total_us / 1000:.0f} ms, {len(rows)} modules, RSS {format_bytes(rss)}"]
+    for cumulative_us, self_us, name in rows[:top]:
+        lines.append(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms self  {name.strip()}")
+    return "\n".join(lines)
+
+
+def report_when_idle(idle_seconds=IDLE_SAMPLE_SECONDS, is_running=lambda: True):
+    """Print idle memory once the app has been left alone for idle_seconds"""
+    deadline = time.monotonic() + idle_seconds
+    while time.monotonic() < deadline:
+        if not is_running():
+            return
+        time.sleep(0.5)
+    gc.collect()
+    print(snapshot(f"Idle after {idle_seconds:.0f} s"))
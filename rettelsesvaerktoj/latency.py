@@ -0,0 +1,239 @@
+"""
+Per-stage capture latency.
+
+A CaptureTrace follows one capture from the hotkey (or API request) to
+the notification and marks each stage as it is reached, with
+time.perf_counter() (monotonic):
+
+    hotkey              Ctrl+Shift+S received (or "requested" for the API)
+    overlay_visible     overlay window mapped
+    selection_released  mouse released / Enter pressed
+    grabbed             pixels in memory (crop of the frozen frame or a grab)
+    encoded             file written to its staging path
+    committed           fsync'ed and renamed into place
+    notified            notification handed to the notification worker
+
+A stage's latency is the time since the previous stage the trace
+reached; "total" is first to last. Traces without an overlay (API
+captures, fullscreen without freeze frame) simply skip those stages.
+
+LatencyRecorder aggregates finished traces into one histogram per stage
+(fixed buckets, as Prometheus histograms) plus the last SAMPLE_WINDOW
+samples for exact percentiles, appends every trace to .latency.jsonl
+(rotated at MAX_LOG_BYTES, LOG_BACKUPS old files kept) and rewrites a
+Prometheus text snapshot, .latency.prom, at most every
+SNAPSHOT_INTERVAL seconds. report() is what the tray menu shows.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+STAGES = ("hotkey", "requested", "overlay_visible", "selection_released",
+          "grabbed", "encoded", "committed", "notified")
+
+LOG_NAME = ".latency.jsonl"
+SNAPSHOT_NAME = ".latency.prom"
+
+# Rotate the JSONL log at this size, keeping this many old ones (.1 is the newest)
+MAX_LOG_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+# Most recent samples per stage kept for percentiles
+SAMPLE_WINDOW = 1000
+
+# Minimum seconds between two rewrites of the Prometheus snapshot
+SNAPSHOT_INTERVAL = 10.0
+
+# Histogram upper bounds in seconds (+Inf is implied)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC = "rettelser_capture_stage_seconds"
+
+
+class CaptureTrace:
+    def __init__(self, recorder, origin, started_at=None):
+        """started_at is a time.perf_counter() value for the first stage (default: now)"""
+        self.recorder = recorder
+        self.origin = origin
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.wall_time = datetime.now()
+        self.marks = {origin: self.started_at}
+        self._finished = False
+
+    def mark(self, stage, at=None):
+        """Record that stage was reached (now, or at a perf_counter() value); first mark wins"""
+        self.marks.setdefault(stage, time.perf_counter() if at is None else at)
+
+    def durations(self):
+        """{stage: seconds since the previous stage reached} plus a "total" entry"""
+        ordered = sorted(self.marks.items(), key=lambda mark: mark[1])
+        result = {}
+        for (_, previous), (stage, at) in zip(ordered, ordered[1:]):
+            result[stage] = at - previous
+        if len(ordered) > 1:
+            result["total"] = ordered[-1][1] - ordered[0][1]
+        return result
+
+    def finish(self, **fields):
+        """Hand the trace to the recorder (once); fields are added to its log line"""
+        if self._finished:
+            return
+        self._finished = True
+        self.recorder.record(self, fields)
+
+    def as_dict(self):
+        return {
+            "time": self.wall_time.isoformat(timespec='milliseconds'),
+            "origin": self.origin,
+            "stages_ms": {stage: round((at - self.started_at) * 1000, 2)
+                          for stage, at in sorted(self.marks.items(), key=lambda mark: mark[1])},
+        }
+
+
+class Histogram:
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += seconds
+        self.count += 1
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        """p-th percentile (0-100) of the recent samples, nearest-rank; None without samples"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(1, -(-len(ordered) * p // 100))
+        return ordered[int(rank) - 1]
+
+
+class LatencyRecorder:
+    def __init__(self, root=None, max_log_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS,
+                 snapshot_interval=SNAPSHOT_INTERVAL):
+        """root is the screenshots folder for the log and snapshot; None keeps everything in memory"""
+        self.root = Path(root) if root is not None else None
+        self.max_log_bytes = max_log_bytes
+        self.backups = backups
+        self.snapshot_interval = snapshot_interval
+        self.histograms = {}
+        self._lock = threading.RLock()
+        self._snapshot_at = None
+
+    @property
+    def log_path(self):
+        return self.root / LOG_NAME if self.root is not None else None
+
+    @property
+    def snapshot_path(self):
+        return self.root / SNAPSHOT_NAME if self.root is not None else None
+
+    def trace(self, origin="hotkey", started_at=None):
+        return CaptureTrace(self, origin, started_at)
+
+    def record(self, trace, fields=None):
+        durations = trace.durations()
+        line = dict(trace.as_dict(), **(fields or {}))
+        with self._lock:
+            for stage, seconds in durations.items():
+                self.histograms.setdefault(stage, Histogram()).add(seconds)
+            if self.root is None:
+                return
+            try:
+                self._append(json.dumps(line, ensure_ascii=False) + "\n")
+                now = time.monotonic()
+                if self._snapshot_at is None or now - self._snapshot_at >= self.snapshot_interval:
+                    self._write_snapshot()
+                    self._snapshot_at = now
+            except OSError as e:
+                print(f"Could not write latency log: {e}")
+
+    def percentiles(self, percentiles=(50, 95, 99)):
+        """{stage: {"count": n, "p50": seconds, ...}} in stage order"""
+        with self._lock:
+            result = {}
+            for stage in self._stage_order():
+                histogram = self.histograms[stage]
+                result[stage] = {"count": histogram.count}
+                for p in percentiles:
+                    result[stage][f"p{p}"] = histogram.percentile(p)
+            return result
+
+    def report(self):
+        """Plain-text p50/p95/p99 table in milliseconds"""
+        rows = self.percentiles()
+        if not rows:
+            return "No captures measured yet"
+        width = max(len(stage) for stage in rows)
+        lines = [f"{'stage':<{width}}  {'n':>5}  {'p50':>8}  {'p95':>8}  {'p99':>8}"]
+        for stage, row in rows.items():
+            values = "  ".join(f"{row[p] * 1000:>6.1f}ms" for p in ("p50", "p95", "p99"))
+            lines.append(f"{stage:<{width}}  {row['count']:>5}  {values}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """Histograms in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [f"# HELP {METRIC} Time from the previous capture stage to this one",
+                     f"# TYPE {METRIC} histogram"]
+            for stage in self._stage_order():
+                histogram = self.histograms[stage]
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (None,), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound is None else repr(bound)
+                    lines.append(f'{METRIC}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{METRIC}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{METRIC}_count{{stage="{stage}"}} {histogram.count}')
+            return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write the Prometheus snapshot now (e.g. on quit)"""
+        if self.root is None:
+            return
+        with self._lock:
+            try:
+                self._write_snapshot()
+            except OSError as e:
+                print(f"Could not write latency snapshot: {e}")
+
+    def _stage_order(self):
+        order = {stage: index for index, stage in enumerate(STAGES + ("total",))}
+        return sorted(self.histograms, key=lambda stage: order.get(stage, len(order)))
+
+    def _append(self, line):
+        """Append to the log, rotating it first when it is full (lock held)"""
+        path = self.log_path
+        try:
+            full = path.stat().st_size + len(line) > self.max_log_bytes
+        except FileNotFoundError:
+            full = False
+        if full:
+            for index in range(self.backups, 0, -1):
+                older = path.with_name(f"{LOG_NAME}.{index}")
+                newer = path if index == 1 else path.with_name(f"{LOG_NAME}.{index - 1}")
+                if newer.exists():
+                    os.replace(newer, older)
+            if self.backups == 0:
+                path.unlink()
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def _write_snapshot(self):
+        """Replace the snapshot atomically so a scraper never reads half of it (lock held)"""
+        text = self.prometheus()
+        staged = self.snapshot_path.with_name(SNAPSHOT_NAME + ".tmp")
+        staged.write_text(text, encoding='utf-8')
+        os.replace(staged, self.snapshot_path)
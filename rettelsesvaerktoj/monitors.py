@@ -0,0 +1,328 @@
+"""
+Monitor layout: where each monitor sits on the virtual desktop and how
+much it is scaled.
+
+Monitor rectangles are in physical pixels on the virtual desktop (the
+space screen grabs use; on Windows the primary monitor starts at 0,0 and
+others may have negative coordinates). scale is the monitor's DPI / 96,
+so a 4K monitor at 150% has scale 1.5 and 2560 x 1440 logical pixels.
+
+The overlay works in Tk canvas pixels on the monitor it covers. Those are
+logical pixels when Tk is not DPI-aware and physical ones when it is;
+to_physical() maps them by the ratio between the monitor's physical size
+and the size Tk reports, which is right in both cases.
+
+grab() captures only the monitors a region touches. With a rectangle
+grabber (grab_rect(bbox) -> image, e.g. the xshm backend in capture.py,
+which current() uses when it is the selected backend) the touched
+monitors end up in one image with the gaps between them black. Grabbers
+that can run concurrently get one thread per monitor, all started
+together, and the pieces are pasted together; the xshm backend cannot
+(one X connection, one shared segment), so it reads the rectangle
+spanning the touched monitors in a single request, which keeps every
+monitor at the same instant, and the gaps are blacked out afterwards.
+Without one it falls back to a single ImageGrab call: Pillow always
+grabs a whole screen and crops, so the saving there is that a region on
+the primary monitor grabs only the primary monitor instead of all of them.
+
+The layout is detected with the Win32 API (per-monitor DPI) or xrandr,
+once synchronously on the first call to current() and after that on a
+background thread whenever the cached layout is older than
+LAYOUT_MAX_AGE seconds, so plugging in a monitor is picked up without a
+restart and the hotkey path never waits for xrandr: until the new
+layout is in, current() keeps returning the previous one. Layouts share
+one grab thread pool, so a caller still holding a replaced layout can
+keep grabbing with it. Elsewhere the layout is empty and grab() is a
+plain ImageGrab.grab().
+"""
+
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+LAYOUT_MAX_AGE = 5.0
+
+# Threads grabbing monitors concurrently, shared by every layout (started on demand)
+MAX_GRAB_THREADS = 8
+
+_XRANDR_MONITOR = re.compile(r"^(\S+) connected (primary )?(\d+)x(\d+)\+(-?\d+)\+(-?\d+)")
+
+
+class Monitor:
+    def __init__(self, name, left, top, width, height, scale=1.0, primary=False):
+        self.name = name
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.primary = primary
+
+    @property
+    def bbox(self):
+        return (self.left, self.top, self.left + self.width, self.top + self.height)
+
+    @property
+    def logical_size(self):
+        return (round(self.width / self.scale), round(self.height / self.scale))
+
+    def intersection(self, bbox):
+        """Part of bbox on this monitor, or None"""
+        x1, y1, x2, y2 = bbox
+        left, top, right, bottom = self.bbox
+        x1, y1, x2, y2 = max(x1, left), max(y1, top), min(x2, right), min(y2, bottom)
+        return (x1, y1, x2, y2) if x1 < x2 and y1 < y2 else None
+
+    def __repr__(self):
+        flag = " primary" if self.primary else ""
+        return f"<Monitor {self.name} {self.width}x{self.height}+{self.left}+{self.top} @{self.scale:g}x{flag}>"
+
+
+class MonitorLayout:
+    def __init__(self, monitors, grab_rect=None, concurrent=True):
+        """grab_rect(bbox) grabs one physical rectangle; None uses ImageGrab
+
+        concurrent: grab_rect may run in several threads at once.
+        """
+        self.monitors = list(monitors)
+        self.grab_rect = grab_rect
+        self.concurrent = concurrent
+
+    def __len__(self):
+        return len(self.monitors)
+
+    @property
+    def primary(self):
+        for monitor in self.monitors:
+            if monitor.primary:
+                return monitor
+        return self.monitors[0] if self.monitors else None
+
+    @property
+    def bounds(self):
+        """Bounding box of the whole virtual desktop"""
+        if not self.monitors:
+            return None
+        boxes = [monitor.bbox for monitor in self.monitors]
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def intersecting(self, bbox=None):
+        """[(monitor, part of bbox on it)] for every monitor bbox touches (all for None)"""
+        if bbox is None:
+            return [(monitor, monitor.bbox) for monitor in self.monitors]
+        parts = [(monitor, monitor.intersection(bbox)) for monitor in self.monitors]
+        return [(monitor, part) for monitor, part in parts if part is not None]
+
+    def to_physical(self, area, monitor=None, logical_size=None):
+        """Map area in a monitor's own (Tk) pixels to physical desktop pixels
+
+        logical_size is the monitor size in the same pixels as area (what
+        Tk reports for the screen); default: the monitor's logical size.
+        """
+        monitor = monitor or self.primary
+        if monitor is None:
+            return area
+        logical_w, logical_h = logical_size or monitor.logical_size
+        scale_x = monitor.width / logical_w
+        scale_y = monitor.height / logical_h
+        x1, y1, x2, y2 = area
+        return (monitor.left + round(x1 * scale_x), monitor.top + round(y1 * scale_y),
+                monitor.left + round(x2 * scale_x), monitor.top + round(y2 * scale_y))
+
+    def grab(self, bbox=None):
+        """Grab bbox (physical desktop pixels; None = every monitor) from the monitors it touches"""
+        parts = self.intersecting(bbox)
+        if not parts:
+            if self.monitors:
+                raise ValueError(f"Region {bbox} is not on any monitor")
+            if self.grab_rect is not None:
+                return self.grab_rect(bbox)
+            from PIL import ImageGrab
+            return ImageGrab.grab(bbox=bbox)
+
+        target = bbox or self.bounds
+        if self.grab_rect is None:
+            return self._imagegrab(target, parts)
+        if len(parts) == 1 and parts[0][1] == tuple(target):
+            return self.grab_rect(target)
+
+        canvas = Image.new('RGB', (target[2] - target[0], target[3] - target[1]))
+        if not self.concurrent:
+            # One request for the span of all touched monitors (a pool would only queue on
+            # the grabber's lock, and separate reads would be separate instants)
+            span = (min(part[0] for _, part in parts), min(part[1] for _, part in parts),
+                    max(part[2] for _, part in parts), max(part[3] for _, part in parts))
+            whole = self.grab_rect(span)
+            for _, part in parts:
+                box = (part[0] - span[0], part[1] - span[1], part[2] - span[0], part[3] - span[1])
+                canvas.paste(whole.crop(box), (part[0] - target[0], part[1] - target[1]))
+            return canvas
+
+        # One thread per monitor, all submitted before any result is awaited
+        executor = _grab_pool()
+        pieces = [(part, executor.submit(self.grab_rect, part)) for _, part in parts]
+        for part, piece in pieces:
+            canvas.paste(piece.result(), (part[0] - target[0], part[1] - target[1]))
+        return canvas
+
+    def _imagegrab(self, target, parts):
+        from PIL import ImageGrab
+
+        # Pillow grabs a whole screen and crops; only the primary if that is enough
+        primary_only = all(monitor is self.primary for monitor, _ in parts)
+        if sys.platform == "win32":
+            return ImageGrab.grab(bbox=target, all_screens=not primary_only)
+        return ImageGrab.grab(bbox=target)
+
+    def same_as(self, other):
+        """Same monitors and grabber (nothing to swap in)"""
+        return (other is not None and self.grab_rect == other.grab_rect
+                and [repr(m) for m in self.monitors] == [repr(m) for m in other.monitors])
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _grab_pool():
+    """The grab thread pool; never shut down, so no layout loses it mid-grab"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_GRAB_THREADS, thread_name_prefix="monitor-grab")
+        return _executor
+
+
+def detect():
+    """Current monitors, or [] where the layout cannot be read"""
+    try:
+        if sys.platform == "win32":
+            return _detect_windows()
+        if sys.platform.startswith("linux"):
+            return _detect_xrandr()
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        print(f"Could not read the monitor layout: {e}")
+    return []
+
+
+def _detect_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class MONITORINFOEXW(ctypes.Structure):
+        _fields_ = [
+            ("cbSize", wintypes.DWORD),
+            ("rcMonitor", wintypes.RECT),
+            ("rcWork", wintypes.RECT),
+            ("dwFlags", wintypes.DWORD),
+            ("szDevice", wintypes.WCHAR * 32),
+        ]
+
+    user32 = ctypes.windll.user32
+    try:
+        get_dpi = ctypes.windll.shcore.GetDpiForMonitor  # Windows 8.1+
+    except (OSError, AttributeError):
+        get_dpi = None
+
+    # Physical coordinates need a per-monitor DPI-aware thread (as ImageGrab does)
+    set_context = getattr(user32, "SetThreadDpiAwarenessContext", None)
+    previous = None
+    if set_context is not None:
+        set_context.restype = ctypes.c_void_p
+        set_context.argtypes = [ctypes.c_void_p]
+        previous = set_context(ctypes.c_void_p(-4))  # DPI_AWARENESS_CONTEXT_PER_MONITOR_AWARE_V2
+
+    monitors = []
+
+    def add_monitor(handle, hdc, rect, data):
+        info = MONITORINFOEXW()
+        info.cbSize = ctypes.sizeof(info)
+        if not user32.GetMonitorInfoW(handle, ctypes.byref(info)):
+            return True
+        scale = 1.0
+        if get_dpi is not None:
+            dpi_x, dpi_y = wintypes.UINT(), wintypes.UINT()
+            if get_dpi(handle, 0, ctypes.byref(dpi_x), ctypes.byref(dpi_y)) == 0:  # MDT_EFFECTIVE_DPI
+                scale = dpi_x.value / 96
+        r = info.rcMonitor
+        monitors.append(Monitor(info.szDevice, r.left, r.top, r.right - r.left, r.bottom - r.top,
+                                scale, bool(info.dwFlags & 1)))  # MONITORINFOF_PRIMARY
+        return True
+
+    callback_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC,
+                                       ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+    callback = callback_type(add_monitor)
+    try:
+        user32.EnumDisplayMonitors(None, None, callback, 0)
+    finally:
+        if set_context is not None and previous:
+            set_context(ctypes.c_void_p(previous))
+    return monitors
+
+
+def _detect_xrandr():
+    try:
+        output = subprocess.run(["xrandr", "--query"], capture_output=True, text=True, timeout=2).stdout
+    except FileNotFoundError:
+        return []
+    monitors = []
+    for line in output.splitlines():
+        match = _XRANDR_MONITOR.match(line)
+        if match:
+            name, primary, width, height, left, top = match.groups()
+            # X11 has no per-monitor scaling; Tk and grabs both use physical pixels
+            monitors.append(Monitor(name, int(left), int(top), int(width), int(height),
+                                    1.0, primary is not None))
+    return monitors
+
+
+def _backend_grab_rect():
+    """(grab, concurrent) of the selected capture backend if it reads rectangles natively"""
+    from .capture import BackendUnavailable, default_backend
+    try:
+        backend = default_backend()
+    except BackendUnavailable:
+        return None, True
+    if not backend.native_rect:
+        return None, True
+    return backend.grab, backend.concurrent_rects
+
+
+_current = None
+_detected_at = 0.0
+_refreshing = False
+_lock = threading.Lock()
+
+
+def current(max_age=LAYOUT_MAX_AGE):
+    """Cached layout; older than max_age seconds, it is re-detected in the background"""
+    global _current, _detected_at, _refreshing
+    with _lock:
+        if _current is None:
+            # Nothing to hand out yet: the first caller waits for detection
+            _current = MonitorLayout(detect(), *_backend_grab_rect())
+            _detected_at = time.monotonic()
+        elif time.monotonic() - _detected_at > max_age and not _refreshing:
+            _refreshing = True
+            threading.Thread(target=_refresh, name="monitor-layout", daemon=True).start()
+        return _current
+
+
+def _refresh():
+    global _current, _detected_at, _refreshing
+    try:
+        layout = MonitorLayout(detect(), *_backend_grab_rect())
+    except Exception as e:
+        print(f"Could not refresh the monitor layout: {e}")
+        layout = None
+    with _lock:
+        if layout is not None and not layout.same_as(_current):
+            _current = layout  # Callers still holding the old one can go on using it
+        _detected_at = time.monotonic()
+        _refreshing = False
@@ -0,0 +1,38 @@
+"""
+Capture file naming.
+
+Names carry milliseconds so two captures in the same second no longer
+overwrite each other, and a per-process reservation set plus an exists()
+check covers anything that still collides.
+"""
+
+import threading
+from datetime import datetime
+
+_reserved = set()
+_lock = threading.Lock()
+
+
+def capture_timestamp(now=None):
+    """Timestamp used in capture names, e.g. 2025-09-03_09-18-12-482"""
+    now = now or datetime.now()
+    return now.strftime("%Y-%m-%d_%H-%M-%S-") + f"{now.microsecond // 1000:03d}"
+
+
+def unique_capture_path(directory, prefix="screenshot", now=None, suffix=".png"):
+    """Reserve a capture path in directory that no other capture will get"""
+    stem = f"{prefix}_{capture_timestamp(now)}"
+    with _lock:
+        candidate = directory / f"{stem}{suffix}"
+        counter = 2
+        while candidate in _reserved or candidate.exists():
+            candidate = directory / f"{stem}_{counter}{suffix}"
+            counter += 1
+        _reserved.add(candidate)
+    return candidate
+
+
+def release_capture_path(path):
+    """Forget a reservation once the file exists on disk (or was abandoned)"""
+    with _lock:
+        _reserved.discard(path)
@@ -0,0 +1,304 @@
+"""
+Desktop notifications for the tray app.
+
+A notifier backend is a callable notify(title, message, timeout):
+
+- plyer_notify: plyer (optional; without it notifications are printed)
+- powershell_notify: native Windows toast through one long-lived
+  PowerShell process fed over stdin (no process start per toast);
+  simple-screenshot.py uses it since it needs no extra package
+- notify_send_notify: freedesktop notifications on Linux, through
+  notify-send or, without it, gdbus calling org.freedesktop.Notifications
+- NullNotifier: records notifications instead of showing them (tests,
+  headless runs)
+
+Callers never talk to a backend directly. NotificationWorker owns it on
+a thread of its own, so a slow backend never holds up a capture. It
+coalesces notifications with the same key that arrive within
+COALESCE_SECONDS into one summary, and shows at most one notification
+per MIN_INTERVAL_SECONDS; anything arriving faster is folded into the
+next one.
+"""
+
+import base64
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from plyer import notification
+except ImportError:
+    notification = None
+
+APP_NAME = "Jens Rettelsesværktøj"
+
+# Same-key notifications this close together become one summary
+COALESCE_SECONDS = 0.5
+
+# Minimum gap between two notifications on screen
+MIN_INTERVAL_SECONDS = 2.0
+
+# Pending notifications kept while the backend is slow; the oldest are dropped
+MAX_PENDING = 100
+
+# Seconds a backend may take to show one notification
+BACKEND_TIMEOUT = 5
+
+# One line per toast (stdin is read line by line); text arrives base64-encoded
+_TOAST_SCRIPT = (
+    "$d = {{ param($s) [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($s)) }}; "
+    "$t = [Windows.UI.Notifications.ToastNotificationManager]::GetTemplateContent("
+    "[Windows.UI.Notifications.ToastTemplateType]::ToastText02); "
+    "$x = [xml] $t.GetXml(); "
+    "($x.toast.visual.binding.text|where {{$_.id -eq '1'}}).AppendChild($x.CreateTextNode((& $d '{title}'))) > $null; "
+    "($x.toast.visual.binding.text|where {{$_.id -eq '2'}}).AppendChild($x.CreateTextNode((& $d '{message}'))) > $null; "
+    "$s = New-Object Windows.Data.Xml.Dom.XmlDocument; $s.LoadXml($x.OuterXml); "
+    "$n = [Windows.UI.Notifications.ToastNotification]::new($s); "
+    "$n.Tag = 'PowerShell'; $n.Group = 'PowerShell'; "
+    "$n.ExpirationTime = [DateTimeOffset]::Now.AddMinutes(1); "
+    "[Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier('PowerShell').Show($n)\n"
+)
+_TOAST_SETUP = (
+    "[Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, "
+    "ContentType = WindowsRuntime] > $null\n"
+)
+
+
+def _b64(text):
+    return base64.b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def plyer_notify(title, message, timeout=4):
+    """Notification through plyer (printed instead if plyer is not installed)"""
+    if notification is None:
+        print(f"{title}: {message}")
+        return
+    notification.notify(title=title, message=message, app_name=APP_NAME, timeout=timeout)
+
+
+class PowerShellToaster:
+    """Windows toasts through one PowerShell process, started on first use"""
+
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            ['powershell', '-NoProfile', '-NonInteractive', '-Command', '-'],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            text=True, encoding='ascii',
+            creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+        )
+        self._process.stdin.write(_TOAST_SETUP)
+
+    def __call__(self, title, message, timeout=4):
+        with self._lock:
+            try:
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                self._process.stdin.write(_TOAST_SCRIPT.format(title=_b64(title), message=_b64(message)))
+                self._process.stdin.flush()
+            except (OSError, ValueError) as e:
+                print(f"Notification error: {e}")
+                self._process = None
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                try:
+                    self._process.stdin.close()
+                    self._process.wait(BACKEND_TIMEOUT)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._process.kill()
+                self._process = None
+
+
+powershell_notify = PowerShellToaster()
+
+
+def notify_send_notify(title, message, timeout=4):
+    """freedesktop notification through notify-send, or D-Bus via gdbus"""
+    if shutil.which('notify-send'):
+        command = ['notify-send', '--app-name', APP_NAME, '--expire-time', str(timeout * 1000), title, message]
+    else:
+        # Notify(app_name, replaces_id, icon, summary, body, actions, hints, expire_timeout)
+        command = [
+            'gdbus', 'call', '--session',
+            '--dest', 'org.freedesktop.Notifications',
+            '--object-path', '/org/freedesktop/Notifications',
+            '--method', 'org.freedesktop.Notifications.Notify',
+            APP_NAME, '0', '', title, message, '[]', '{}', str(timeout * 1000),
+        ]
+    try:
+        subprocess.run(command, capture_output=True, timeout=BACKEND_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Notification error: {e}")
+
+
+class NullNotifier:
+    """Keeps (title, message, timeout) for every notification instead of showing it"""
+
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, title, message, timeout=4):
+        self.sent.append((title, message, timeout))
+
+
+NOTIFIERS = {
+    "plyer": plyer_notify,
+    "powershell": powershell_notify,
+    "notify-send": notify_send_notify,
+    "null": NullNotifier(),
+}
+
+
+def default_notifier():
+    """plyer where installed; otherwise the platform's own mechanism"""
+    if notification is not None:
+        return plyer_notify
+    if sys.platform == "win32":
+        return powershell_notify
+    if shutil.which('notify-send') or shutil.which('gdbus'):
+        return notify_send_notify
+    return plyer_notify  # Prints
+
+
+class _Pending:
+    def __init__(self, title, message, timeout, key, summary):
+        self.title = title
+        self.message = message
+        self.timeout = timeout
+        self.key = key
+        self.summary = summary
+        self.count = 1
+
+    def text(self):
+        if self.count == 1:
+            return self.message
+        if self.summary is not None:
+            return self.summary(self.count, self.message)
+        return f"{self.message}\n(+{self.count - 1})"
+
+
+class NotificationWorker:
+    def __init__(self, backend=None, coalesce_seconds=COALESCE_SECONDS,
+                 min_interval=MIN_INTERVAL_SECONDS, max_pending=MAX_PENDING):
+        self.backend = backend or default_notifier()
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._last_shown = None
+        self.shown = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self, title, message, timeout=4, key=None, summary=None):
+        """Queue a notification and return at once
+
+        Notifications sharing a key are merged while they wait; summary(count,
+        last_message) gives the merged text (default: last message plus a count).
+        """
+        item = _Pending(title, message, timeout, key, summary)
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def close(self, timeout=BACKEND_TIMEOUT):
+        """Show what is still queued (without waiting out the rate limit) and stop"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+    def _run(self):
+        # Coalesced but not yet shown, in arrival order; carried over between rounds
+        pending = []
+        closing = False
+        while not closing:
+            # Wait for something to show
+            if not pending:
+                item = self._queue.get()
+                if item is None:
+                    break
+                pending = self._merge(pending, item)
+
+            # Collect whatever follows within the coalescing window, and for
+            # as long as the rate limit says we cannot show anything yet
+            deadline = time.monotonic() + self.coalesce_seconds
+            if self._last_shown is not None:
+                deadline = max(deadline, self._last_shown + self.min_interval)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                pending = self._merge(pending, item)
+
+            # One per interval, in arrival order; the rest wait for the next round
+            self._show(pending.pop(0))
+        for item in pending:
+            self._show(item)
+        self._drain()
+
+    def _merge(self, pending, item):
+        for existing in pending:
+            if item.key is not None and existing.key == item.key:
+                existing.count += 1
+                existing.message = item.message
+                existing.timeout = item.timeout
+                self.coalesced += 1
+                return pending
+        pending.append(item)
+        if len(pending) > self.max_pending:
+            pending.pop(0)  # Same bound as the queue: the oldest go first
+            self.dropped += 1
+        return pending
+
+    def _drain(self):
+        """On close: show everything still queued, merged by key"""
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                pending = self._merge(pending, item)
+        for item in pending:
+            self._show(item)
+
+    def _show(self, item):
+        try:
+            self.backend(item.title, item.text(), item.timeout)
+        except Exception as e:
+            print(f"Notification error: {e}")
+        self._last_shown = time.monotonic()
+        self.shown += 1
@@ -0,0 +1,390 @@
+"""
+Fullscreen area-selection overlay.
+
+The overlay window is built once on the UI thread and then only hidden
+and shown, so pressing the hotkey costs a deiconify instead of a new Tk
+interpreter, canvas and bindings.
+
+In freeze-frame mode the caller grabs the whole screen once at hotkey
+time and passes it in. The overlay shows that frame dimmed as its
+background and the selection is cropped from it in memory, so there is
+no second grab and the overlay itself can never end up in the capture.
+
+Pointer motion is coalesced: handlers only record the latest position
+and one redraw per frame (capped at MAX_DRAG_FPS) moves the existing
+rectangle, readout and magnifier items in place.
+
+With a monitor layout (see monitors.py) the overlay sits on the primary
+monitor and selections made without a frozen frame are mapped from Tk
+pixels to physical desktop pixels, so they crop correctly on scaled
+displays.
+
+on_closed() runs every time the overlay hides, with or without a
+selection, so a scheduler (see scheduler.py) knows the next hotkey may
+open it again. The capture callback is called on the UI thread and must
+only hand the work off. A CaptureTrace passed to show_selection_overlay()
+(see latency.py) is marked when the window maps and when the selection
+is released, and handed to the callback with the selection.
+
+With a frozen frame (and numpy) an edge map of it is built on a
+background thread right after the hotkey, and from then on the rubber
+band snaps to nearby UI boundaries (see snapping.py). Holding Shift
+while dragging turns snapping off.
+"""
+
+import threading
+import time
+import tkinter as tk
+
+from PIL import Image, ImageEnhance, ImageTk
+
+from .snapping import EdgeMap, np as snapping_numpy
+
+# Hotkey-to-crosshair budget; slower shows are reported on the console
+OVERLAY_LATENCY_TARGET_MS = 100
+
+# Minimum selection size in pixels
+MIN_SELECTION = 5
+
+# Brightness of the frozen frame behind the selection (1.0 = unchanged)
+FREEZE_DIM = 0.6
+
+# Upper bound on rubber-band redraws, however fast the mouse reports motion
+MAX_DRAG_FPS = 120
+
+# Tk event state bit for Shift (the same on Windows and X11)
+SHIFT_MASK = 0x0001
+
+# Magnifier: pixels around the pointer on each side, and zoom per pixel
+LOUPE_RADIUS = 10
+LOUPE_ZOOM = 8
+LOUPE_OFFSET = 24
+
+
+class ScreenshotOverlay:
+    def __init__(self, ui, callback, layout=None, on_closed=None):
+        """layout() returns the current MonitorLayout (e.g. monitors.current)"""
+        self.ui = ui
+        self.callback = callback
+        self.layout = layout
+        self.on_closed = on_closed
+        self.monitors = None
+        self.start_x = None
+        self.start_y = None
+        self.rect_id = None
+        self.window = None
+        self.canvas = None
+        self.frame_item = None
+        self.readout_id = None
+        self.loupe_id = None
+        self.loupe_border_id = None
+        self.frame = None
+        self.screen_size = None
+        self._backdrop = None
+        self._loupe_source = None
+        self._loupe_photo = None
+        self._pointer = None
+        self._render_job = None
+        self._last_render = 0.0
+        self.visible = False
+        self.last_latency_ms = None
+        self._requested_at = None
+        self._trace = None
+        self._edges = None
+        self._generation = 0
+        self._snap = True
+
+        # Pre-warm: build the window now so the first hotkey is as fast as the rest
+        self.ui.call(self._build)
+
+    def _build(self):
+        """Create the (hidden) overlay window on the UI thread"""
+        self.window = tk.Toplevel(self.ui.root)
+        self.window.withdraw()
+        self.window.attributes('-fullscreen', True)
+        self.window.attributes('-alpha', 0.3)
+        self.window.attributes('-topmost', True)
+        self.window.configure(bg='black')
+        self.window.configure(cursor='crosshair')
+
+        # Create canvas for selection rectangle
+        self.canvas = tk.Canvas(self.window, highlightthickness=0, bg='black')
+        self.canvas.pack(fill='both', expand=True)
+        self.frame_item = self.canvas.create_image(0, 0, anchor='nw', state='hidden')
+        self.screen_size = (self.window.winfo_screenwidth(), self.window.winfo_screenheight())
+        primary = self.layout().primary if self.layout is not None else None
+        if primary is not None:
+            # The primary monitor starts at 0,0 on Windows, so this is right in Tk pixels too
+            self.window.geometry(f"+{primary.left}+{primary.top}")
+            if self.screen_size[0] > primary.width or self.screen_size[1] > primary.height:
+                # X11 reports the whole multi-monitor root; the overlay covers one monitor
+                self.screen_size = (primary.width, primary.height)
+
+        # Selection items are created once and only moved while dragging
+        self.rect_id = self.canvas.create_rectangle(
+            0, 0, 0, 0, outline='red', width=2, fill='', state='hidden'
+        )
+        loupe_size = (2 * LOUPE_RADIUS + 1) * LOUPE_ZOOM
+        self._loupe_photo = ImageTk.PhotoImage('RGB', (loupe_size, loupe_size))
+        self.loupe_id = self.canvas.create_image(
+            0, 0, anchor='nw', image=self._loupe_photo, state='hidden'
+        )
+        self.loupe_border_id = self.canvas.create_rectangle(
+            0, 0, loupe_size, loupe_size, outline='white', width=1, state='hidden'
+        )
+        self.readout_id = self.canvas.create_text(
+            0, 0, anchor='nw', fill='white', font=('Arial', 10, 'bold'), state='hidden'
+        )
+
+        # Bind mouse events
+        self.canvas.bind('<Button-1>', self.on_click)
+        self.canvas.bind('<Motion>', self.on_motion)
+        self.canvas.bind('<B1-Motion>', self.on_drag)
+        self.canvas.bind('<ButtonRelease-1>', self.on_release)
+
+        # Bind keyboard events
+        self.window.bind('<Escape>', self.cancel_selection)
+        self.window.bind('<Return>', self.take_fullscreen)
+        self.window.bind('<Map>', self._on_map)
+
+    def show_selection_overlay(self, requested_at=None, frame=None, trace=None):
+        """Show the overlay (safe to call from any thread)
+
+        frame is an optional full-screen grab taken at hotkey time; when
+        given, the selection is cropped from it instead of grabbed later.
+        """
+        if requested_at is None:
+            requested_at = time.perf_counter()
+        if self.layout is not None:
+            self.monitors = self.layout()
+        # Dim and scale the frame here so the UI thread only wraps it for Tk
+        backdrop = loupe_source = None
+        if frame is not None:
+            backdrop, loupe_source = self._prepare_backdrop(frame)
+        self._generation += 1
+        self.ui.call(self._show, requested_at, frame, backdrop, loupe_source, trace)
+        if loupe_source is not None and snapping_numpy is not None:
+            # Off the hotkey path: the overlay shows first, snapping follows a moment later
+            threading.Thread(target=self._build_edges, args=(loupe_source, self._generation),
+                             name="overlay-edges", daemon=True).start()
+
+    def _build_edges(self, screen, generation):
+        try:
+            edges = EdgeMap(screen)
+        except Exception as e:
+            print(f"Edge map failed: {e}")
+            return
+        self.ui.call(self._set_edges, edges, generation)
+
+    def _set_edges(self, edges, generation):
+        """Use the edge map unless the overlay has moved on to another frame"""
+        if self.visible and generation == self._generation:
+            self._edges = edges
+
+    def _prepare_backdrop(self, frame):
+        """Dimmed backdrop and undimmed magnifier source, both canvas-sized"""
+        screen = frame.convert('RGB')
+        if self.screen_size and screen.size != self.screen_size:
+            screen = screen.resize(self.screen_size, Image.BILINEAR)
+        return ImageEnhance.Brightness(screen).enhance(FREEZE_DIM), screen
+
+    def _show(self, requested_at, frame=None, backdrop=None, loupe_source=None, trace=None):
+        if self.visible:
+            return
+        self.visible = True
+        self._requested_at = requested_at
+        self._trace = trace
+        self.start_x = None
+        self.start_y = None
+        self.frame = frame
+        self._loupe_source = loupe_source
+        self._pointer = None
+
+        if backdrop is not None:
+            # Opaque window showing the frozen frame
+            self._backdrop = ImageTk.PhotoImage(backdrop)
+            self.canvas.itemconfigure(self.frame_item, image=self._backdrop, state='normal')
+            self.window.attributes('-alpha', 1.0)
+        else:
+            self.canvas.itemconfigure(self.frame_item, state='hidden')
+            self.window.attributes('-alpha', 0.3)
+
+        self.window.deiconify()
+        self.window.attributes('-topmost', True)
+        self.window.lift()
+        self.window.focus_force()
+
+    def _on_map(self, event=None):
+        """Record hotkey-to-visible latency the first time the window maps"""
+        if self._requested_at is None:
+            return
+        mapped_at = time.perf_counter()
+        if self._trace is not None:
+            self._trace.mark("overlay_visible", mapped_at)
+        self.last_latency_ms = (mapped_at - self._requested_at) * 1000
+        self._requested_at = None
+        if self.last_latency_ms > OVERLAY_LATENCY_TARGET_MS:
+            print(f"Overlay took {self.last_latency_ms:.0f} ms to show "
+                  f"(target {OVERLAY_LATENCY_TARGET_MS} ms)")
+
+    def _hide(self):
+        if self._render_job is not None:
+            self.canvas.after_cancel(self._render_job)
+            self._render_job = None
+        for item_id in (self.rect_id, self.readout_id, self.loupe_id, self.loupe_border_id):
+            self.canvas.itemconfigure(item_id, state='hidden')
+        self.window.withdraw()
+        # Make sure the overlay is really gone before anything grabs the screen
+        self.window.update_idletasks()
+        self.visible = False
+
+        # Drop the frozen frame so it is not kept alive between captures
+        self.canvas.itemconfigure(self.frame_item, image='', state='hidden')
+        self._backdrop = None
+        self._loupe_source = None
+        self._edges = None
+        self.frame = None
+        self._trace = None
+        if self.on_closed is not None:
+            self.on_closed()
+
+    def _to_frame(self, area):
+        """Map canvas coordinates to pixels in the frozen frame (or on the desktop without one)"""
+        if self.frame is None:
+            if self.monitors is None:
+                return area
+            return self.monitors.to_physical(area, logical_size=self.screen_size)
+        screen_w, screen_h = self.screen_size
+        scale_x = self.frame.width / screen_w
+        scale_y = self.frame.height / screen_h
+        x1, y1, x2, y2 = area
+        return (round(x1 * scale_x), round(y1 * scale_y),
+                round(x2 * scale_x), round(y2 * scale_y))
+
+    def _finish(self, area):
+        """Hide the overlay and hand the selection to the capture callback"""
+        frame, trace = self.frame, self._trace
+        if trace is not None:
+            trace.mark("selection_released")
+        if area is not None:
+            area = self._to_frame(area)
+        self._hide()
+        self.callback(area, frame, trace=trace)
+
+    def on_click(self, event):
+        """Start selection"""
+        self.start_x = event.x
+        self.start_y = event.y
+        self.canvas.coords(self.rect_id, event.x, event.y, event.x, event.y)
+        self.canvas.itemconfigure(self.rect_id, state='normal')
+        self._schedule_render(event)
+
+    def on_motion(self, event):
+        """Move the magnifier before a selection is started"""
+        self._schedule_render(event)
+
+    def on_drag(self, event):
+        """Update selection rectangle"""
+        if self.start_x is not None and self.start_y is not None:
+            self._schedule_render(event)
+
+    def _schedule_render(self, event):
+        """Remember the newest pointer position; redraw at most once per frame"""
+        self._pointer = (event.x, event.y)
+        self._snap = not event.state & SHIFT_MASK
+        if self._render_job is not None:
+            return
+        frame_interval = 1.0 / MAX_DRAG_FPS
+        wait = frame_interval - (time.perf_counter() - self._last_render)
+        self._render_job = self.canvas.after(max(0, int(wait * 1000)), self._render)
+
+    def _render(self):
+        """Apply the latest pointer position to the existing canvas items"""
+        self._render_job = None
+        self._last_render = time.perf_counter()
+        if self._pointer is None or not self.visible:
+            return
+        x, y = self._pointer
+
+        if self.start_x is not None and self.start_y is not None:
+            area = self._selection(x, y)
+            self.canvas.coords(self.rect_id, *area)
+            x1, y1, x2, y2 = self._to_frame(area)
+            readout = f"{x2 - x1} \u00d7 {y2 - y1}"
+        else:
+            fx, fy, _, _ = self._to_frame((x, y, x, y))
+            readout = f"{fx}, {fy}"
+
+        loupe_x, loupe_y = self._loupe_position(x, y)
+        if self._loupe_source is not None:
+            self._update_loupe(x, y)
+            self.canvas.coords(self.loupe_id, loupe_x, loupe_y)
+            self.canvas.coords(
+                self.loupe_border_id, loupe_x, loupe_y,
+                loupe_x + self._loupe_photo.width(), loupe_y + self._loupe_photo.height()
+            )
+            self.canvas.itemconfigure(self.loupe_id, state='normal')
+            self.canvas.itemconfigure(self.loupe_border_id, state='normal')
+            readout_y = loupe_y + self._loupe_photo.height() + 4
+        else:
+            readout_y = loupe_y
+
+        self.canvas.coords(self.readout_id, loupe_x, readout_y)
+        self.canvas.itemconfigure(self.readout_id, text=readout, state='normal')
+
+    def _selection(self, x, y):
+        """Canvas rectangle from the drag start to (x, y), snapped to edges when available"""
+        area = (min(self.start_x, x), min(self.start_y, y), max(self.start_x, x), max(self.start_y, y))
+        if self._edges is not None and self._snap:
+            area = self._edges.snap(area)
+        return area
+
+    def _loupe_position(self, x, y):
+        """Place the magnifier beside the pointer, flipping near screen edges"""
+        size = self._loupe_photo.width()
+        screen_w, screen_h = self.screen_size
+        loupe_x = x + LOUPE_OFFSET
+        loupe_y = y + LOUPE_OFFSET
+        if loupe_x + size > screen_w:
+            loupe_x = x - LOUPE_OFFSET - size
+        if loupe_y + size + 20 > screen_h:
+            loupe_y = y - LOUPE_OFFSET - size - 20
+        return loupe_x, loupe_y
+
+    def _update_loupe(self, x, y):
+        """Blow up the pixels around the pointer with a centre marker"""
+        patch = self._loupe_source.crop((
+            x - LOUPE_RADIUS, y - LOUPE_RADIUS, x + LOUPE_RADIUS + 1, y + LOUPE_RADIUS + 1
+        ))
+        size = self._loupe_photo.width()
+        zoomed = patch.resize((size, size), Image.NEAREST)
+
+        # Outline the pixel under the pointer
+        lo = LOUPE_RADIUS * LOUPE_ZOOM
+        hi = lo + LOUPE_ZOOM - 1
+        for i in range(lo, hi + 1):
+            for px, py in ((i, lo), (i, hi), (lo, i), (hi, i)):
+                zoomed.putpixel((px, py), (255, 0, 0))
+
+        # Paste into the existing Tk image instead of creating a new one
+        self._loupe_photo.paste(zoomed)
+
+    def on_release(self, event):
+        """Finish selection and take screenshot"""
+        if self.start_x is not None and self.start_y is not None:
+            # Calculate selection area (as drawn, so snapped the same way)
+            self._snap = not event.state & SHIFT_MASK
+            x1, y1, x2, y2 = self._selection(event.x, event.y)
+
+            if abs(x2 - x1) > MIN_SELECTION and abs(y2 - y1) > MIN_SELECTION:
+                self._finish((x1, y1, x2, y2))
+            else:
+                self._hide()
+
+    def cancel_selection(self, event=None):
+        """Cancel selection"""
+        self._hide()
+
+    def take_fullscreen(self, event=None):
+        """Take fullscreen screenshot"""
+        self._finish(None)  # None means fullscreen
@@ -0,0 +1,290 @@
+"""
+Background encode/persist pipeline for captured screenshots.
+
+The capture thread only grabs pixels and hands the in-memory image to
+CapturePipeline.submit(). A small pool of worker threads does the slow
+part (PNG encode, write, stat) and then runs the per-capture callbacks
+(LATEST.txt, log, notification). The queue is bounded, so a burst of
+captures blocks the caller instead of piling up full-resolution images
+in memory.
+
+With a PixelStore attached, pixels that were already saved once are not
+encoded again; the new capture is linked to the existing file instead.
+With a SimilarityIndex attached, the perceptual hash is taken from the
+same in-memory frame so near-duplicate lookups never decode PNGs.
+With a TileStore attached, captures are written as tile deltas against
+the previous capture instead of full PNGs (see tiles.py). With an
+AdaptiveEncoder attached, the format and settings are picked per capture
+(see encoders.py); otherwise captures are plain default PNGs. With a
+ThumbnailCache attached, the preview pyramid is built from the same
+in-memory frame and handed over in SavedCapture.thumbnails. A job's
+CaptureTrace (see latency.py), if any, is marked "encoded" once the file
+is staged and "committed" once it is in place.
+
+Whatever the format, the file is written to a staging path first and
+only renamed to its final name once complete (see publish.py), so
+readers never open a half-written capture. With a Publisher attached the
+rename happens under the writer lock shared with other tool instances.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from pathlib import Path
+
+from .dedup import pixel_digest
+from .naming import release_capture_path
+from .publish import commit, staging_path
+from .similarity import dhash
+from .tiles import is_manifest, manifest_path_for, rerooted
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 4
+
+_STOP = object()
+
+
+def _mark(job, stage):
+    if job.trace is not None:
+        job.trace.mark(stage)
+
+
+class PipelineFull(Exception):
+    """Raised when the pipeline stays full for longer than the submit timeout"""
+
+
+class PipelineClosed(Exception):
+    """Raised when submitting to a pipeline that is shutting down"""
+
+
+class CaptureJob:
+    """One captured image waiting to be encoded and written"""
+
+    def __init__(self, seq, image, filepath, on_saved=None, on_error=None, trace=None):
+        self.seq = seq
+        self.image = image
+        self.filepath = Path(filepath)
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.trace = trace
+        self.submitted_at = time.monotonic()
+
+
+class SavedCapture:
+    """Result handed to on_saved once a capture is on disk"""
+
+    def __init__(self, seq, filepath, size_bytes, encode_seconds, queued_seconds,
+                 pixel_digest=None, duplicate_of=None, perceptual_hash=None,
+                 tiles_changed=None, tiles_total=None, encoding=None, image_size=None,
+                 thumbnails=None):
+        self.seq = seq
+        self.filepath = filepath
+        self.filename = filepath.name
+        self.size_bytes = size_bytes
+        self.encode_seconds = encode_seconds
+        self.queued_seconds = queued_seconds
+        self.pixel_digest = pixel_digest
+        self.duplicate_of = duplicate_of
+        self.perceptual_hash = perceptual_hash
+        self.tiles_changed = tiles_changed
+        self.tiles_total = tiles_total
+        self.encoding = encoding
+        self.image_size = image_size
+        self.thumbnails = thumbnails  # {size: image}, to be stored once the capture has an id
+
+    @property
+    def size_kb(self):
+        return round(self.size_bytes / 1024, 1)
+
+
+class CapturePipeline:
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 name="capture-writer", store=None, similarity=None, tiles=None,
+                 encoder=None, publisher=None, thumbnails=None):
+        self.store = store
+        self.thumbnails = thumbnails
+        self.publisher = publisher
+        self.encoder = encoder
+        self.tiles = tiles
+        self.similarity = similarity
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._seq = itertools.count(1)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._last_published = 0
+        self._last_activity = time.monotonic()
+        self._workers = []
+
+        for index in range(workers):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"{name}-{index + 1}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, image, filepath, on_saved=None, on_error=None, timeout=None, trace=None):
+        """Queue an in-memory image for saving; blocks while the queue is full"""
+        if self._closed:
+            raise PipelineClosed("Capture pipeline is shutting down")
+
+        job = CaptureJob(next(self._seq), image, filepath, on_saved, on_error, trace)
+        self._last_activity = time.monotonic()
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            raise PipelineFull(f"{self._queue.maxsize} captures already waiting to be saved")
+        return job
+
+    def pending(self):
+        """Number of captures queued but not yet picked up by a worker"""
+        return self._queue.qsize()
+
+    def idle_seconds(self):
+        """Seconds since the last capture was submitted or finished (0 while busy)"""
+        if self._queue.unfinished_tasks:
+            return 0.0
+        return time.monotonic() - self._last_activity
+
+    def is_newest(self, seq):
+        """Claim the 'latest' slot for seq; False if a newer capture already has it"""
+        with self._lock:
+            if seq < self._last_published:
+                return False
+            self._last_published = seq
+            return True
+
+    def drain(self, timeout=None):
+        """Wait until every submitted capture has been saved and its callbacks run"""
+        if timeout is None:
+            self._queue.join()
+            return True
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting captures, finish the queued ones and stop the workers"""
+        self._closed = True
+        if not wait:
+            return False
+
+        drained = self.drain(timeout)
+        if drained:
+            # Sentinels go in after the real jobs so nothing queued is dropped
+            for _ in self._workers:
+                self._queue.put(_STOP)
+            for worker in self._workers:
+                worker.join(timeout)
+        return drained
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                self._process(job)
+            except Exception as e:
+                print(f"Capture writer error: {e}")
+            finally:
+                self._last_activity = time.monotonic()
+                self._queue.task_done()
+
+    def _commit(self, staged, final):
+        if self.publisher is not None:
+            return self.publisher.commit(staged, final)
+        return commit(staged, final)
+
+    def _process(self, job):
+        started = time.monotonic()
+        digest = duplicate_of = perceptual = staged = None
+        tiles_changed = tiles_total = encoding = thumbnails = None
+        image_size = job.image.size
+        output = job.filepath if self.tiles is None else manifest_path_for(job.filepath)
+        try:
+            if self.similarity is not None:
+                perceptual = dhash(job.image)
+            if self.thumbnails is not None:
+                thumbnails = self.thumbnails.pyramid(job.image)
+            if self.store is not None:
+                # Same pixels as an earlier capture: link it, skip the encode
+                digest = pixel_digest(job.image)
+                duplicate_of = self.store.lookup(digest)
+                if duplicate_of is not None and is_manifest(duplicate_of) != (self.tiles is not None):
+                    duplicate_of = None  # Stored in the other format; cannot be linked as-is
+            if duplicate_of is not None:
+                if self.tiles is None:
+                    # Same bytes, so the same format: a WebP original gives a .webp duplicate
+                    output = job.filepath.with_suffix(duplicate_of.suffix)
+                staged = staging_path(output)
+                if self.tiles is not None and duplicate_of.parent != output.parent:
+                    # A manifest's "root" is relative to its own folder, so a link would point elsewhere
+                    staged.write_text(rerooted(duplicate_of, output.parent), encoding='utf-8')
+                else:
+                    self.store.link(duplicate_of, staged)
+                _mark(job, "encoded")
+                output = self._commit(staged, output)
+                _mark(job, "committed")
+                size_bytes = output.stat().st_size
+            elif self.tiles is not None:
+                # Atlas and manifest are each replaced atomically, manifest last
+                output, tiles_changed, tiles_total, size_bytes = self.tiles.save(job.image, job.filepath)
+                _mark(job, "encoded")
+                _mark(job, "committed")
+            elif self.encoder is not None:
+                encoding = self.encoder.encode(job.image, staging_path(job.filepath))
+                staged = encoding.path
+                _mark(job, "encoded")
+                output = self._commit(staged, job.filepath.with_suffix(staged.suffix))
+                _mark(job, "committed")
+                encoding.path = output
+                size_bytes = encoding.size_bytes
+            else:
+                staged = staging_path(output)
+                job.image.save(staged, 'PNG')
+                _mark(job, "encoded")
+                output = self._commit(staged, output)
+                _mark(job, "committed")
+                size_bytes = output.stat().st_size
+            if digest is not None:
+                self.store.add(digest, output, duplicate_of)
+            if perceptual is not None:
+                self.similarity.add(output, perceptual)
+        except Exception as e:
+            if staged is not None and staged.exists():
+                staged.unlink()
+            if job.on_error:
+                job.on_error(job, e)
+            else:
+                print(f"Error saving {job.filepath.name}: {e}")
+            return
+        finally:
+            # Release the pixels as soon as the encode is done
+            job.image = None
+            release_capture_path(job.filepath)
+
+        result = SavedCapture(
+            job.seq,
+            output,
+            size_bytes,
+            encode_seconds=time.monotonic() - started,
+            queued_seconds=started - job.submitted_at,
+            pixel_digest=digest,
+            duplicate_of=duplicate_of,
+            perceptual_hash=perceptual,
+            tiles_changed=tiles_changed,
+            tiles_total=tiles_total,
+            encoding=encoding,
+            image_size=image_size,
+            thumbnails=thumbnails,
+        )
+        if job.on_saved:
+            try:
+                job.on_saved(result)
+            except Exception as e:
+                print(f"Error in capture callback for {result.filename}: {e}")
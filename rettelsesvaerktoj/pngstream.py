@@ -0,0 +1,175 @@
+"""
+Strip-by-strip processing of large captures within a memory ceiling.
+
+A dual-4K grab is 16.6 megapixels. Anything that turns the whole frame
+into another buffer at once (tobytes() for hashing, numpy arrays for
+palette mapping) costs tens to hundreds of MB on top of the grab itself,
+per capture in flight. The helpers here walk the image in horizontal
+strips whose height is chosen so the working set stays below max_bytes
+whatever the screen size:
+
+- strips(image, bytes_per_pixel, max_bytes): (top, strip image) pairs
+- save_palette_png(): exact palette PNG written strip by strip; the RGB
+  rows are mapped to palette indices and deflated into the IDAT stream
+  directly, never building a full-size index image. Palettes of up to
+  16, 4 or 2 colours are written at 4, 2 or 1 bits per pixel, and each
+  row gets the None, Sub or Up filter that suits it best (rows repeated
+  from the one above, common on flat UI, compress to almost nothing).
+
+PngStreamWriter is the PNG container itself: signature, IHDR, PLTE,
+IDAT chunks of at most IDAT_CHUNK_BYTES and IEND, written as the
+compressed data comes out of zlib.
+"""
+
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Working memory allowed for one strip-by-strip pass
+DEFAULT_MEMORY_CEILING = 32 * 1024 ** 2
+
+# Largest IDAT chunk written
+IDAT_CHUNK_BYTES = 256 * 1024
+
+# Peak bytes per pixel while mapping a strip to palette indices
+# (uint8 RGB view, uint32 packed colour and temporary, int64 search result, index)
+PALETTE_BYTES_PER_PIXEL = 24
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+FILTERS = (0, 1, 2)  # None, Sub, Up: the order of the candidates in _filter()
+COLOUR_TYPE_PALETTE = 3
+
+
+def strip_rows(width, bytes_per_pixel, max_bytes=DEFAULT_MEMORY_CEILING):
+    """Rows per strip so one strip's working set fits in max_bytes (at least 1)"""
+    return max(1, int(max_bytes // max(1, width * bytes_per_pixel)))
+
+
+def strips(image, bytes_per_pixel, max_bytes=DEFAULT_MEMORY_CEILING):
+    """(top, strip) for consecutive full-width strips of image"""
+    rows = strip_rows(image.width, bytes_per_pixel, max_bytes)
+    for top in range(0, image.height, rows):
+        yield top, image.crop((0, top, image.width, min(image.height, top + rows)))
+
+
+def palette_bit_depth(colours):
+    for bits in (1, 2, 4):
+        if colours <= 1 << bits:
+            return bits
+    return 8
+
+
+class PngStreamWriter:
+    def __init__(self, f, width, height, colour_type, bit_depth=8, palette=None, compress_level=6):
+        """f is a binary file; palette is flat RGB bytes for colour type 3"""
+        self.f = f
+        self.height = height
+        self._rows = 0
+        self._zlib = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        f.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, colour_type, 0, 0, 0))
+        if palette is not None:
+            self._chunk(b"PLTE", bytes(palette))
+
+    def write_rows(self, scanlines, count):
+        """Add count filtered scanlines (each starting with its filter byte)"""
+        self._pending += self._zlib.compress(scanlines)
+        self._rows += count
+        while len(self._pending) >= IDAT_CHUNK_BYTES:
+            self._chunk(b"IDAT", self._pending[:IDAT_CHUNK_BYTES])
+            del self._pending[:IDAT_CHUNK_BYTES]
+
+    def close(self):
+        if self._rows != self.height:
+            raise ValueError(f"{self._rows} rows written, image has {self.height}")
+        self._pending += self._zlib.flush()
+        for offset in range(0, len(self._pending), IDAT_CHUNK_BYTES):
+            self._chunk(b"IDAT", self._pending[offset:offset + IDAT_CHUNK_BYTES])
+        self._pending = bytearray()
+        self._chunk(b"IEND", b"")
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+
+def _pack(indices, bits):
+    """Palette indices (rows, width) -> packed bytes per row at bits per pixel"""
+    rows, width = indices.shape
+    if bits < 8:
+        per_byte = 8 // bits
+        padded = -width % per_byte
+        if padded:
+            indices = np.pad(indices, ((0, 0), (0, padded)))
+        groups = indices.reshape(rows, -1, per_byte)
+        packed = np.zeros(groups.shape[:2], dtype=np.uint8)
+        for position in range(per_byte):
+            packed |= groups[..., position] << (8 - bits * (position + 1))
+        indices = packed
+    return indices
+
+
+def _filter(rows, previous):
+    """Scanlines with a per-row filter (None, Sub or Up), as libpng's heuristic picks
+
+    rows is (n, row_bytes) uint8; previous is the row above the first one
+    (zeros at the top of the image). Palette pixels are at most one byte,
+    so Sub looks one byte back.
+    """
+    above = np.vstack((previous[np.newaxis], rows[:-1]))
+    sub = rows.copy()
+    sub[:, 1:] -= rows[:, :-1]
+    up = rows - above
+    candidates = np.stack((rows, sub, up))
+    del sub, up, above
+    # Smallest sum of absolute values, reading the bytes as signed
+    costs = np.minimum(candidates, 256 - candidates.astype(np.uint16)).sum(axis=2, dtype=np.uint32)
+    choice = costs.argmin(axis=0)
+    scanlines = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 0] = np.array(FILTERS, dtype=np.uint8)[choice]
+    scanlines[:, 1:] = candidates[choice, np.arange(rows.shape[0])]
+    return scanlines.tobytes()
+
+
+def save_palette_png(image, path, colours, compress_level=6, max_bytes=DEFAULT_MEMORY_CEILING):
+    """Write an RGB image with at most 256 distinct colours as an exact palette PNG
+
+    colours are the image's distinct (r, g, b) colours (see
+    encoders.distinct_colours). The mapping is exact: Image.quantize()
+    looks colours up through a reduced-precision cache and can pick a
+    neighbour for anti-aliased text, so it is done here with a sorted-key
+    search, one strip at a time.
+    """
+    keys = np.array(sorted((r << 16) | (g << 8) | b for r, g, b in colours), dtype=np.uint32)
+    palette = bytearray()
+    for key in keys.tolist():
+        palette.extend(((key >> 16) & 0xFF, (key >> 8) & 0xFF, key & 0xFF))
+    bits = palette_bit_depth(len(keys))
+
+    with open(path, 'wb') as f:
+        writer = PngStreamWriter(f, image.width, image.height, COLOUR_TYPE_PALETTE, bits,
+                                 palette, compress_level)
+        previous = None
+        for _, strip in strips(image, PALETTE_BYTES_PER_PIXEL, max_bytes):
+            rgb = np.asarray(strip)
+            packed = rgb[..., 0].astype(np.uint32) << 16
+            packed |= rgb[..., 1].astype(np.uint32) << 8
+            packed |= rgb[..., 2]
+            del rgb
+            indices = np.searchsorted(keys, packed).astype(np.uint8)
+            del packed
+            rows = _pack(indices, bits)
+            del indices
+            if previous is None:
+                previous = np.zeros(rows.shape[1], dtype=np.uint8)
+            writer.write_rows(_filter(rows, previous), strip.height)
+            previous = rows[-1].copy()
+        writer.close()
+    return path
@@ -0,0 +1,295 @@
+"""
+Crash-safe publication of captures and the LATEST pointer.
+
+Nothing is written in place under a name a reader might open:
+
+- capture files are encoded into a .staging folder next to their final
+  location and moved into place with os.replace(), which is atomic on
+  the same volume on both Windows and POSIX, so a reader sees either no
+  file or the whole file;
+- small files (the pointer, tile manifests, session.json) go to a temp
+  file that is fsync'ed and renamed over the old one.
+
+LATEST.json holds {"seq", "file", "published_at"}. The sequence number
+only ever grows, so readers can poll it without locking (stat, or read
+and compare seq) and never see a torn or empty pointer. LATEST.txt is
+still written, name only, for older readers.
+
+Every tool instance using the same screenshots folder takes the same
+.writer.lock (flock / msvcrt) around the short publish step, so renames
+and pointer updates from concurrently running instances are serialized
+and the sequence stays consistent.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+POINTER_NAME = "LATEST.json"
+LEGACY_POINTER_NAME = "LATEST.txt"
+LOCK_NAME = ".writer.lock"
+STAGING_DIR = ".staging"
+
+DEFAULT_LOCK_TIMEOUT = 5.0
+
+# Staged files older than this belong to a crashed instance
+STALE_STAGING_SECONDS = 3600
+
+# Windows: OpenProcess access right and the error for a process we may not open
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+
+# Windows refuses to replace a file another process has open; retry briefly
+REPLACE_RETRIES = 20
+REPLACE_RETRY_DELAY = 0.005
+
+
+class WriterLockTimeout(Exception):
+    """Raised when another instance holds the writer lock for too long"""
+
+
+class WriterLock:
+    """Exclusive lock shared by every thread and process using the same file"""
+
+    def __init__(self, path, timeout=DEFAULT_LOCK_TIMEOUT):
+        self.path = Path(path)
+        self.timeout = timeout
+        # OS file locks are per process, so threads queue up here first
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+
+    def acquire(self):
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise WriterLockTimeout(f"Timed out waiting for {self.path.name}")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._lock_file()
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    self._thread_lock.release()
+                    raise WriterLockTimeout(f"Another instance is holding {self.path.name}")
+                time.sleep(0.001)
+
+    def release(self):
+        try:
+            self._unlock_file()
+        finally:
+            self._thread_lock.release()
+
+    def _lock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        os.close(self._fd)
+
+
+def replace(source, target):
+    """os.replace() that rides out a reader briefly holding target open on Windows"""
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(source, target)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(REPLACE_RETRY_DELAY)
+
+
+def fsync_path(path):
+    """Flush a closed file to disk (staged files are written by PIL, tiles.py, ...)"""
+    # Windows fsync is FlushFileBuffers, which needs a handle with write access
+    with open(path, 'r+b' if os.name == 'nt' else 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def atomic_write_text(path, text, durable=True):
+    """Replace path with text so readers see the old or the new content, never a mix"""
+    path = Path(path)
+    temp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        replace(temp, path)
+    except BaseException:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def staging_path(filepath):
+    """Where to write filepath before it is published (per process, same volume)"""
+    filepath = Path(filepath)
+    directory = filepath.parent / STAGING_DIR / str(os.getpid())
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / filepath.name
+
+
+def free_name(path):
+    """path, or path_2, path_3, ... if another instance already published that name"""
+    candidate = path
+    counter = 2
+    while candidate.exists():
+        candidate = path.with_name(f"{path.stem}_{counter}{path.suffix}")
+        counter += 1
+    return candidate
+
+
+def commit(staged, final, lock=None, durable=True):
+    """Move a fully written staged file to final; returns the path it got"""
+    if durable:
+        fsync_path(staged)
+    if lock is None:
+        final = free_name(final)
+        replace(staged, final)
+        return final
+    with lock:
+        final = free_name(final)
+        replace(staged, final)
+    return final
+
+
+def _pid_alive(pid):
+    """Whether a process with this id is running (a reused id counts as alive)"""
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Someone else's process
+    return True
+
+
+def _clean_staging_folder(staging, cutoff):
+    """Empty one .staging folder of other processes' leftovers; returns the files removed"""
+    removed = 0
+    try:
+        entries = list(os.scandir(staging))
+    except OSError:
+        return 0  # No staging folder here (yet)
+    for entry in entries:
+        if not entry.is_dir() or entry.name == str(os.getpid()):
+            continue
+        dead = not entry.name.isdigit() or not _pid_alive(int(entry.name))
+        for path in Path(entry.path).iterdir():
+            try:
+                if dead or path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass  # Another instance got there first
+        if dead:
+            try:
+                os.rmdir(entry.path)
+            except OSError:
+                pass  # Not empty after all, or already gone
+    return removed
+
+
+def clean_staging(root, max_age=STALE_STAGING_SECONDS, recursive=True):
+    """Remove staged files left behind by instances that crashed mid-write
+
+    Folders of processes that are gone are emptied and removed; in the
+    others, only files older than max_age go. recursive=True looks in
+    every .staging folder under root (burst folders, caches) and walks
+    the whole tree, so run it once per long-lived process, off the
+    capture path; recursive=False only looks at root/.staging and is
+    cheap enough to run before every capture.
+    """
+    cutoff = time.time() - max_age
+    if not recursive:
+        return _clean_staging_folder(os.path.join(root, STAGING_DIR), cutoff)
+    removed = 0
+    for folder, subfolders, _ in os.walk(root):
+        if STAGING_DIR not in subfolders:
+            continue
+        subfolders.remove(STAGING_DIR)  # Nothing to find below it
+        removed += _clean_staging_folder(os.path.join(folder, STAGING_DIR), cutoff)
+    return removed
+
+
+def read_latest(root):
+    """The current pointer as a dict, or None (safe to call while writers run)"""
+    root = Path(root)
+    try:
+        with open(root / POINTER_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    try:
+        # Folder only written by older versions
+        name = (root / LEGACY_POINTER_NAME).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    return {"seq": 0, "file": name, "published_at": None} if name else None
+
+
+class Publisher:
+    """Single-writer publication of captures and the LATEST pointer for one folder"""
+
+    def __init__(self, root, lock_timeout=DEFAULT_LOCK_TIMEOUT, durable=True):
+        self.root = Path(root)
+        self.durable = durable
+        self.lock = WriterLock(self.root / LOCK_NAME, lock_timeout)
+
+    def commit(self, staged, final):
+        return commit(staged, final, self.lock, self.durable)
+
+    def update_latest(self, relative):
+        """Point LATEST at relative (a path inside the folder); returns the new sequence number"""
+        with self.lock:
+            current = read_latest(self.root)
+            seq = (current["seq"] if current else 0) + 1
+            pointer = {
+                "seq": seq,
+                "file": relative,
+                "published_at": datetime.now().isoformat(timespec="milliseconds"),
+            }
+            atomic_write_text(self.root / POINTER_NAME, json.dumps(pointer), self.durable)
+            atomic_write_text(self.root / LEGACY_POINTER_NAME, relative, self.durable)
+        return seq
+
+    def close(self):
+        self.lock.close()
+
@@ -0,0 +1,415 @@
+"""
+Retention budgets and tiered compaction for the screenshots folder.
+
+RetentionEngine works from the capture catalogue, not directory scans:
+
+- eviction: captures older than max_age_days go first, then the least
+  recently used ones (last_access, else captured_at) until the folder is
+  under max_bytes. Pinned captures, the one LATEST points at and the
+  newest keep_latest captures are never evicted. Freed space is counted
+  per inode, so hard-linked duplicates and tile atlases still used by a
+  surviving manifest are neither counted nor deleted early.
+- compaction: plain PNGs older than compact_after_days are rewritten as
+  an exact palette PNG (few colours) or a maximum-effort PNG. Both are
+  lossless and keep the file name, so paths already handed to Claude
+  stay valid; a file is only replaced if the result is smaller.
+
+plan() works out both without touching anything and RetentionPlan.report()
+renders it as the dry-run text. run_once() applies a plan, and start()
+does so in a background thread whenever the capture pipeline has been
+idle for a while.
+
+    python -m rettelsesvaerktoj.retention --max-gb 5 --max-age-days 180           # dry run
+    python -m rettelsesvaerktoj.retention --max-gb 5 --max-age-days 180 --apply
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from PIL import Image
+
+from .annotations import AnnotationRenderer
+from .catalogue import Catalogue
+from .encoders import distinct_colours, np
+from .pngstream import save_palette_png
+from .publish import STAGING_DIR, fsync_path, read_latest, replace, staging_path
+from .similarity import SimilarityIndex
+from .thumbnails import ThumbnailCache
+from .tiles import CACHE_DIR, MANIFEST_SUFFIX, is_manifest
+
+DEFAULT_KEEP_LATEST = 50
+DEFAULT_COMPACT_AFTER_DAYS = 7
+
+# Background passes only start once no capture has been taken for this long
+IDLE_AFTER_SECONDS = 120
+CHECK_INTERVAL_SECONDS = 300
+
+# Recompressions per background pass (each one is a full decode + encode)
+COMPACT_BATCH = 10
+
+# Size ratio assumed for the dry run until some captures have been compacted
+DEFAULT_COMPACTION_RATIO = 0.8
+
+# Encoders whose output compaction cannot improve on
+DENSE_ENCODERS = {"png-palette", "png-9", "webp-lossless", "compact-palette", "compact-png-9"}
+
+
+class RetentionPolicy:
+    def __init__(self, max_bytes=None, max_age_days=None, keep_latest=DEFAULT_KEEP_LATEST,
+                 compact_after_days=DEFAULT_COMPACT_AFTER_DAYS):
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.keep_latest = keep_latest
+        self.compact_after_days = compact_after_days  # None disables compaction
+
+
+class Eviction:
+    def __init__(self, row, reason, freed_bytes, paths):
+        self.row = row
+        self.reason = reason  # "age", "size" or "missing"
+        self.freed_bytes = freed_bytes
+        self.paths = paths
+
+
+class RetentionPlan:
+    def __init__(self):
+        self.captures = 0
+        self.total_bytes = 0
+        self.remaining_bytes = 0
+        self.protected = 0
+        self.evictions = []
+        self.compactions = []
+        self.compaction_ratio = DEFAULT_COMPACTION_RATIO
+
+    @property
+    def freed_bytes(self):
+        return sum(eviction.freed_bytes for eviction in self.evictions)
+
+    @property
+    def compaction_bytes(self):
+        return sum(row["size_bytes"] or 0 for row in self.compactions)
+
+    @property
+    def estimated_compaction_saving(self):
+        return int(self.compaction_bytes * (1 - self.compaction_ratio))
+
+    def report(self, policy, verbose=False):
+        reasons = {}
+        for eviction in self.evictions:
+            reasons[eviction.reason] = reasons.get(eviction.reason, 0) + 1
+
+        budget = []
+        if policy.max_bytes is not None:
+            budget.append(f"max {_mb(policy.max_bytes)}")
+        if policy.max_age_days is not None:
+            budget.append(f"max {policy.max_age_days:g} days")
+        lines = [
+            f"Captures: {self.captures} ({_mb(self.total_bytes)} on disk)",
+            f"Budget: {', '.join(budget) or 'none'}",
+            f"Evict: {len(self.evictions)} ({_mb(self.freed_bytes)} reclaimed)"
+            + (" - " + ", ".join(f"{reason}: {count}" for reason, count in sorted(reasons.items()))
+               if reasons else ""),
+            f"Compact: {len(self.compactions)} ({_mb(self.compaction_bytes)}),"
+            f" ~{_mb(self.estimated_compaction_saving)} reclaimed (estimate)",
+            f"Protected: {self.protected} (pinned, LATEST, newest {policy.keep_latest})",
+        ]
+        if policy.max_bytes is not None and self.remaining_bytes > policy.max_bytes:
+            lines.append(f"Still {_mb(self.remaining_bytes - policy.max_bytes)} over budget"
+                         " (the rest is protected)")
+        if verbose:
+            for eviction in self.evictions:
+                lines.append(f"  evict [{eviction.reason}] {eviction.row['filename']}"
+                             f" ({eviction.freed_bytes // 1024} KB)")
+            for row in self.compactions:
+                lines.append(f"  compact {row['filename']} ({(row['size_bytes'] or 0) // 1024} KB)")
+        return "\n".join(lines)
+
+
+def _mb(size_bytes):
+    return f"{size_bytes / (1024 * 1024):.1f} MB"
+
+
+def _manifest_atlases(manifest_path):
+    """Atlas files a tile manifest takes pixels from"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    root = manifest_path.parent / manifest.get("root", ".")
+    return sorted({Path(os.path.normpath(root / atlas_name)) for atlas_name, _ in manifest["tiles"]})
+
+
+class _Inodes:
+    """Bytes on disk per inode; they only count as freed with the last link"""
+
+    def __init__(self):
+        self._files = {}
+
+    def add(self, path):
+        st = path.stat()
+        key = (st.st_dev, st.st_ino)
+        self._files.setdefault(key, [st.st_nlink, st.st_size, st.st_nlink])
+        return key
+
+    def shared(self, key):
+        return self._files[key][2] > 1
+
+    def release(self, key):
+        entry = self._files[key]
+        entry[0] -= 1
+        return entry[1] if entry[0] == 0 else 0
+
+    def total(self):
+        return sum(size for _, size, _ in self._files.values())
+
+
+class RetentionEngine:
+    def __init__(self, root, catalogue, policy=None, on_deleted=None):
+        self.root = Path(root)
+        self.catalogue = catalogue
+        self.policy = policy or RetentionPolicy()
+        self.on_deleted = on_deleted  # Called with the catalogue row of each evicted capture
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def plan(self, now=None):
+        """What a pass would evict and compact right now (touches nothing)"""
+        now = now or datetime.now()
+        policy = self.policy
+        plan = RetentionPlan()
+        rows = self.catalogue.rows()
+
+        pointer = read_latest(self.root)
+        latest_file = pointer["file"] if pointer else None
+        newest = {row["id"] for row in rows[-policy.keep_latest:]} if policy.keep_latest else set()
+
+        inodes = _Inodes()
+        atlas_keys = {}
+        atlas_refs = {}
+        live = []
+        for row in rows:
+            path = self.root / row["filename"]
+            try:
+                key = inodes.add(path)
+                atlases = _manifest_atlases(path) if is_manifest(path) else []
+            except FileNotFoundError:
+                plan.evictions.append(Eviction(row, "missing", 0, []))
+                continue
+            except (OSError, ValueError, KeyError):
+                continue  # Unreadable manifest: leave it alone
+            for atlas in atlases:
+                if atlas not in atlas_keys:
+                    try:
+                        atlas_keys[atlas] = inodes.add(atlas)
+                    except OSError:
+                        continue
+                atlas_refs[atlas] = atlas_refs.get(atlas, 0) + 1
+            live.append((row, path, key, [atlas for atlas in atlases if atlas in atlas_keys]))
+
+        plan.captures = len(live)
+        plan.total_bytes = remaining = inodes.total()
+
+        def evict(entry, reason):
+            row, path, key, atlases = entry
+            freed = inodes.release(key)
+            paths = [path]
+            for atlas in atlases:
+                atlas_refs[atlas] -= 1
+                if atlas_refs[atlas] == 0:
+                    freed += inodes.release(atlas_keys[atlas])
+                    paths.append(atlas)
+            plan.evictions.append(Eviction(row, reason, freed, paths))
+            return freed
+
+        candidates = [
+            entry for entry in live
+            if not (entry[0]["pinned"] or entry[0]["filename"] == latest_file or entry[0]["id"] in newest)
+        ]
+        plan.protected = len(live) - len(candidates)
+
+        if policy.max_age_days is not None:
+            cutoff = _stamp(now - timedelta(days=policy.max_age_days))
+            kept = []
+            for entry in candidates:
+                if entry[0]["captured_at"] < cutoff:
+                    remaining -= evict(entry, "age")
+                else:
+                    kept.append(entry)
+            candidates = kept
+
+        if policy.max_bytes is not None:
+            candidates.sort(key=lambda entry: entry[0]["last_access"] or entry[0]["captured_at"])
+            for entry in candidates:
+                if remaining <= policy.max_bytes:
+                    break
+                remaining -= evict(entry, "size")
+        plan.remaining_bytes = remaining
+
+        if policy.compact_after_days is not None:
+            evicted = {eviction.row["id"] for eviction in plan.evictions}
+            cutoff = _stamp(now - timedelta(days=policy.compact_after_days))
+            for row, path, key, _ in live:
+                if (row["id"] not in evicted and row["tier"] == 0 and path.suffix == ".png"
+                        and row["encoder"] not in DENSE_ENCODERS and row["captured_at"] < cutoff
+                        and row["filename"] != latest_file and not inodes.shared(key)):
+                    plan.compactions.append(row)
+            plan.compaction_ratio = self._compaction_ratio(rows)
+        return plan
+
+    def _compaction_ratio(self, rows):
+        before = after = 0
+        for row in rows:
+            if row["tier"] and row["original_bytes"]:
+                before += row["original_bytes"]
+                after += row["size_bytes"] or 0
+        return after / before if before else DEFAULT_COMPACTION_RATIO
+
+    def run_once(self, compact_limit=COMPACT_BATCH, is_idle=None):
+        """Apply a fresh plan; compaction stops early once is_idle() turns False"""
+        with self._run_lock:
+            plan = self.plan()
+            for eviction in plan.evictions:
+                self._evict(eviction)
+            self._prune_sessions(plan.evictions)
+
+            compactions = plan.compactions if compact_limit is None else plan.compactions[:compact_limit]
+            for row in compactions:
+                if self._stop.is_set() or (is_idle is not None and not is_idle()):
+                    break
+                try:
+                    self._compact(row)
+                except Exception as e:
+                    print(f"Could not compact {row['filename']}: {e}")
+            return plan
+
+    def _evict(self, eviction):
+        for path in eviction.paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            if is_manifest(path):
+                # Materialized copy for readers that want a plain PNG
+                cached = path.parent / CACHE_DIR / (path.name[:-len(MANIFEST_SUFFIX)] + ".png")
+                try:
+                    cached.unlink()
+                except FileNotFoundError:
+                    pass
+        self.catalogue.remove(eviction.row["id"])
+        if self.on_deleted is not None:
+            self.on_deleted(eviction.row)
+
+    def _prune_sessions(self, evictions):
+        """Remove burst folders that have no captures left"""
+        folders = {path.parent for eviction in evictions for path in eviction.paths}
+        for folder in folders:
+            if folder == self.root or not folder.is_dir():
+                continue
+            leftovers = set(os.listdir(folder)) - {"session.json", STAGING_DIR, CACHE_DIR}
+            if not leftovers:
+                shutil.rmtree(folder, ignore_errors=True)
+
+    def _compact(self, row):
+        path = self.root / row["filename"]
+        staged = staging_path(path)
+        with Image.open(path) as image:
+            image.load()
+            palette = distinct_colours(image) if image.mode == 'RGB' and np is not None else None
+            if palette is not None:
+                save_palette_png(image, staged, palette, compress_level=9)
+                encoder = "compact-palette"
+            else:
+                image.save(staged, 'PNG', compress_level=9, optimize=True)
+                encoder = "compact-png-9"
+
+        size_bytes = staged.stat().st_size
+        if size_bytes < path.stat().st_size:
+            fsync_path(staged)
+            replace(staged, path)
+        else:
+            # Already as dense as this gets; remember that so it is not retried
+            staged.unlink()
+            size_bytes = path.stat().st_size
+            encoder = row["encoder"] or "png"
+        self.catalogue.compacted(row["id"], size_bytes, encoder)
+
+    def start(self, idle_seconds):
+        """Run passes in the background while idle_seconds() >= IDLE_AFTER_SECONDS"""
+        def is_idle():
+            return idle_seconds() >= IDLE_AFTER_SECONDS
+
+        def loop():
+            while not self._stop.wait(CHECK_INTERVAL_SECONDS):
+                if not is_idle():
+                    continue
+                try:
+                    self.run_once(is_idle=is_idle)
+                except Exception as e:
+                    print(f"Retention error: {e}")
+
+        self._thread = threading.Thread(target=loop, name="retention", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def _stamp(when):
+    return when.isoformat(timespec="milliseconds")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rettelsesvaerktoj.retention")
+    parser.add_argument("--dir", default=None, help="Screenshots folder (default: ./Rettelser)")
+    parser.add_argument("--max-gb", type=float, default=None, help="Size budget in GB")
+    parser.add_argument("--max-age-days", type=float, default=None, help="Delete captures older than this")
+    parser.add_argument("--keep-latest", type=int, default=DEFAULT_KEEP_LATEST)
+    parser.add_argument("--compact-after-days", type=float, default=DEFAULT_COMPACT_AFTER_DAYS)
+    parser.add_argument("--apply", action="store_true", help="Delete and compact (default: dry run)")
+    parser.add_argument("--verbose", action="store_true", help="List every affected capture")
+    args = parser.parse_args(argv)
+
+    root = Path(args.dir) if args.dir else Path.cwd() / "Rettelser"
+    policy = RetentionPolicy(
+        max_bytes=int(args.max_gb * 1024 ** 3) if args.max_gb is not None else None,
+        max_age_days=args.max_age_days,
+        keep_latest=args.keep_latest,
+        compact_after_days=args.compact_after_days,
+    )
+    catalogue = Catalogue(root)
+    try:
+        on_deleted = None
+        if args.apply:
+            # Same clean-up as the tray app: nothing derived from an evicted capture stays behind
+            thumbnails = ThumbnailCache(root, catalogue)
+            similarity = SimilarityIndex(root)
+            annotations = AnnotationRenderer(root)
+
+            def on_deleted(row):
+                path = root / row["filename"]
+                thumbnails.invalidate(row["id"])
+                similarity.remove(path)
+                annotations.forget(path)
+
+        engine = RetentionEngine(root, catalogue, policy, on_deleted=on_deleted)
+        if args.apply:
+            plan = engine.run_once(compact_limit=None)
+        else:
+            plan = engine.plan()
+            print("Dry run - nothing was deleted or changed")
+        print(plan.report(policy, verbose=args.verbose))
+    finally:
+        catalogue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
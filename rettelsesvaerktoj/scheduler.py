@@ -0,0 +1,232 @@
+"""
+Single-flight capture scheduling for the tray app.
+
+Holding or mashing Ctrl+Shift+S fires the hotkey many times a second.
+CaptureScheduler makes sure that turns into one selection overlay and a
+bounded number of captures:
+
+- begin_selection() admits one selection at a time. Triggers arriving
+  while the overlay is open (or being prepared) are coalesced into it
+  and only counted; end_selection() reopens the slot when the overlay
+  hides, whether a capture was taken or not.
+- submit() runs a capture on its own thread once it fits: at most
+  max_in_flight captures and max_bytes of estimated pixel memory are in
+  flight at once (one capture is always admitted, however large). A
+  capture stays in flight until it calls the finished() callback it is
+  given, i.e. until it is saved, not merely grabbed.
+- What does not fit waits in a queue of at most max_queued captures
+  (policy QUEUE) or is rejected straight away (policy REJECT). Captures
+  that do not fit the queue either are rejected.
+- A waiting capture can be cancelled and never runs; a running one sees
+  its cancelled flag and may stop before handing pixels on.
+  cancel_pending() cancels everything still waiting (used on quit).
+
+stats() reports triggers, coalesced, dropped, cancelled and completed
+counts plus what is in flight.
+"""
+
+import threading
+import time
+from collections import deque
+
+QUEUE = "queue"
+REJECT = "reject"
+
+# Captures between grab and saved file at once
+MAX_IN_FLIGHT = 2
+
+# Captures waiting for a slot (policy QUEUE)
+MAX_QUEUED = 2
+
+# Estimated pixel memory of captures in flight (two full 4K RGBA frames)
+MAX_IN_FLIGHT_BYTES = 2 * 3840 * 2160 * 4
+
+# An overlay open this long is assumed lost (UI thread gone) and no longer blocks triggers
+SELECTION_TIMEOUT = 600
+
+
+class CaptureRejected(Exception):
+    """Raised by submit() when a capture neither fits nor may wait"""
+
+
+class ScheduledCapture:
+    WAITING = "waiting"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+    def __init__(self, scheduler, start, nbytes, label):
+        self._scheduler = scheduler
+        self.start = start
+        self.nbytes = nbytes
+        self.label = label
+        self.state = self.WAITING
+        self.cancelled = False
+        self.submitted_at = time.monotonic()
+        self.done = threading.Event()
+
+    def cancel(self):
+        """Cancel the capture; True if it had not started yet"""
+        return self._scheduler._cancel(self)
+
+    def finished(self):
+        """Release the capture's slot (called by the capture once it is saved or failed)"""
+        self._scheduler._finish(self)
+
+    def __repr__(self):
+        return f"<ScheduledCapture {self.label} {self.state} {self.nbytes} bytes>"
+
+
+class CaptureScheduler:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED,
+                 max_bytes=MAX_IN_FLIGHT_BYTES, policy=QUEUE, name="capture"):
+        if policy not in (QUEUE, REJECT):
+            raise ValueError(f"Unknown capture policy: {policy}")
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.name = name
+        self._lock = threading.Lock()
+        self._waiting = deque()
+        self._running = set()
+        self._running_bytes = 0
+        self._selection_since = None
+        self._closed = False
+        self.triggers = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.completed = 0
+
+    def begin_selection(self):
+        """Claim the selection overlay for a trigger; False if one is already open (coalesced)"""
+        with self._lock:
+            self.triggers += 1
+            now = time.monotonic()
+            if self._closed:
+                self.dropped += 1
+                return False
+            if self._selection_since is not None and now - self._selection_since < SELECTION_TIMEOUT:
+                self.coalesced += 1
+                return False
+            self._selection_since = now
+            return True
+
+    def end_selection(self):
+        """The overlay is gone; the next trigger opens a new one"""
+        with self._lock:
+            self._selection_since = None
+
+    @property
+    def selecting(self):
+        return self._selection_since is not None
+
+    def submit(self, start, nbytes=0, label="capture"):
+        """Run start(capture) on its own thread once it fits; raises CaptureRejected
+
+        start must call capture.finished() when the capture is saved or has
+        failed; if it raises, the slot is released for it.
+        """
+        capture = ScheduledCapture(self, start, nbytes, label)
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                raise CaptureRejected("Capture scheduler is shutting down")
+            if not self._fits(capture) and (self.policy == REJECT or len(self._waiting) >= self.max_queued):
+                self.dropped += 1
+                raise CaptureRejected(
+                    f"{len(self._running)} captures in flight and {len(self._waiting)} waiting"
+                )
+            self._waiting.append(capture)
+            ready = self._admit()
+        self._launch(ready)
+        return capture
+
+    def cancel_pending(self):
+        """Cancel every capture still waiting; returns how many"""
+        with self._lock:
+            waiting = list(self._waiting)
+        return sum(capture.cancel() for capture in waiting)
+
+    def close(self, timeout=None):
+        """Refuse new work, cancel what is waiting and wait for running captures"""
+        with self._lock:
+            self._closed = True
+            self._selection_since = None
+            running = list(self._running)
+        self.cancel_pending()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for capture in running:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not capture.done.wait(remaining):
+                return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "triggers": self.triggers,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "cancelled": self.cancelled,
+                "completed": self.completed,
+                "in_flight": len(self._running),
+                "in_flight_bytes": self._running_bytes,
+                "waiting": len(self._waiting),
+                "selecting": self._selection_since is not None,
+            }
+
+    def _fits(self, capture):
+        if len(self._running) >= self.max_in_flight:
+            return False
+        return not self._running or self._running_bytes + capture.nbytes <= self.max_bytes
+
+    def _admit(self):
+        """Move waiting captures that now fit to running (lock held); oldest first"""
+        ready = []
+        while self._waiting and self._fits(self._waiting[0]):
+            capture = self._waiting.popleft()
+            capture.state = ScheduledCapture.RUNNING
+            self._running.add(capture)
+            self._running_bytes += capture.nbytes
+            ready.append(capture)
+        return ready
+
+    def _launch(self, ready):
+        for capture in ready:
+            threading.Thread(target=self._run, args=(capture,), name=f"{self.name}-{capture.label}",
+                             daemon=True).start()
+
+    def _run(self, capture):
+        try:
+            capture.start(capture)
+        except Exception as e:
+            print(f"Capture error: {e}")
+            capture.finished()
+
+    def _finish(self, capture):
+        with self._lock:
+            if capture not in self._running:
+                return
+            self._running.discard(capture)
+            self._running_bytes -= capture.nbytes
+            capture.state = ScheduledCapture.CANCELLED if capture.cancelled else ScheduledCapture.DONE
+            if not capture.cancelled:
+                self.completed += 1
+            ready = self._admit()
+        capture.done.set()
+        self._launch(ready)
+
+    def _cancel(self, capture):
+        with self._lock:
+            if capture.cancelled or capture.state in (ScheduledCapture.DONE, ScheduledCapture.CANCELLED):
+                return False
+            capture.cancelled = True
+            self.cancelled += 1
+            if capture.state != ScheduledCapture.WAITING:
+                return False  # Running: the capture checks the flag itself
+            self._waiting.remove(capture)
+            capture.state = ScheduledCapture.CANCELLED
+        capture.done.set()
+        return True
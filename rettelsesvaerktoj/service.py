@@ -0,0 +1,273 @@
+"""
+Local capture service: a small HTTP API on 127.0.0.1 for tooling.
+
+    POST /capture              {"region": [x1, y1, x2, y2]} or {"full": true}
+    GET  /latest               newest capture
+    GET  /captures?since=ID    captures after ID, oldest first (&limit=N)
+    GET  /events?since=ID      text/event-stream, one "capture" event per new capture
+    GET  /thumbnails/ID?size=N preview JPEG (see thumbnails.py)
+    GET  /annotated/ID         the capture with its annotations drawn in (see annotations.py)
+
+Captures are returned as their catalogue rows plus an absolute "path".
+/latest, /thumbnails and /annotated count as a use of the capture
+(Catalogue.touch), which is what the retention LRU goes by.
+The event stream is fed from the catalogue, so a subscriber that
+reconnects with ?since= (or Last-Event-ID) gets everything it missed,
+and captures written by other instances show up within KEEPALIVE_SECONDS.
+Captures from this instance are pushed as soon as they are recorded.
+
+The URL, port and a per-run token are published in Rettelser/.service.json.
+Every request must carry the token (X-Rettelser-Token header, or ?token=
+for EventSource clients) and a localhost Host header, so web pages in a
+browser cannot trigger captures or read them (CSRF, DNS rebinding).
+"""
+
+import json
+import mimetypes
+import os
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .publish import atomic_write_text
+
+SERVICE_FILE = ".service.json"
+DEFAULT_HOST = "127.0.0.1"
+TOKEN_HEADER = "X-Rettelser-Token"
+
+# Idle event streams send a comment this often (also picks up other instances' captures)
+KEEPALIVE_SECONDS = 15
+
+# How long POST /capture waits for the capture to be saved
+CAPTURE_TIMEOUT = 30
+
+MAX_LIST = 1000
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "[::1]"}
+
+
+class CaptureEvents:
+    """Wakes event streams when a capture is recorded"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._latest_id = 0
+        self.closed = False
+
+    def notify(self, capture_id):
+        with self._condition:
+            self._latest_id = max(self._latest_id, capture_id)
+            self._condition.notify_all()
+
+    def wait(self, after_id, timeout):
+        """Block until a capture newer than after_id is recorded or timeout passes"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or self._latest_id > after_id, timeout)
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class CaptureService:
+    def __init__(self, root, catalogue, capture, thumbnails=None, host=DEFAULT_HOST, port=0,
+                 annotations=None):
+        """capture(area) takes a screenshot (area None = fullscreen) and returns its catalogue id"""
+        self.root = root
+        self.catalogue = catalogue
+        self.capture = capture
+        self.thumbnails = thumbnails
+        self.annotations = annotations
+        self.events = CaptureEvents()
+        self.token = secrets.token_urlsafe(16)
+        self.service_file = root / SERVICE_FILE
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="capture-service", daemon=True)
+        self._thread.start()
+        atomic_write_text(self.service_file, json.dumps({
+            "url": self.url,
+            "port": self.server.server_address[1],
+            "pid": os.getpid(),
+            "token": self.token,
+        }))
+        return self
+
+    def notify(self, capture_id):
+        """Tell subscribers a capture was recorded"""
+        self.events.notify(capture_id)
+
+    def stop(self):
+        self.events.close()  # Ends open event streams
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            with open(self.service_file, 'r', encoding='utf-8') as f:
+                mine = json.load(f).get("pid") == os.getpid()
+            if mine:
+                self.service_file.unlink()
+        except (OSError, ValueError):
+            pass
+
+    def describe(self, row):
+        if row is None:
+            return None
+        row = dict(row)
+        row["path"] = str(self.root / row["filename"])
+        return row
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "Rettelsesvaerktoj"
+
+    def log_message(self, format, *args):
+        pass  # Quiet; this runs inside the tray app
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _authorized(self, query):
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        token = self.headers.get(TOKEN_HEADER) or query.get("token", [None])[0]
+        return host in LOCAL_HOSTS and token is not None and secrets.compare_digest(token, self.service.token)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parse(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if not self._authorized(query):
+            self._send_json(403, {"error": "missing or wrong token"})
+            return None, None
+        return url.path.rstrip("/") or "/", query
+
+    def do_GET(self):
+        path, query = self._parse()
+        if path is None:
+            return
+        try:
+            if path == "/latest":
+                latest = self.service.describe(self.service.catalogue.latest())
+                if latest:
+                    self.service.catalogue.touch(latest["id"])
+                self._send_json(200 if latest else 404, latest or {"error": "no captures yet"})
+            elif path == "/captures":
+                since = int(query.get("since", ["0"])[0])
+                limit = min(int(query.get("limit", [str(MAX_LIST)])[0]), MAX_LIST)
+                rows = self.service.catalogue.since(since, limit)
+                self._send_json(200, [self.service.describe(row) for row in rows])
+            elif path == "/events":
+                self._stream(query)
+            elif path.startswith("/thumbnails/") and self.service.thumbnails is not None:
+                self._thumbnail(int(path.rsplit("/", 1)[1]), int(query.get("size", ["256"])[0]))
+            elif path.startswith("/annotated/") and self.service.annotations is not None:
+                self._annotated(int(path.rsplit("/", 1)[1]))
+            else:
+                self._send_json(404, {"error": "unknown endpoint"})
+        except ValueError:
+            self._send_json(400, {"error": "bad number in request"})
+
+    def do_POST(self):
+        path, _ = self._parse()
+        if path is None:
+            return
+        if path != "/capture":
+            self._send_json(404, {"error": "unknown endpoint"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request body must be a JSON object")
+            area = None if request.get("full") else request.get("region")
+            if area is not None:
+                area = tuple(int(v) for v in area)
+                if len(area) != 4 or area[2] <= area[0] or area[3] <= area[1]:
+                    raise ValueError("region must be [x1, y1, x2, y2] with x2 > x1 and y2 > y1")
+            elif not request.get("full"):
+                raise ValueError('send {"region": [x1, y1, x2, y2]} or {"full": true}')
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        capture_id = self.service.capture(area)
+        if capture_id is None:
+            self._send_json(500, {"error": "capture failed or timed out"})
+            return
+        self._send_json(201, self.service.describe(self.service.catalogue.get(capture_id)))
+
+    def _stream(self, query):
+        last = self.headers.get("Last-Event-ID") or query.get("since", [None])[0]
+        if last is None:
+            latest = self.service.catalogue.latest()
+            last = latest["id"] if latest else 0
+        last = int(last)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while not self.service.events.closed:
+                rows = self.service.catalogue.since(last, MAX_LIST)
+                for row in rows:
+                    data = json.dumps(self.service.describe(row))
+                    self.wfile.write(f"id: {row['id']}\nevent: capture\ndata: {data}\n\n".encode('utf-8'))
+                    last = row["id"]
+                if not rows:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+                if len(rows) < MAX_LIST:
+                    self.service.events.wait(last, KEEPALIVE_SECONDS)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Subscriber went away
+
+    def _thumbnail(self, capture_id, size):
+        self._send_capture_file(capture_id, lambda: self.service.thumbnails.get(capture_id, size))
+
+    def _annotated(self, capture_id):
+        def render():
+            row = self.service.catalogue.get(capture_id)
+            if row is None:
+                return None
+            return self.service.annotations.render_path(self.service.root / row["filename"])
+        self._send_capture_file(capture_id, render)
+
+    def _send_capture_file(self, capture_id, produce):
+        """Send the file produce() returns (None: no such capture) and count it as a use"""
+        try:
+            path = produce()
+            body = path.read_bytes() if path is not None else None
+        except FileNotFoundError:
+            body = None  # Evicted by retention while this request was running
+        except OSError as e:
+            self._send_json(500, {"error": f"could not read capture: {e}"})
+            return
+        if body is None:
+            self._send_json(404, {"error": "no such capture"})
+            return
+        self.service.catalogue.touch(capture_id)
+        self.send_response(200)
+        self.send_header("Content-Type", mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
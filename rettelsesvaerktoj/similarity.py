@@ -0,0 +1,237 @@
+"""
+Perceptual-hash index for finding near-duplicate captures.
+
+Each capture gets a 64-bit difference hash (dHash) computed from the
+in-memory frame at capture time. Hashes go into a multi-index hash
+table, so "what looks like this?" only compares against the few hashes
+that share an exact chunk with the query instead of decoding every PNG. The hashes are persisted in
+an append-only .phash-index.jsonl next to the captures; a deleted capture
+gets a {"file": ..., "removed": true} line.
+"""
+
+import json
+import threading
+
+from PIL import Image
+
+from .tiles import ATLAS_SUFFIX, MANIFEST_SUFFIX, is_manifest, load as load_tiles
+
+INDEX_NAME = ".phash-index.jsonl"
+
+# What backfill() hashes: every format AdaptiveEncoder writes, plus tile manifests
+CAPTURE_PATTERNS = ("**/*.png", "**/*.webp", "**/*" + MANIFEST_SUFFIX)
+
+# Up to this many differing bits counts as "the same screen" (cursor blink,
+# clock tick) for a 64-bit dHash
+DEFAULT_MAX_DISTANCE = 6
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash: brightness gradient of a (9x8) thumbnail"""
+    # Shrink first (cheap on RGB) and only then drop to greyscale
+    small = image.resize((hash_size + 1, hash_size), Image.BOX).convert('L')
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class MultiIndexHash:
+    """Multi-index hash table over 64-bit hashes for Hamming range queries
+
+    The hash is split into max_distance + 1 chunks with one exact-match
+    table per chunk. By the pigeonhole principle two hashes within
+    max_distance bits agree exactly on at least one chunk, so a query only
+    checks the few hashes that share a chunk with it.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, bits=64):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        self._chunks = []
+        shift = 0
+        for index in range(chunks):
+            width = bits // chunks + (1 if index < bits % chunks else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables = [{} for _ in self._chunks]
+        self._items = {}
+
+    def __len__(self):
+        return sum(len(items) for items in self._items.values())
+
+    def add(self, value, item):
+        items = self._items.get(value)
+        if items is not None:
+            items.append(item)  # Same hash, keep both captures
+            return
+        self._items[value] = [item]
+        for (shift, mask), table in zip(self._chunks, self._tables):
+            table.setdefault((value >> shift) & mask, []).append(value)
+
+    def remove(self, value, item):
+        """Drop one item stored under value; False if it was not there"""
+        items = self._items.get(value)
+        if not items or item not in items:
+            return False
+        items.remove(item)
+        if not items:
+            del self._items[value]
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                key = (value >> shift) & mask
+                table[key].remove(value)
+                if not table[key]:
+                    del table[key]
+        return True
+
+    def search(self, value, max_distance=None):
+        """All (distance, item) within max_distance of value, nearest first"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            # Wider than the index guarantees: check every distinct hash
+            candidates = self._items.keys()
+        else:
+            candidates = set()
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                candidates.update(table.get((value >> shift) & mask, ()))
+
+        matches = []
+        for candidate in candidates:
+            distance = hamming(value, candidate)
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in self._items[candidate])
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class SimilarityIndex:
+    def __init__(self, root):
+        self.root = root
+        self.index_path = root / INDEX_NAME
+        self.table = MultiIndexHash()
+        self._hashes = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("removed"):
+                    self._discard(entry["file"])
+                else:
+                    self._insert(entry["file"], int(entry["dhash"], 16))
+
+    def _insert(self, relative, value):
+        if relative in self._hashes:
+            return
+        self._hashes[relative] = value
+        self.table.add(value, relative)
+
+    def _discard(self, relative):
+        value = self._hashes.pop(relative, None)
+        if value is None:
+            return False
+        return self.table.remove(value, relative)
+
+    def __contains__(self, path):
+        return self._relative(path) in self._hashes
+
+    def _relative(self, path):
+        return path.relative_to(self.root).as_posix()
+
+    def add(self, path, value):
+        """Record the hash of a capture that is now on disk"""
+        relative = self._relative(path)
+        with self._lock:
+            if relative in self._hashes:
+                return
+            self._insert(relative, value)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"file": relative, "dhash": f"{value:016x}"}) + "\n")
+
+    def remove(self, path):
+        """Forget a capture that was deleted, so lookups no longer return it"""
+        relative = self._relative(path)
+        with self._lock:
+            if not self._discard(relative):
+                return False
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"file": relative, "removed": True}) + "\n")
+        return True
+
+    def hash_of(self, path):
+        return self._hashes.get(self._relative(path))
+
+    def find_similar(self, path_or_hash, max_distance=DEFAULT_MAX_DISTANCE):
+        """Captures that look like the given one, as (distance, Path), nearest first"""
+        value = path_or_hash
+        exclude = None
+        if not isinstance(path_or_hash, int):
+            exclude = self._relative(path_or_hash)
+            value = self._hashes.get(exclude)
+            if value is None:
+                with Image.open(path_or_hash) as image:
+                    value = dhash(image)
+        with self._lock:
+            matches = self.table.search(value, max_distance)
+        return [(distance, self.root / relative)
+                for distance, relative in matches if relative != exclude]
+
+    def collapse(self, max_distance=DEFAULT_MAX_DISTANCE):
+        """Group the archive into clusters of near-duplicates (singletons left out)"""
+        with self._lock:
+            files = sorted(self._hashes)
+            parent = {relative: relative for relative in files}
+
+            def find(relative):
+                while parent[relative] != relative:
+                    parent[relative] = parent[parent[relative]]
+                    relative = parent[relative]
+                return relative
+
+            for relative in files:
+                for _, other in self.table.search(self._hashes[relative], max_distance):
+                    a, b = find(relative), find(other)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+
+        groups = {}
+        for relative in files:
+            groups.setdefault(find(relative), []).append(self.root / relative)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def backfill(self, patterns=CAPTURE_PATTERNS):
+        """Hash captures that predate the index (decodes each missing file once)"""
+        added = 0
+        paths = sorted({path for pattern in patterns for path in self.root.glob(pattern)})
+        for path in paths:
+            # Hidden files and caches (.tiles-cache, .annotated renders) are not captures,
+            # and neither are the atlases behind tile manifests
+            if any(part.startswith('.') for part in path.relative_to(self.root).parts) \
+                    or path.name.endswith(ATLAS_SUFFIX) or path in self:
+                continue
+            try:
+                if is_manifest(path):
+                    self.add(path, dhash(load_tiles(path)))
+                else:
+                    with Image.open(path) as image:
+                        image.draft('RGB', (64, 64))  # Cheap decode where the format allows it
+                        self.add(path, dhash(image))
+                added += 1
+            except OSError as e:
+                print(f"Could not hash {path.name}: {e}")
+        return added
@@ -0,0 +1,39 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+
+from rettelsesvaerktoj.catalogue import Catalogue
+from rettelsesvaerktoj.pipeline import SavedCapture
+
+
+@pytest.fixture
+def root(tmp_path):
+    folder = tmp_path / "Rettelser"
+    folder.mkdir()
+    return folder
+
+
+@pytest.fixture
+def catalogue(root):
+    catalogue = Catalogue(root)
+    yield catalogue
+    catalogue.close()
+
+
+@pytest.fixture
+def add_capture(root, catalogue):
+    """add_capture(name, days_ago=0, link_to=None) writes a capture and records it; returns its id"""
+    now = datetime.now()
+
+    def add(name, days_ago=0, link_to=None, size=(64, 48), colour=(200, 30, 30)):
+        path = root / name
+        if link_to is not None:
+            os.link(root / link_to, path)
+        else:
+            Image.new("RGB", size, colour).save(path)
+        saved = SavedCapture(0, path, path.stat().st_size, 0.0, 0.0, image_size=size)
+        return catalogue.record(saved, now - timedelta(days=days_ago))
+
+    return add
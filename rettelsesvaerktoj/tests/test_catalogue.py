@@ -0,0 +1,39 @@
+def test_latest_is_none_when_empty(catalogue):
+    assert catalogue.latest() is None
+
+
+def test_latest_is_the_newest_record(catalogue, add_capture):
+    add_capture("a.png", days_ago=1)
+    newest = add_capture("b.png", days_ago=2)  # Recorded last, even if taken earlier
+    row = catalogue.latest()
+    assert row["id"] == newest
+    assert row["filename"] == "b.png"
+    assert (row["width"], row["height"]) == (64, 48)
+
+
+def test_since_returns_later_captures_oldest_first(catalogue, add_capture):
+    ids = [add_capture(f"{index}.png") for index in range(5)]
+    assert [row["id"] for row in catalogue.since(0)] == ids
+    assert [row["id"] for row in catalogue.since(ids[1])] == ids[2:]
+    assert [row["id"] for row in catalogue.since(ids[1], limit=2)] == ids[2:4]
+    assert catalogue.since(ids[-1]) == []
+
+
+def test_since_sees_captures_recorded_by_another_connection(root, catalogue, add_capture):
+    from rettelsesvaerktoj.catalogue import Catalogue
+
+    first = add_capture("a.png")
+    other = Catalogue(root)
+    try:
+        assert [row["filename"] for row in other.since(0)] == ["a.png"]
+        second = add_capture("b.png")
+        assert [row["id"] for row in other.since(first)] == [second]
+        assert other.latest()["id"] == second
+    finally:
+        other.close()
+
+
+def test_records_are_relative_to_the_folder(root, catalogue, add_capture):
+    (root / "burst_1").mkdir()
+    add_capture("burst_1/frame_0000.png")
+    assert catalogue.latest()["filename"] == "burst_1/frame_0000.png"
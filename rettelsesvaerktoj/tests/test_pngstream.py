@@ -0,0 +1,61 @@
+import random
+
+import pytest
+from PIL import Image
+
+from rettelsesvaerktoj import pngstream
+
+pytest.importorskip("numpy")
+
+
+def _palette_image(width, height, colours, seed=1):
+    rng = random.Random(seed)
+    palette = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(colours)]
+    palette = list(dict.fromkeys(palette))
+    image = Image.new("RGB", (width, height))
+    # Runs of one colour plus repeated rows, like a flat UI
+    pixels = []
+    for y in range(height):
+        if y and rng.random() < 0.3:
+            pixels.extend(pixels[-width:])
+            continue
+        x = 0
+        while x < width:
+            run = min(width - x, rng.randint(1, 12))
+            pixels.extend([rng.choice(palette)] * run)
+            x += run
+    image.putdata(pixels)
+    return image
+
+
+@pytest.mark.parametrize("colours,bits", [(2, 1), (3, 2), (16, 4), (17, 8), (200, 8)])
+def test_palette_round_trip(tmp_path, colours, bits):
+    # Odd width so packed rows end part-way through a byte
+    image = _palette_image(37, 29, colours)
+    found = [colour for _, colour in image.getcolors(256)]
+    path = tmp_path / "capture.png"
+
+    # A tiny ceiling forces many strips, so filters run across strip boundaries
+    pngstream.save_palette_png(image, path, found, max_bytes=37 * 24 * 3)
+
+    with Image.open(path) as saved:
+        assert saved.mode == "P"
+        assert saved.convert("RGB").tobytes() == image.tobytes()
+    assert path.read_bytes()[24] == bits  # IHDR bit depth
+
+
+def test_single_colour_image(tmp_path):
+    image = Image.new("RGB", (10, 5), (12, 34, 56))
+    path = pngstream.save_palette_png(image, tmp_path / "flat.png", [(12, 34, 56)])
+    with Image.open(path) as saved:
+        assert saved.convert("RGB").tobytes() == image.tobytes()
+
+
+def test_strips_cover_the_image_within_the_ceiling():
+    image = Image.new("RGB", (100, 55))
+    tops = []
+    for top, strip in pngstream.strips(image, 4, max_bytes=100 * 4 * 10):
+        assert strip.width == 100 and strip.height <= 10
+        tops.append(top)
+    assert tops == [0, 10, 20, 30, 40, 50]
+    assert pngstream.strip_rows(10 ** 9, 4, max_bytes=1) == 1
@@ -0,0 +1,105 @@
+import os
+import threading
+
+from rettelsesvaerktoj.publish import (
+    LEGACY_POINTER_NAME, POINTER_NAME, STAGING_DIR, Publisher, clean_staging, commit, free_name,
+    read_latest, staging_path,
+)
+
+
+def test_staging_path_is_per_process_next_to_the_target(root):
+    staged = staging_path(root / "burst_1" / "frame_0000.png")
+    assert staged == root / "burst_1" / STAGING_DIR / str(os.getpid()) / "frame_0000.png"
+    assert staged.parent.is_dir()
+
+
+def test_free_name_skips_published_names(root):
+    target = root / "screenshot.png"
+    assert free_name(target) == target
+    target.write_bytes(b"a")
+    (root / "screenshot_2.png").write_bytes(b"b")
+    assert free_name(target) == root / "screenshot_3.png"
+
+
+def test_commit_moves_the_staged_file_without_overwriting(root):
+    final = root / "screenshot.png"
+    final.write_bytes(b"first")
+    staged = staging_path(final)
+    staged.write_bytes(b"second")
+
+    published = commit(staged, final, durable=False)
+
+    assert published == root / "screenshot_2.png"
+    assert published.read_bytes() == b"second"
+    assert final.read_bytes() == b"first"
+    assert not staged.exists()
+
+
+def test_publisher_commit_takes_the_writer_lock(root):
+    publisher = Publisher(root, durable=False)
+    try:
+        staged = staging_path(root / "a.png")
+        staged.write_bytes(b"x")
+        assert publisher.commit(staged, root / "a.png") == root / "a.png"
+    finally:
+        publisher.close()
+
+
+def test_update_latest_sequence_and_legacy_pointer(root):
+    publisher = Publisher(root, durable=False)
+    try:
+        assert read_latest(root) is None
+        assert publisher.update_latest("a.png") == 1
+        assert publisher.update_latest("burst_1/frame_0000.png") == 2
+    finally:
+        publisher.close()
+
+    pointer = read_latest(root)
+    assert pointer["seq"] == 2
+    assert pointer["file"] == "burst_1/frame_0000.png"
+    assert (root / LEGACY_POINTER_NAME).read_text(encoding="utf-8") == "burst_1/frame_0000.png"
+
+
+def test_update_latest_sequence_is_consistent_across_instances(root):
+    # Two publishers stand in for two tool instances sharing the folder
+    publishers = [Publisher(root, durable=False) for _ in range(2)]
+    seqs = []
+    seqs_lock = threading.Lock()
+
+    def publish(publisher, name):
+        for index in range(25):
+            seq = publisher.update_latest(f"{name}-{index}.png")
+            with seqs_lock:
+                seqs.append(seq)
+
+    threads = [threading.Thread(target=publish, args=(publisher, f"p{number}"))
+               for number, publisher in enumerate(publishers) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for publisher in publishers:
+        publisher.close()
+
+    assert sorted(seqs) == list(range(1, 101))
+    assert read_latest(root)["seq"] == 100
+
+
+def test_read_latest_falls_back_to_the_legacy_pointer(root):
+    (root / LEGACY_POINTER_NAME).write_text("old.png\n", encoding="utf-8")
+    assert read_latest(root) == {"seq": 0, "file": "old.png", "published_at": None}
+    (root / POINTER_NAME).write_text("{torn", encoding="utf-8")
+    assert read_latest(root)["file"] == "old.png"
+
+
+def test_clean_staging_removes_leftovers_of_dead_processes(root):
+    dead = root / "burst_1" / STAGING_DIR / "crashed"
+    dead.mkdir(parents=True)
+    (dead / "frame_0000.png").write_bytes(b"x")
+    mine = staging_path(root / "a.png")
+    mine.write_bytes(b"x")
+
+    assert clean_staging(root, recursive=False) == 0
+    assert clean_staging(root) == 1
+    assert not dead.exists()
+    assert mine.exists()
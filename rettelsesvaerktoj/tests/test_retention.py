@@ -0,0 +1,79 @@
+from rettelsesvaerktoj.publish import Publisher
+from rettelsesvaerktoj.retention import RetentionEngine, RetentionPolicy
+
+
+def _plan(root, catalogue, **policy):
+    policy.setdefault("keep_latest", 0)
+    policy.setdefault("compact_after_days", None)
+    return RetentionEngine(root, catalogue, RetentionPolicy(**policy)).plan()
+
+
+def _evicted(plan):
+    return sorted(eviction.row["filename"] for eviction in plan.evictions)
+
+
+def test_age_budget_evicts_old_captures(root, catalogue, add_capture):
+    add_capture("old.png", days_ago=200)
+    add_capture("new.png", days_ago=1)
+    plan = _plan(root, catalogue, max_age_days=180)
+    assert _evicted(plan) == ["old.png"]
+    assert plan.evictions[0].reason == "age"
+    assert plan.evictions[0].freed_bytes == (root / "old.png").stat().st_size
+
+
+def test_pinned_latest_and_newest_are_protected(root, catalogue, add_capture):
+    pinned = add_capture("pinned.png", days_ago=300)
+    add_capture("pointer.png", days_ago=300)
+    add_capture("old.png", days_ago=300)
+    add_capture("newest.png", days_ago=300)
+    catalogue.set_pinned(pinned)
+    publisher = Publisher(root, durable=False)
+    publisher.update_latest("pointer.png")
+    publisher.close()
+
+    plan = _plan(root, catalogue, max_age_days=30, keep_latest=1)
+    assert _evicted(plan) == ["old.png"]
+    assert plan.protected == 3
+
+
+def test_size_budget_evicts_least_recently_used_first(root, catalogue, add_capture):
+    first = add_capture("a.png", days_ago=3)
+    add_capture("b.png", days_ago=2)
+    add_capture("c.png", days_ago=1)
+    catalogue.touch(first)  # a.png was just used, so b.png is the least recent
+    size = (root / "a.png").stat().st_size
+
+    plan = _plan(root, catalogue, max_bytes=2 * size)
+    assert _evicted(plan) == ["b.png"]
+    assert plan.remaining_bytes == 2 * size
+
+
+def test_hard_linked_duplicates_count_once(root, catalogue, add_capture):
+    add_capture("original.png", days_ago=10)
+    add_capture("duplicate.png", days_ago=9, link_to="original.png")
+    add_capture("other.png", days_ago=1, colour=(0, 0, 255))
+    size = (root / "original.png").stat().st_size
+
+    plan = _plan(root, catalogue)
+    assert plan.captures == 3
+    assert plan.total_bytes == size + (root / "other.png").stat().st_size
+
+    # Evicting one link frees nothing; the bytes go with the last link
+    plan = _plan(root, catalogue, max_bytes=plan.total_bytes - 1)
+    freed = {eviction.row["filename"]: eviction.freed_bytes for eviction in plan.evictions}
+    assert freed == {"original.png": 0, "duplicate.png": size}
+
+
+def test_missing_files_are_dropped_from_the_catalogue(root, catalogue, add_capture):
+    add_capture("gone.png")
+    (root / "gone.png").unlink()
+    plan = _plan(root, catalogue)
+    assert [(eviction.row["filename"], eviction.reason) for eviction in plan.evictions] == [("gone.png", "missing")]
+    assert plan.captures == 0
+
+
+def test_plan_touches_nothing(root, catalogue, add_capture):
+    add_capture("old.png", days_ago=400)
+    _plan(root, catalogue, max_age_days=1, max_bytes=0)
+    assert (root / "old.png").exists()
+    assert catalogue.latest()["filename"] == "old.png"
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+
+from rettelsesvaerktoj.scheduler import REJECT, CaptureRejected, CaptureScheduler, ScheduledCapture
+
+TIMEOUT = 5
+
+
+class Job:
+    """A capture that runs until release() is called"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self._release = threading.Event()
+        self.capture = None
+
+    def __call__(self, capture):
+        self.capture = capture
+        self.started.set()
+        self._release.wait(TIMEOUT)
+        capture.finished()
+
+    def release(self):
+        self._release.set()
+
+
+def test_runs_and_completes():
+    scheduler = CaptureScheduler()
+    job = Job()
+    capture = scheduler.submit(job, 100)
+    assert job.started.wait(TIMEOUT)
+    assert capture.state == ScheduledCapture.RUNNING
+    job.release()
+    assert capture.done.wait(TIMEOUT)
+    assert capture.state == ScheduledCapture.DONE
+    assert scheduler.stats()["completed"] == 1
+
+
+def test_waits_for_a_slot():
+    scheduler = CaptureScheduler(max_in_flight=1)
+    first, second = Job(), Job()
+    scheduler.submit(first)
+    assert first.started.wait(TIMEOUT)
+    waiting = scheduler.submit(second)
+    assert waiting.state == ScheduledCapture.WAITING
+    assert not second.started.wait(0.1)
+
+    first.release()
+    assert second.started.wait(TIMEOUT)
+    second.release()
+    assert waiting.done.wait(TIMEOUT)
+
+
+def test_byte_budget_holds_back_what_does_not_fit():
+    scheduler = CaptureScheduler(max_in_flight=4, max_bytes=100)
+    first, second = Job(), Job()
+    scheduler.submit(first, 80)
+    assert first.started.wait(TIMEOUT)
+    scheduler.submit(second, 50)
+    assert not second.started.wait(0.1)
+    assert scheduler.stats()["in_flight_bytes"] == 80
+
+    first.release()
+    assert second.started.wait(TIMEOUT)
+    second.release()
+
+
+def test_one_capture_is_admitted_however_large():
+    scheduler = CaptureScheduler(max_bytes=100)
+    job = Job()
+    scheduler.submit(job, 10_000)
+    assert job.started.wait(TIMEOUT)
+    job.release()
+
+
+def test_reject_policy_and_full_queue():
+    scheduler = CaptureScheduler(max_in_flight=1, policy=REJECT)
+    job = Job()
+    scheduler.submit(job)
+    assert job.started.wait(TIMEOUT)
+    with pytest.raises(CaptureRejected):
+        scheduler.submit(Job())
+
+    queued = CaptureScheduler(max_in_flight=1, max_queued=1)
+    running = Job()
+    queued.submit(running)
+    assert running.started.wait(TIMEOUT)
+    queued.submit(Job())
+    with pytest.raises(CaptureRejected):
+        queued.submit(Job())
+    assert queued.stats()["dropped"] == 1
+
+    job.release()
+    running.release()
+
+
+def test_cancel_waiting_capture_never_runs():
+    scheduler = CaptureScheduler(max_in_flight=1)
+    first, second = Job(), Job()
+    scheduler.submit(first)
+    assert first.started.wait(TIMEOUT)
+    waiting = scheduler.submit(second)
+
+    assert waiting.cancel() is True
+    assert waiting.state == ScheduledCapture.CANCELLED
+    assert waiting.done.is_set()
+    first.release()
+    assert not second.started.wait(0.2)
+    assert scheduler.stats()["cancelled"] == 1
+
+
+def test_cancel_running_capture_sets_its_flag():
+    scheduler = CaptureScheduler()
+    job = Job()
+    capture = scheduler.submit(job)
+    assert job.started.wait(TIMEOUT)
+
+    assert capture.cancel() is False
+    assert capture.cancelled
+    job.release()
+    assert capture.done.wait(TIMEOUT)
+    assert capture.state == ScheduledCapture.CANCELLED
+    assert scheduler.stats()["completed"] == 0
+
+
+def test_failing_capture_releases_its_slot():
+    scheduler = CaptureScheduler(max_in_flight=1)
+
+    def fail(capture):
+        raise RuntimeError("grab failed")
+
+    failed = scheduler.submit(fail)
+    assert failed.done.wait(TIMEOUT)
+    job = Job()
+    scheduler.submit(job)
+    assert job.started.wait(TIMEOUT)
+    job.release()
+
+
+def test_selection_is_single_flight():
+    scheduler = CaptureScheduler()
+    assert scheduler.begin_selection()
+    assert not scheduler.begin_selection()
+    scheduler.end_selection()
+    assert scheduler.begin_selection()
+    stats = scheduler.stats()
+    assert stats["triggers"] == 3
+    assert stats["coalesced"] == 1
+
+
+def test_close_cancels_waiting_and_refuses_new_work():
+    scheduler = CaptureScheduler(max_in_flight=1)
+    running, second = Job(), Job()
+    scheduler.submit(running)
+    assert running.started.wait(TIMEOUT)
+    waiting = scheduler.submit(second)
+
+    closer = threading.Thread(target=scheduler.close, args=(TIMEOUT,))
+    closer.start()
+    assert waiting.done.wait(TIMEOUT)
+    assert waiting.state == ScheduledCapture.CANCELLED
+    running.release()
+    closer.join(TIMEOUT)
+    with pytest.raises(CaptureRejected):
+        scheduler.submit(Job())
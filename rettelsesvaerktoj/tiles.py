@@ -0,0 +1,197 @@
+"""
+Tile-delta storage: only encode the parts of the screen that changed.
+
+A capture is cut into TILE_SIZE x TILE_SIZE tiles and each tile is
+hashed. Tiles with the same hash as the tile at the same position in the
+previous capture are stored as a reference to wherever that tile's
+pixels already live; only changed tiles are packed into a small atlas
+PNG. Per capture this writes
+
+    <name>.tiles.json   manifest: image size/mode and one entry per tile
+    <name>.atlas.png    the changed tiles (missing if nothing changed)
+
+References always point at the atlas that holds the pixels, never at
+another manifest, so reconstruction is one hop however long the chain of
+similar captures gets. load() rebuilds the normal image and
+materialize() writes it out as a plain PNG.
+
+Run as `python -m rettelsesvaerktoj.tiles <manifest>` to materialize a
+capture and print the PNG path (used by read-latest-screenshot.js).
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+from .publish import atomic_write_text, replace, staging_path
+
+TILE_SIZE = 64
+
+# Changed tiles per atlas row
+ATLAS_COLUMNS = 32
+
+MANIFEST_SUFFIX = ".tiles.json"
+ATLAS_SUFFIX = ".atlas.png"
+CACHE_DIR = ".tiles-cache"
+
+
+def is_manifest(path):
+    return str(path).endswith(MANIFEST_SUFFIX)
+
+
+def manifest_path_for(filepath):
+    """screenshot_x.png -> screenshot_x.tiles.json"""
+    return filepath.with_name(filepath.stem + MANIFEST_SUFFIX)
+
+
+def tile_boxes(width, height, tile_size=TILE_SIZE):
+    """Tile boxes in row-major order (edge tiles may be smaller)"""
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in range(0, height, tile_size)
+        for x in range(0, width, tile_size)
+    ]
+
+
+def tile_hashes(image, boxes):
+    hashes = []
+    for box in boxes:
+        h = hashlib.blake2b(image.crop(box).tobytes(), digest_size=8)
+        hashes.append(h.hexdigest())
+    return hashes
+
+
+class TileStore:
+    def __init__(self, root, tile_size=TILE_SIZE):
+        self.root = root
+        self.tile_size = tile_size
+        self._previous = None  # (size, mode, hashes, entries) of the last capture
+        self._lock = threading.Lock()
+
+    def _relative(self, path):
+        return path.relative_to(self.root).as_posix()
+
+    def save(self, image, filepath):
+        """Store image as a tile delta for filepath
+
+        Returns (manifest path, changed tiles, total tiles, bytes written).
+        """
+        manifest_path = manifest_path_for(filepath)
+        atlas_path = filepath.with_name(filepath.stem + ATLAS_SUFFIX)
+        boxes = tile_boxes(image.width, image.height, self.tile_size)
+        hashes = tile_hashes(image, boxes)
+
+        # Captures are chained, so deltas are built one at a time
+        with self._lock:
+            previous = self._previous
+            if previous is not None and previous[:2] != (image.size, image.mode):
+                previous = None  # Different screen size: nothing to reuse
+
+            entries = []
+            changed = []
+            for position, tile_hash in enumerate(hashes):
+                if previous is not None and previous[2][position] == tile_hash:
+                    entries.append(previous[3][position])
+                else:
+                    entries.append([self._relative(atlas_path), len(changed)])
+                    changed.append(boxes[position])
+
+            written = 0
+            if changed:
+                self._write_atlas(image, changed, atlas_path)
+                written += atlas_path.stat().st_size
+
+            manifest = {
+                "version": 1,
+                # Tile references are relative to the store root
+                "root": Path(os.path.relpath(self.root, manifest_path.parent)).as_posix(),
+                "size": list(image.size),
+                "mode": image.mode,
+                "tile": self.tile_size,
+                "tiles": entries,
+            }
+            # The manifest is what readers open, so it is replaced last
+            atomic_write_text(manifest_path, json.dumps(manifest, separators=(',', ':')))
+
+            written += manifest_path.stat().st_size
+            self._previous = (image.size, image.mode, hashes, entries)
+
+        return manifest_path, len(changed), len(boxes), written
+
+    def _write_atlas(self, image, boxes, atlas_path):
+        columns = min(len(boxes), ATLAS_COLUMNS)
+        rows = (len(boxes) + columns - 1) // columns
+        atlas = Image.new(image.mode, (columns * self.tile_size, rows * self.tile_size))
+        for index, box in enumerate(boxes):
+            atlas.paste(image.crop(box), atlas_slot(index, self.tile_size)[:2])
+        staged = staging_path(atlas_path)
+        atlas.save(staged, 'PNG')
+        replace(staged, atlas_path)
+
+
+def rerooted(manifest_path, folder):
+    """The manifest's JSON with "root" pointing at the same store root from another folder"""
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    root = manifest_path.parent / manifest.get("root", ".")
+    manifest["root"] = Path(os.path.relpath(root, folder)).as_posix()
+    return json.dumps(manifest, separators=(',', ':'))
+
+
+def atlas_slot(index, tile_size):
+    """Box of the index-th tile inside an atlas"""
+    x = (index % ATLAS_COLUMNS) * tile_size
+    y = (index // ATLAS_COLUMNS) * tile_size
+    return (x, y, x + tile_size, y + tile_size)
+
+
+def load(manifest_path):
+    """Rebuild the full capture from its manifest and the atlases it references"""
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    root = manifest_path.parent / manifest.get("root", ".")
+
+    width, height = manifest["size"]
+    tile_size = manifest["tile"]
+    image = Image.new(manifest["mode"], (width, height))
+    atlases = {}
+    try:
+        for box, (atlas_name, index) in zip(tile_boxes(width, height, tile_size), manifest["tiles"]):
+            atlas = atlases.get(atlas_name)
+            if atlas is None:
+                atlas = atlases[atlas_name] = Image.open(root / atlas_name)
+            x, y, _, _ = atlas_slot(index, tile_size)
+            tile = atlas.crop((x, y, x + box[2] - box[0], y + box[3] - box[1]))
+            image.paste(tile, box[:2])
+    finally:
+        for atlas in atlases.values():
+            atlas.close()
+    return image
+
+
+def materialize(manifest_path, out_path=None):
+    """Write the reconstructed capture as a normal PNG (cached) and return its path"""
+    manifest_path = Path(manifest_path)
+    if out_path is None:
+        cache = manifest_path.parent / CACHE_DIR
+        cache.mkdir(exist_ok=True)
+        out_path = cache / (manifest_path.name[:-len(MANIFEST_SUFFIX)] + ".png")
+    if not out_path.exists() or out_path.stat().st_mtime < manifest_path.stat().st_mtime:
+        staged = staging_path(out_path)
+        load(manifest_path).save(staged, 'PNG')
+        replace(staged, out_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m rettelsesvaerktoj.tiles <capture.tiles.json>")
+        sys.exit(2)
+    print(materialize(sys.argv[1]))
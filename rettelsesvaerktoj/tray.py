@@ -0,0 +1,545 @@
+"""
+Tray app: the Ctrl+Shift+S area-selection tool behind jens-fixed.py,
+jens-screenshot-tool.py and simple-screenshot.py.
+
+- Press Ctrl+Shift+S for area selection screenshot (Ctrl+Shift+B for a burst)
+- Automatically saves to the Rettelser folder with timestamp
+- Shows a notification when saved
+- Optionally opens an annotation window (rectangles, arrows, text, blur)
+  after the selection; annotations are a sidecar, the capture is untouched
+- Updates LATEST.json / LATEST.txt for Claude reference
+
+This module pulls in tkinter, pystray and keyboard, so it is only imported
+for `python -m rettelsesvaerktoj tray`; scripted captures go through cli.py.
+Console output is plain ASCII so it survives a cp1252 Windows console.
+"""
+
+import base64
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from tkinter import messagebox
+
+from PIL import Image, ImageGrab
+import pystray
+from pystray import MenuItem as item
+import keyboard
+
+from . import __version__, capture, monitors
+from .annotations import AnnotationRenderer
+from .annotator import AnnotationEditor
+from .burst import BurstCapture, DEFAULT_BURST_FPS, DEFAULT_BURST_FRAMES
+from .catalogue import Catalogue
+from .dedup import PixelStore
+from .encoders import AdaptiveEncoder, LOG_NAME as ENCODER_LOG_NAME
+from .footprint import report_when_idle, restrict_image_plugins, snapshot
+from .latency import LatencyRecorder
+from .naming import unique_capture_path
+from .notify import APP_NAME, NotificationWorker, plyer_notify
+from .overlay import ScreenshotOverlay
+from .pipeline import CapturePipeline
+from .publish import Publisher, clean_staging
+from .retention import RetentionEngine, RetentionPolicy
+from .scheduler import CaptureRejected, CaptureScheduler
+from .service import CaptureService, CAPTURE_TIMEOUT
+from .similarity import SimilarityIndex
+from .thumbnails import ThumbnailCache
+from .tiles import TileStore
+from .ui import UiThread
+
+# 16x16 RGB camera (body, lens ring, lens, viewfinder on white), zlib + base64
+CAMERA_ICON = "eNr7/5/e4AQSoJZ6GyIAVdSnYACC6o2QwGBQT5L7aRSegwcAAPisCDM="
+
+
+def camera_icon():
+    """The tray icon, decoded from CAMERA_ICON (no per-pixel drawing at startup)"""
+    return Image.frombytes('RGB', (16, 16), zlib.decompress(base64.b64decode(CAMERA_ICON)))
+
+
+def saved_summary(count, last_message):
+    """One notification for several captures saved close together"""
+    latest = last_message.split("\n", 1)[-1]
+    return f"{count} screenshots gemt!\nSeneste: {latest}"
+
+
+def _then(release, callback):
+    """callback, followed by release() even if it fails"""
+    def run(*args):
+        try:
+            callback(*args)
+        finally:
+            release()
+    return run
+
+
+class TrayApp:
+    def __init__(self, screenshots_dir, notify=plyer_notify, tile_storage=False):
+        """notify(title, message, timeout) shows a desktop notification (see notify.py)
+
+        tile_storage: store only the tiles that changed since the last capture (see tiles.py).
+        """
+        self.screenshots_dir = Path(screenshots_dir)
+        self.screenshots_dir.mkdir(parents=True, exist_ok=True)
+
+        # Notifications are shown from their own thread, never the capture path
+        self.notifications = NotificationWorker(notify).start()
+
+        # Indexed capture catalogue (replaces screenshot-log.txt; old log imported once)
+        self.catalogue = Catalogue(self.screenshots_dir)
+        if self.catalogue.count() == 0:
+            self.catalogue.import_log()
+
+        # Captures and LATEST are staged and renamed into place under a lock
+        # shared with any other instance writing to the same folder
+        self.publisher = Publisher(self.screenshots_dir)
+
+        # Files staged by instances that crashed mid-write; walks the whole folder, so off the startup path
+        threading.Thread(target=clean_staging, args=(self.screenshots_dir,),
+                         name="clean-staging", daemon=True).start()
+
+        # Preview pyramid per capture, built from the in-memory frame
+        self.thumbnails = ThumbnailCache(self.screenshots_dir, self.catalogue)
+
+        # Only the tiles that changed since the last capture (tray --tile-storage)
+        self.tile_storage = tile_storage
+
+        # Encode and write captures in the background; identical pixels are linked, not re-encoded
+        self.similarity = SimilarityIndex(self.screenshots_dir)
+        self.pipeline = CapturePipeline(
+            store=PixelStore(self.screenshots_dir),
+            similarity=self.similarity,
+            tiles=TileStore(self.screenshots_dir) if self.tile_storage else None,
+            encoder=AdaptiveEncoder(log_path=self.screenshots_dir / ENCODER_LOG_NAME),
+            publisher=self.publisher,
+            thumbnails=self.thumbnails
+        )
+
+        # Annotated captures are composited on read and cached per annotation version
+        self.annotations = AnnotationRenderer(self.screenshots_dir)
+
+        # Keep Rettelser within budget; eviction and recompression run while idle
+        self.retention = RetentionEngine(
+            self.screenshots_dir,
+            self.catalogue,
+            RetentionPolicy(max_bytes=5 * 1024 ** 3, max_age_days=180),
+            on_deleted=self._on_capture_deleted,
+        ).start(self.pipeline.idle_seconds)
+
+        # Local API for tooling: capture now, latest, list, live events (see .service.json);
+        # started last, once everything capture_for_service needs exists
+        self.service = CaptureService(
+            self.screenshots_dir, self.catalogue, self.capture_for_service, self.thumbnails,
+            annotations=self.annotations
+        )
+
+        self.burst = BurstCapture(self.pipeline, self.screenshots_dir, self.grab)
+        self._burst_lock = threading.Lock()
+
+        # Grab the screen once at hotkey time and crop the selection from it
+        self.freeze_frame = True
+
+        # Time the available capture backends once and keep the fastest
+        try:
+            capture.default_backend(benchmark=True)
+        except capture.BackendUnavailable as e:
+            print(f"No capture backend: {e}")
+
+        # Per-stage capture latency: .latency.jsonl, .latency.prom and the tray menu
+        self.latency = LatencyRecorder(self.screenshots_dir)
+
+        # One overlay at a time however often the hotkey fires; bounded captures in flight
+        self.scheduler = CaptureScheduler()
+
+        # One Tk thread for the overlay and dialogs, with the overlay pre-built
+        self.ui = UiThread().start()
+        self.overlay = ScreenshotOverlay(
+            self.ui, self._schedule_capture, monitors.current, on_closed=self.scheduler.end_selection
+        )
+
+        # Set annotate_after_capture (or tick it in the tray menu) to annotate every selection
+        self.annotate_after_capture = False
+        self.annotator = AnnotationEditor(self.ui, self.annotations, on_done=self._on_annotated)
+
+        # Create system tray icon
+        self.setup_tray_icon()
+
+        # Register global hotkey
+        self.setup_hotkey()
+
+        self.running = True
+
+        # Accept API requests (and publish .service.json) only now that the app is complete
+        self.service.start()
+
+    def setup_tray_icon(self):
+        """Create system tray icon with camera design"""
+        icon_image = camera_icon()
+
+        menu = pystray.Menu(
+            item('Tag Screenshot (Ctrl+Shift+S)', self.start_screenshot),
+            item('Åbn Screenshot Mappe', self.open_folder),
+            item('Annotér seneste', self.annotate_latest),
+            item('Annotér efter udsnit', self.toggle_annotate_after_capture,
+                 checked=lambda menu_item: self.annotate_after_capture),
+            item(f'Burst ({DEFAULT_BURST_FRAMES} billeder)', self.start_burst),
+            item('Oprydning (prøvekørsel)', self.show_retention_report),
+            item('Latens (p50/p95/p99)', self.show_latency_report),
+            pystray.Menu.SEPARATOR,
+            item(f'Om {APP_NAME}', self.show_about),
+            item('Afslut', self.quit_app)
+        )
+
+        self.icon = pystray.Icon(
+            name=APP_NAME,
+            icon=icon_image,
+            title=APP_NAME,
+            menu=menu
+        )
+
+    def setup_hotkey(self):
+        """Register global hotkey Ctrl+Shift+S"""
+        try:
+            keyboard.add_hotkey('ctrl+shift+s', self.start_screenshot)
+            # Hold Ctrl+Shift+B to capture a burst for as long as it is held
+            keyboard.add_hotkey('ctrl+shift+b', self.start_burst)
+        except Exception as e:
+            print(f"Could not register hotkey: {e}")
+
+    def start_screenshot(self):
+        """Start screenshot process with area selection"""
+        # Key repeat and impatient presses while the overlay is open are coalesced into it
+        if not self.scheduler.begin_selection():
+            return
+        try:
+            requested_at = time.perf_counter()
+            trace = self.latency.trace("hotkey", requested_at)
+            frame = self.grab_overlay_monitor() if self.freeze_frame else None
+            self.overlay.show_selection_overlay(requested_at=requested_at, frame=frame, trace=trace)
+        except Exception as e:
+            self.scheduler.end_selection()
+            self.show_error(f"Error starting screenshot: {str(e)}")
+
+    def grab(self, bbox=None):
+        """Grab bbox (physical desktop pixels) from only the monitors it touches; None = all"""
+        return monitors.current().grab(bbox)
+
+    def grab_overlay_monitor(self):
+        """Grab the monitor the selection overlay covers (the primary one)"""
+        primary = monitors.current().primary
+        return self.grab(primary.bbox) if primary is not None else ImageGrab.grab()
+
+    def _schedule_capture(self, area, frame=None, on_recorded=None, trace=None):
+        """Queue a capture with the scheduler; returns it, or None if it was rejected"""
+        try:
+            return self.scheduler.submit(
+                lambda scheduled: self._capture_area(area, frame, on_recorded, scheduled, trace),
+                self._estimated_bytes(area, frame)
+            )
+        except CaptureRejected as e:
+            self.show_error(f"Screenshot skipped: {str(e)}")
+            if on_recorded:
+                on_recorded(None)
+            return None
+
+    def _estimated_bytes(self, area, frame=None):
+        """Pixel memory a capture holds until it is saved"""
+        if frame is not None:
+            return frame.width * frame.height * len(frame.getbands())
+        bbox = area or monitors.current().bounds
+        if bbox is None:
+            return 0
+        return (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) * 4
+
+    def _capture_area(self, area, frame=None, on_recorded=None, scheduled=None, trace=None):
+        """Capture screenshot of specified area or fullscreen
+
+        scheduled (see scheduler.py) is released once the capture is saved or has failed;
+        trace (see latency.py) is marked at each stage and finished once notified.
+        """
+        release = scheduled.finished if scheduled is not None else (lambda: None)
+        try:
+            if frame is not None and (area is not None or len(monitors.current()) <= 1):
+                # Frozen frame from hotkey time: crop in memory, no second grab
+                screenshot = frame if area is None else frame.crop(area)
+            else:
+                # Area on any monitor, or every monitor at once for fullscreen
+                screenshot = self.grab(area)
+            if trace is not None:
+                trace.mark("grabbed")
+
+            if scheduled is not None and scheduled.cancelled:
+                # Cancelled while grabbing: drop the pixels instead of encoding them
+                release()
+                if on_recorded:
+                    on_recorded(None)
+                return
+
+            # Generate filename with millisecond timestamp (never overwrites)
+            filepath = unique_capture_path(self.screenshots_dir)
+            captured_at = datetime.now()
+
+            # Hand the pixels to the background writer and return right away
+            self.pipeline.submit(
+                screenshot,
+                filepath,
+                on_saved=_then(release, lambda saved: self._on_capture_saved(saved, captured_at, area, on_recorded, trace)),
+                on_error=_then(release, lambda job, error: self._on_capture_failed(job, error, on_recorded)),
+                trace=trace
+            )
+
+        except Exception as e:
+            release()
+            self.show_error(f"Error capturing screenshot: {str(e)}")
+            if on_recorded:
+                on_recorded(None)
+
+    def _on_capture_saved(self, saved, captured_at, area=None, on_recorded=None, trace=None):
+        """Run once the background writer has the screenshot on disk"""
+        danish_date = captured_at.strftime("%d-%m-%Y %H:%M:%S")
+
+        # Update latest reference (unless a newer capture already finished)
+        if self.pipeline.is_newest(saved.seq):
+            self.update_latest_screenshot(saved.filename)
+
+        # Show success notification
+        filename = saved.filename
+        file_size_kb = saved.size_kb
+
+        self.notifications.notify(
+            APP_NAME, f"Screenshot gemt!\n{danish_date}\n{filename}\n{file_size_kb}KB", 4,
+            key="saved", summary=saved_summary
+        )
+        if trace is not None:
+            trace.mark("notified")
+            trace.finish(file=filename, bytes=saved.size_bytes)
+
+        # Log the screenshot
+        capture_id = self.log_screenshot(saved, captured_at, area)
+        if on_recorded:
+            on_recorded(capture_id)
+        if saved.duplicate_of is not None:
+            print(f"Identical to {saved.duplicate_of.name}, linked instead of encoded")
+        elif saved.encoding is not None:
+            print(f"Encoded with {saved.encoding.encoder} in {saved.encoding.seconds * 1000:.0f} ms")
+
+        print(f"Screenshot saved: {filename} ({danish_date})")
+
+        # Selections only: API captures are for tooling, nobody is there to annotate them
+        if self.annotate_after_capture and on_recorded is None:
+            self.annotator.open(saved.filepath)
+
+    def _on_capture_failed(self, job, error, on_recorded=None):
+        """Report a capture the background writer could not save"""
+        self.show_error(f"Error saving screenshot {job.filepath.name}: {str(error)}")
+        if on_recorded:
+            on_recorded(None)
+
+    def capture_for_service(self, area=None):
+        """Capture for the local API; returns the catalogue id once saved (None on failure)"""
+        recorded = queue.Queue()
+        scheduled = self._schedule_capture(area, on_recorded=recorded.put, trace=self.latency.trace("requested"))
+        try:
+            return recorded.get(timeout=CAPTURE_TIMEOUT)
+        except queue.Empty:
+            # Still waiting for a slot: the caller has given up, so do not take it
+            if scheduled is not None:
+                scheduled.cancel()
+            return None
+
+    def start_burst(self, icon=None, item=None):
+        """Start a burst from the tray menu or the Ctrl+Shift+B hotkey"""
+        threading.Thread(target=self._run_burst, daemon=True).start()
+
+    def _run_burst(self):
+        """Capture fullscreen frames at DEFAULT_BURST_FPS into one session folder"""
+        # Key repeat fires the hotkey again while held; one burst at a time
+        if not self._burst_lock.acquire(blocking=False):
+            return
+        try:
+            if keyboard.is_pressed('ctrl+shift+b'):
+                # Hotkey: keep going while the keys are held
+                keep_going = lambda: keyboard.is_pressed('ctrl+shift+b')
+                frames = None
+            else:
+                keep_going = None
+                frames = DEFAULT_BURST_FRAMES
+
+            session = self.burst.run(
+                frames=frames,
+                fps=DEFAULT_BURST_FPS,
+                keep_going=keep_going,
+                on_frame_saved=self._on_burst_frame_saved,
+                on_finished=self._on_burst_finished
+            )
+            print(f"Burst {session.name}: {session.frames} frames at "
+                  f"{session.achieved_fps:.1f} fps (target {DEFAULT_BURST_FPS})")
+        except Exception as e:
+            self.show_error(f"Error during burst: {str(e)}")
+        finally:
+            self._burst_lock.release()
+
+    def _on_burst_frame_saved(self, session, saved):
+        """Point LATEST at each burst frame as it lands and log it"""
+        relative_name = saved.filepath.relative_to(self.screenshots_dir).as_posix()
+        if self.pipeline.is_newest(saved.seq):
+            self.update_latest_screenshot(relative_name)
+        self.log_screenshot(saved, datetime.now(), session=session.name)
+
+    def _on_burst_finished(self, session):
+        """One summary notification per burst instead of one per frame"""
+        self.notifications.notify(
+            APP_NAME,
+            f"Burst gemt!\n{session.saved} billeder, {session.achieved_fps:.1f} fps\n{session.name}",
+            4, key="burst"
+        )
+
+    def annotate_latest(self, icon=None, item=None):
+        """Open the annotation window on the newest capture"""
+        row = self.catalogue.latest()
+        if row is None:
+            self.show_error("Ingen screenshots at annotere endnu")
+            return
+        self.catalogue.touch(row["id"])
+        self.annotator.open(self.screenshots_dir / row["filename"])
+
+    def toggle_annotate_after_capture(self, icon=None, item=None):
+        self.annotate_after_capture = not self.annotate_after_capture
+
+    def _on_annotated(self, capture_path, annotations):
+        """Editor closed (UI thread): write the annotated render off the UI thread"""
+        if annotations.version == 0:
+            return  # Opened and closed without drawing anything
+        threading.Thread(target=self._publish_annotated, args=(capture_path,),
+                         name="annotate-render", daemon=True).start()
+
+    def _publish_annotated(self, capture_path):
+        try:
+            path = self.annotations.render_path(capture_path)
+        except OSError as e:
+            self.show_error(f"Error rendering annotations: {str(e)}")
+            return
+        relative = path.relative_to(self.screenshots_dir).as_posix()
+        self.notifications.notify(APP_NAME, f"Annotering gemt!\n{relative}", 4, key="annotated")
+        print(f"Annotated: {relative}")
+
+    def _on_capture_deleted(self, row):
+        """Retention evicted a capture: drop its thumbnails, similarity hash, annotations and renders"""
+        path = self.screenshots_dir / row["filename"]
+        self.thumbnails.invalidate(row["id"])
+        self.similarity.remove(path)
+        self.annotations.forget(path)
+
+    def update_latest_screenshot(self, filename):
+        """Update reference to latest screenshot for Claude"""
+        self.publisher.update_latest(filename)
+
+    def log_screenshot(self, saved, captured_at, area=None, session=None):
+        """Record screenshot in the capture catalogue and store its thumbnails"""
+        capture_id = self.catalogue.record(saved, captured_at, area, session)
+        if saved.thumbnails:
+            self.thumbnails.put(capture_id, saved.thumbnails)
+            saved.thumbnails = None
+        self.service.notify(capture_id)
+        return capture_id
+
+    def show_error(self, message):
+        """Show error notification"""
+        self.notifications.notify(f"{APP_NAME} - Fejl", message, 5, key="error")
+        print(f"Error: {message}")
+
+    def open_folder(self, icon=None, item=None):
+        """Open screenshots folder"""
+        os.startfile(str(self.screenshots_dir))
+
+    def show_about(self, icon=None, item=None):
+        """Show about dialog"""
+        def show_dialog():
+            messagebox.showinfo(
+                f"Om {APP_NAME}",
+                f"{APP_NAME} v{__version__}\n\n"
+                f"Genvej: Ctrl+Shift+S\n"
+                f"Screenshots gemmes i:\n{self.screenshots_dir}\n\n"
+                f"Sådan bruger du det:\n"
+                f"1. Tryk Ctrl+Shift+S\n"
+                f"2. Træk for at vælge område (eller tryk Enter for hele skærmen)\n"
+                f"3. Screenshot gemmes automatisk\n"
+                f"4. Skriv 'screenshot' til Claude for analyse!",
+                parent=self.ui.root
+            )
+
+        # Dialogs live on the shared UI thread, not in a Tk root of their own
+        self.ui.call(show_dialog)
+
+    def show_retention_report(self, icon=None, item=None):
+        """Show what the retention policy would reclaim right now (dry run)"""
+        report = self.retention.plan().report(self.retention.policy)
+        print(report)
+        self.ui.call(lambda: messagebox.showinfo("Oprydning (prøvekørsel)", report, parent=self.ui.root))
+
+    def show_latency_report(self, icon=None, item=None):
+        """Show p50/p95/p99 per capture stage since the app started"""
+        report = self.latency.report()
+        print(report)
+        self.ui.call(lambda: messagebox.showinfo("Latens (p50/p95/p99)", report, parent=self.ui.root))
+
+    def quit_app(self, icon=None, item=None):
+        """Quit the application"""
+        self.running = False
+        keyboard.unhook_all()
+
+        # Let queued captures finish writing before the process exits
+        self.retention.stop(timeout=5)
+        self.service.stop()
+        self.scheduler.close(timeout=10)
+        self.pipeline.shutdown(wait=True, timeout=10)
+        self.latency.flush()
+        stats = self.scheduler.stats()
+        if stats["coalesced"] or stats["dropped"] or stats["cancelled"]:
+            print(f"Hotkey triggers: {stats['triggers']}, coalesced {stats['coalesced']}, "
+                  f"dropped {stats['dropped']}, cancelled {stats['cancelled']}")
+        self.catalogue.close()
+        self.publisher.close()
+        self.ui.stop()
+        self.notifications.close()
+        if hasattr(self, 'icon'):
+            self.icon.stop()
+
+    def run(self, footprint=False):
+        """Run the application; footprint=True prints startup time and idle memory"""
+        print(f"Jens Rettelsesvaerktoj v{__version__} started!")
+        print(f"Screenshots will be saved to: {self.screenshots_dir}")
+        print("Press Ctrl+Shift+S to take area screenshot")
+        print("Right-click camera icon in system tray to exit")
+
+        # Show startup notification
+        self.notifications.notify(APP_NAME, "Klar! Tryk Ctrl+Shift+S for screenshot", 3)
+
+        # Run system tray icon
+        if footprint:
+            self.icon.run(setup=self._report_footprint)
+        else:
+            self.icon.run()
+
+    def _report_footprint(self, icon):
+        """pystray setup callback: the icon is up, so the app is ready"""
+        icon.visible = True
+        print(snapshot("Tray ready"))
+        report_when_idle(is_running=lambda: self.running)
+
+
+def main(screenshots_dir, notify=plyer_notify, footprint=False, tile_storage=False):
+    """Run the tray app until it is quit; returns a process exit code"""
+    restrict_image_plugins()
+    try:
+        app = TrayApp(screenshots_dir, notify, tile_storage=tile_storage)
+        app.run(footprint)
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
@@ -0,0 +1,63 @@
+"""
+One long-lived Tk interpreter on a dedicated UI thread.
+
+Tk is not thread safe, so every window (selection overlay, about dialog)
+is created and touched only from this thread. Other threads (hotkey
+handler, tray menu) hand work over with UiThread.call().
+"""
+
+import queue
+import threading
+import tkinter as tk
+
+# How often the UI thread picks up work from other threads. This is the
+# worst-case extra delay between a hotkey press and the overlay showing.
+POLL_INTERVAL_MS = 5
+
+
+class UiThread:
+    def __init__(self, name="tk-ui"):
+        self.root = None
+        self._calls = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self, timeout=10):
+        """Start the UI thread and wait until the Tk root exists"""
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("UI thread did not start")
+        return self
+
+    def call(self, func, *args):
+        """Run func(*args) on the UI thread (returns immediately)"""
+        self._calls.put((func, args))
+
+    def is_ui_thread(self):
+        return threading.current_thread() is self._thread
+
+    def stop(self):
+        """Close every window and end the Tk mainloop"""
+        if self._thread.is_alive():
+            self.call(self.root.quit)
+
+    def _run(self):
+        self.root = tk.Tk()
+        self.root.withdraw()  # The root itself is never shown
+        self._ready.set()
+
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+        self.root.mainloop()
+        self.root.destroy()
+
+    def _poll(self):
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"UI error: {e}")
+        self.root.after(POLL_INTERVAL_MS, self._poll)
@@ -33,12 +33,23 @@ except ImportError as e:
     print("Please install with: pip install pillow pystray keyboard plyer")
     sys.exit(1)
 
+from rettelsesvaerktoj.catalogue import Catalogue
+from rettelsesvaerktoj.cli import capture
+from rettelsesvaerktoj.publish import Publisher, clean_staging
+
 class ScreenshotApp:
     def __init__(self):
         self.script_dir = Path(__file__).parent
         self.screenshots_dir = self.script_dir / "Rettelser"
         self.screenshots_dir.mkdir(exist_ok=True)
         
+        # One publisher and catalogue for the whole session, not one per capture
+        clean_staging(self.screenshots_dir, recursive=False)
+        self.publisher = Publisher(self.screenshots_dir)
+        self.catalogue = Catalogue(self.screenshots_dir)
+        if self.catalogue.count() == 0:
+            self.catalogue.import_log()
+        
         # Create system tray icon
         self.setup_tray_icon()
         
@@ -97,20 +108,10 @@ class ScreenshotApp:
     def take_screenshot(self):
         """Take screenshot and save to Rettelser folder"""
         try:
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"screenshot_{timestamp}.png"
-            filepath = self.screenshots_dir / filename
-            
-            # Take screenshot
-            screenshot = ImageGrab.grab()
-            screenshot.save(filepath, 'PNG')
-            
-            # Get file size
-            file_size_kb = round(filepath.stat().st_size / 1024, 1)
-            
-            # Update "latest screenshot" reference
-            self.update_latest_screenshot(filename)
+            # Grab every monitor, save under a unique millisecond name, update
+            # LATEST and record it in the catalogue (same path as the tray app)
+            row = capture(self.screenshots_dir, publisher=self.publisher, catalogue=self.catalogue)
+            filename = row["filename"]
             
             # Show notification with Danish date
             danish_date = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
@@ -121,9 +122,6 @@ class ScreenshotApp:
                 timeout=4
             )
             
-            # Log the screenshot
-            self.log_screenshot(filename, danish_date)
-            
             print(f"✅ Screenshot saved: {filename} ({danish_date})")
             
         except Exception as e:
@@ -137,29 +135,6 @@ class ScreenshotApp:
                 timeout=5
             )
     
-    def update_latest_screenshot(self, filename):
-        """Update reference to latest screenshot for Claude"""
-        latest_file = self.screenshots_dir / "LATEST.txt"
-        with open(latest_file, 'w', encoding='utf-8') as f:
-            f.write(filename)
-    
-    def log_screenshot(self, filename, danish_date):
-        """Log screenshot to file with Danish date"""
-        log_file = self.screenshots_dir / "screenshot-log.txt"
-        log_entry = f"{danish_date} - {filename}\n"
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-    
-    def log_screenshot(self, filename):
-        """Log screenshot to file"""
-        log_file = self.screenshots_dir / "screenshot-log.txt"
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{timestamp} - {filename}\n"
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-    
     def open_folder(self, icon=None, item=None):
         """Open screenshots folder"""
         os.startfile(str(self.screenshots_dir))
@@ -189,6 +164,8 @@ class ScreenshotApp:
         """Quit the application"""
         self.running = False
         keyboard.unhook_all()
+        self.catalogue.close()
+        self.publisher.close()
         if hasattr(self, 'icon'):
             self.icon.stop()
     
@@ -19,12 +19,23 @@ except ImportError:
     print("Please install Pillow: pip install pillow")
     sys.exit(1)
 
+from rettelsesvaerktoj.catalogue import Catalogue
+from rettelsesvaerktoj.cli import capture
+from rettelsesvaerktoj.publish import Publisher, clean_staging
+
 class UltraSimpleScreenshot:
     def __init__(self):
         self.script_dir = Path(__file__).parent
         self.screenshots_dir = self.script_dir / "Rettelser"
         self.screenshots_dir.mkdir(exist_ok=True)
         
+        # One publisher and catalogue for the whole session, not one per capture
+        clean_staging(self.screenshots_dir, recursive=False)
+        self.publisher = Publisher(self.screenshots_dir)
+        self.catalogue = Catalogue(self.screenshots_dir)
+        if self.catalogue.count() == 0:
+            self.catalogue.import_log()
+        
         # Create GUI window
         self.root = tk.Tk()
         self.root.title("Jens Screenshot Tool")
@@ -111,35 +122,24 @@ class UltraSimpleScreenshot:
             self.root.withdraw()
             time.sleep(0.1)  # Small delay to ensure window is hidden
             
-            # Take screenshot
-            screenshot = ImageGrab.grab()
-            
-            # Show window again
-            self.root.deiconify()
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"screenshot_{timestamp}.png"
-            filepath = self.screenshots_dir / filename
-            
-            # Save screenshot
-            screenshot.save(filepath, 'PNG')
-            
-            # Update latest reference
-            self.update_latest_screenshot(filename)
+            # Grab every monitor, save under a unique millisecond name, update
+            # LATEST and record it in the catalogue (same path as the tray app)
+            try:
+                row = capture(self.screenshots_dir, publisher=self.publisher, catalogue=self.catalogue)
+            finally:
+                # Show window again
+                self.root.deiconify()
+            filename = row["filename"]
             
             # Show success
             danish_date = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-            file_size_kb = round(filepath.stat().st_size / 1024, 1)
+            file_size_kb = round(row["size_bytes"] / 1024, 1)
             
             self.status_label.config(
                 text=f"SUCCESS! {filename} ({file_size_kb}KB)", 
                 fg="green"
             )
             
-            # Log the screenshot
-            self.log_screenshot(filename, danish_date)
-            
             # Show success message
             messagebox.showinfo(
                 "Screenshot Gemt!",
@@ -156,22 +156,10 @@ class UltraSimpleScreenshot:
             messagebox.showerror("Fejl", f"Kunne ikke tage screenshot:\n{str(e)}")
             print(f"Error: {e}")
     
-    def update_latest_screenshot(self, filename):
-        """Update reference to latest screenshot for Claude"""
-        latest_file = self.screenshots_dir / "LATEST.txt"
-        with open(latest_file, 'w', encoding='utf-8') as f:
-            f.write(filename)
-    
-    def log_screenshot(self, filename, danish_date):
-        """Log screenshot to file with Danish date"""
-        log_file = self.screenshots_dir / "screenshot-log.txt"
-        log_entry = f"{danish_date} - {filename}\n"
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-    
     def on_closing(self):
         """Handle window close"""
+        self.catalogue.close()
+        self.publisher.close()
         self.root.quit()
         self.root.destroy()
     